@@ -1,56 +1,36 @@
+import hashlib
+import time
+from contextlib import closing
 import streamlit as st
-import tensorflow as tf
 import numpy as np
-from PIL import Image
-import json
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+import pandas as pd
+from insect_core import MODEL_PATH, PEST_JSON, content_hash, file_version, load_insect_data
+from model_registry import DEFAULT_VERSION, ModelRegistry
+from prototypes import PROTOTYPE_PATH, PrototypeTable, extend_predictions, extended_labels
+from resolution import PROFILE_PATH, ResolutionPolicy, predict_adaptive
+from species_pages import render_all
+from assets import theme_tag
+from search import SearchIndex
+from crops import GROUP, CropIndex
+from priors import PriorTable
+from tiling import detect_insects, draw_detections
+from result_store import ResultStore
+from rollups import (
+    ALL_REGIONS, RollupEngine, create_tables as create_rollup_tables, load_rules, read_alerts, regions, series, top
+)
+from session_memory import PREVIEW_SIZE, preview, session_history, thumbnail_bytes
+from runtime_config import load_runtime_config
+from upload_guard import UploadRejected, decode_upload, open_upload, stats as upload_stats
+from shared_cache import open_cache
+from taxonomy import TaxonomyIndex
+from capture import CaptureQueue
+from explain import heatmap_overlay
+
+PREDICTION_TTL = 7 * 24 * 3600
 
 # --------------------------------------------------
 # Page Configuration
 # --------------------------------------------------
-# Hide hamburger menu, footer, header, and toolbar completely
-# Hide Streamlit's top-right menu (hamburger ☰), Manage app, Deploy button, toolbar, footer, etc.
-st.markdown("""
-<style>
-[data-testid="stToolbar"] {display: none !important;}
-</style>
-""", unsafe_allow_html=True)
-
-hide_streamlit_elements = """
-    <style>
-    /* Hide the main hamburger menu */
-    #MainMenu {visibility: hidden !important;}
-    
-    /* Hide the toolbar (new in recent versions) */
-    .stToolbar {display: none !important;}
-    
-    /* Hide Deploy button */
-    .stDeployButton {display: none !important;}
-    
-    /* Hide header bar */
-    header {visibility: hidden !important;}
-    
-    /* Hide footer ("Made with Streamlit") */
-    footer {visibility: hidden !important;}
-    
-    /* Extra safety for any new elements */
-    [data-testid="stToolbar"] {display: none !important;}
-    [data-testid="manage-app-button"] {display: none !important;}
-    </style>
-"""
-st.markdown(hide_streamlit_elements, unsafe_allow_html=True)
-
-# Optional: make the page look even cleaner
-
-
-st.markdown("""
-    <style>
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-        header {visibility: hidden;}
-    </style>
-""", unsafe_allow_html=True)
-
 # Page configuration - using "wide" for better use of space on desktop,
 # while CSS will ensure it remains user-friendly on mobile
 st.set_page_config(
@@ -62,207 +42,103 @@ st.set_page_config(
 
 # --------------------------------------------------
 # Custom CSS - Enhanced for better mobile & desktop responsiveness
+# Hides the Streamlit toolbar/menu/footer and applies the app theme;
+# served once from static/theme.css (see assets.py)
 # --------------------------------------------------
-st.markdown("""
-    <style>
-        /* --------------------------------------------------
-           GLOBAL APP THEME
-           -------------------------------------------------- */
-        .stApp {
-            background: linear-gradient(139deg, #f6fff8, #e8f5e9);
-            color: #1b5e20;
-            font-family: "Segoe UI", "Roboto", sans-serif;
-        }
-
-        /* Main content container - limit max width and center on large screens */
-        .main .block-container {
-            max-width: 1200px;
-            padding-left: 2rem;
-            padding-right: 2rem;
-            margin: 0 auto;
-        }
-
-        /* --------------------------------------------------
-           HEADINGS
-           -------------------------------------------------- */
-        h1, h2, h3, h4, h5, h6 {
-            text-align: center;
-            color: #1b5e20 !important;
-            font-weight: 700;
-        }
-
-        /* --------------------------------------------------
-           BUTTON STYLING
-           -------------------------------------------------- */
-        .stButton > button {
-            width: 100%;
-            border-radius: 14px;
-            background: linear-gradient(135deg, #2e7d32, #66bb6a);
-            color: white !important;
-            font-size: 18px;
-            font-weight: 600;
-            padding: 0.75em;
-            border: none;
-            transition: all 0.2s ease-in-out;
-        }
-
-        .stButton > button:hover {
-            background: linear-gradient(135deg, #388e3c, #81c784);
-            box-shadow: 0 6px 16px rgba(0, 0, 0, 0.15);
-            transform: translateY(-1px);
-        }
-
-        .stButton > button:active {
-            background: linear-gradient(135deg, #1b5e20, #43a047) !important;
-            transform: scale(0.97);
-        }
-
-        button[disabled] {
-            background: linear-gradient(135deg, #1b5e20, #66bb6a) !important;
-            opacity: 0.75;
-            cursor: wait;
-        }
-
-        /* --------------------------------------------------
-           FILE UPLOADER
-           -------------------------------------------------- */
-        [data-testid="stFileUploader"] {
-            border: 2px dashed #2e7d32;
-            border-radius: 16px;
-            padding: 1em;
-            background-color: #f1f8e9;
-            width: 100%;
-        }
-
-        /* --------------------------------------------------
-           IMAGES
-           -------------------------------------------------- */
-        img {
-            border-radius: 16px;
-            max-width: 100%;
-            height: auto;
-            display: block;
-            margin: 0 auto;
-        }
-
-        /* --------------------------------------------------
-           CARD UI
-           -------------------------------------------------- */
-        .card {
-            background: white;
-            border-radius: 18px;
-            padding: 20px;
-            box-shadow: 0 4px 14px rgba(0,0,0,0.08);
-            margin-bottom: 22px;
-            color: #1b5e20;
-        }
-
-        /* --------------------------------------------------
-           FOOTER
-           -------------------------------------------------- */
-        .footer {
-            text-align: center;
-            font-size: 13px;
-            color: #2e7d32 !important;
-            margin-top: 30px;
-        }
-
-        /* --------------------------------------------------
-           MOBILE & TABLET RESPONSIVENESS
-           -------------------------------------------------- */
-        @media (max-width: 1024px) { /* Tablets and smaller */
-            .main .block-container {
-                padding-left: 1.5rem;
-                padding-right: 1.5rem;
-            }
-            
-            h1 { font-size: 42px !important; }
-            h2 { font-size: 28px !important; }
-            
-            .stButton > button {
-                font-size: 17px;
-                padding: 0.7em;
-            }
-        }
-
-        @media (max-width: 768px) { /* Mobile phones */
-            .main .block-container {
-                max-width: 100%;
-                padding-left: 1rem;
-                padding-right: 1rem;
-            }
-            
-            h1 { font-size: 32px !important; }
-            h2 { font-size: 26px !important; }
-            h3 { font-size: 22px !important; }
-            
-            .stButton > button {
-                font-size: 16px;
-                padding: 0.65em;
-            }
-            
-            [data-testid="stFileUploader"] {
-                padding: 0.8em;
-            }
-            
-            .card {
-                padding: 16px;
-            }
-        }
-
-        @media (max-width: 480px) { /* Small phones */
-            h1 { font-size: 28px !important; }
-            .stButton > button {
-                font-size: 15px;
-            }
-        }
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(theme_tag(), unsafe_allow_html=True)
 
 
 # --------------------------------------------------
 # Load Data & Model
 # --------------------------------------------------
-with open("pest.json", "r") as f:
-    insect_data = json.load(f)
-
-class_names = [
-    'Acanthophilus helianthi rossi', 'Achaea janata', 'Acherontia styx', 'Adisura atkinsoni',
-    'Aedes aegypti', 'Aedes albopictus', 'Agrotis ipsilon', 'Alcidodes affaber',
-    'Aleurodicus dispersus', 'Amsacta albistriga', 'Anarsia ephippias', 'Anarsia epoitas',
-    'Anisolabis stallii', 'Antestia cruciata', 'Aphis craccivora', 'Apis mellifera',
-    'Apriona cinerea', 'Araecerus fasciculatus', 'Atractomorpha crenulata', 'Autographa nigrisigna',
-    'Bagrada hilaris', 'Basilepta fulvicorne', 'Batocera rufomaculata', 'Calathus erratus',
-    'Camponotus consobrinus', 'Chilasa clytia', 'Chilo sacchariphagus indicus',
-    'Conogethes punctiferalis', 'Danaus plexippus', 'Dendurus coarctatus',
-    'Deudorix (Virachola) isocrates', 'Elasmopalpus jasminophagus', 'Euwallacea fornicatus',
-    'Ferrisia virgata', 'Formosina flavipes', 'Gangara thyrsis', 'Holotrichia serrata',
-    'Hydrellia philippina', 'Hypolixus truncatulus', 'Leucopholis burmeisteri',
-    'Libellula depressa', 'Lucilia sericata', 'Melanagromyza obtusa', 'Mylabris phalerata',
-    'Oryctes rhinoceros', 'Paracoccus marginatus', 'Paradisynus rostratus', 'Parallelia algira',
-    'Parasa lepida', 'Pectinophora gossypiella', 'Pelopidas mathias', 'Pempherulus affinis',
-    'Pentalonia nigronervosa', 'peregrius maidis', 'Pericallia ricini', 'Perigea capensis',
-    'Petrobia latens', 'Phenacoccus solenopsis', 'Phoetaliotes nebrascensis',
-    'Phthorimaea operculella', 'Phyllocnistis citrella', 'Pieris brassicae', 'Pulchriphyllium',
-    'Rapala varuna', 'Rastrococcus iceryoides', 'Retithrips siriacus', 'Retithrips syriacus',
-    'Rhipiphorothrips cruentatus', 'Rhopalosiphum maidis', 'Rhopalosiphum padi',
-    'Rhynchophorus ferrugineus', 'Riptortus pedestris', 'Sahyadrassus malabaricus',
-    'Saissetia coffeae', 'Streptanus aemulans', 'sustama gremius', 'Sylepta derogata',
-    'Sympetrum signiferum', 'Sympetrum vulgatum', 'Tanymecus indicus Faust',
-    'Tetraneura nigriabdominalis', 'Tetrachynus cinnarinus', 'Tetranychus piercei',
-    'Thalassodes quadraria', 'Thosea andamanica', 'Thrips nigripilosus', 'Thrips orientalis',
-    'Thrips tabaci', 'Thysanoplusia orichalcea', 'Toxoptera odinae', 'Trialeurodes rara',
-    'Trialeurodes ricini', 'Trichoplusia ni', 'Tuta absoluta', 'Udaspes folus',
-    'Urentius hystricellus', 'uroleucon carthami', 'Vespula germanica', 'Xeroma mura',
-    'xylosadrus compactus', 'Xylotrchus quadripes', 'Zeuzera coffe', 'non insects',
-    'Papilio polytes', 'Periplaneta americana'
-]
+@st.cache_resource(max_entries=1)
+def load_species_data(version):
+    # Reloaded whenever pest.json changes (e.g. a newly registered species)
+    return load_insect_data()
 
 @st.cache_resource
-def load_model():
-    return tf.keras.models.load_model('mobilenetv2_insect.keras')
+def load_shared_cache():
+    # Front cache per process, shared tier across replicas (shared_cache.py)
+    return open_cache()
+
+@st.cache_resource(max_entries=1)
+def load_species_fragments(version):
+    # Rendered by the first replica to see this pest.json, fetched by the rest
+    insect_data = load_species_data(version)
+    return load_shared_cache().get_or_set(f"species:{content_hash(insect_data)}",
+                                          lambda: render_all(insect_data))
+
+@st.cache_resource(max_entries=1)
+def load_crop_index(version):
+    return CropIndex(load_species_data(version))
+
+@st.cache_resource(max_entries=1)
+def load_prior_table(species_version, prototype_version):
+    crop_index = load_crop_index(species_version)
+    return PriorTable(crop_index, extended_labels(load_prototypes(prototype_version)))
 
-model = load_model()
+@st.cache_resource
+def load_search_index():
+    # Updated in place (only changed species) when pest.json changes
+    return SearchIndex()
+
+@st.cache_resource
+def load_registry():
+    # One registry per process; other versions are loaded in the background
+    registry = ModelRegistry()
+    registry.load(DEFAULT_VERSION, MODEL_PATH, block=True)
+    return registry
+
+@st.cache_resource
+def load_rollup_engine():
+    return RollupEngine(rules=load_rules())
+
+@st.cache_resource
+def load_result_store():
+    # One writer thread per process; history is shared through results/
+    store = ResultStore(labels=labels, compaction_hooks=[load_rollup_engine().apply])
+    # Rollup tables up front, so Pest Reports works before the first compaction
+    with closing(store.connect()) as db, db:
+        create_rollup_tables(db)
+    return store
+
+@st.cache_resource
+def load_capture_queue():
+    # Uncertain photos for the next labelling round (capture.py)
+    return CaptureQueue()
+
+@st.cache_resource(max_entries=1)
+def load_prototypes(version):
+    return PrototypeTable.load()
+
+@st.cache_resource(max_entries=1)
+def load_taxonomy(species_version, prototype_version):
+    return TaxonomyIndex(load_species_data(species_version), extended_labels(load_prototypes(prototype_version)))
+
+@st.cache_resource(max_entries=1)
+def load_resolution_policy(version):
+    return ResolutionPolicy()
+
+registry = load_registry()
+registry.sync()
+shared_cache = load_shared_cache()
+runtime_config = load_runtime_config()
+upload_stats.write()
+resolution_policy = load_resolution_policy(file_version(PROFILE_PATH))
+insect_data = load_species_data(file_version(PEST_JSON))
+species_fragments = load_species_fragments(file_version(PEST_JSON))
+crop_index = load_crop_index(file_version(PEST_JSON))
+prior_table = load_prior_table(file_version(PEST_JSON), file_version(PROTOTYPE_PATH))
+search_index = load_search_index()
+search_index.update(insect_data, file_version(PEST_JSON))
+prototypes = load_prototypes(file_version(PROTOTYPE_PATH))
+labels = extended_labels(prototypes)
+taxonomy = load_taxonomy(file_version(PEST_JSON), file_version(PROTOTYPE_PATH))
+rollup_engine = load_rollup_engine()
+rollup_engine.set_taxonomy(insect_data, file_version(PEST_JSON))
+result_store = load_result_store()
+result_store.labels = labels
+capture_queue = load_capture_queue()
 
 # --------------------------------------------------
 # Helper Functions
@@ -333,12 +209,29 @@ def intro_page():
             with st.spinner("Wait Loading..."):
               st.session_state.page = "about_app"
               st.rerun()
+    with col_b:
+        if st.button("🔎 Search Pests"):
+            with st.spinner("Wait Loading..."):
+              st.session_state.page = "search"
+              st.rerun()
+    with col_c:
+        if st.button("🌾 Browse by Crop"):
+            with st.spinner("Wait Loading..."):
+              st.session_state.page = "crops"
+              st.rerun()
     with col_d:
         if st.button("👨‍🔬 Developers"):
             with st.spinner("Wait Loading..."):
                  st.session_state.page = "developers"
                  st.rerun()
 
+    col_e, col_f, col_g = st.columns(3)
+    with col_f:
+        if st.button("📊 Pest Reports", use_container_width=True):
+            with st.spinner("Wait Loading..."):
+              st.session_state.page = "history"
+              st.rerun()
+
 def about_app_page():
      st.title("ℹ️ About INSECTIFICA")
 
@@ -509,6 +402,65 @@ def developers_page():
               st.rerun()
 
 
+def image_hash(image):
+    return hashlib.sha1(image.getvalue()).hexdigest()
+
+def trap_section(image, trap_image, declared_crop, location):
+    digest = image_hash(image)
+    history = session_history(st.session_state)
+    key = f"trap:{digest}:{declared_crop}"
+    trap = history.get(key)
+
+    if trap is None:
+        # Decoding is left to detect_insects so large JPEGs can use draft mode
+        # One canary decision for the whole trap; every tile batch is still
+        # timed, counted and mirrored to the shadow like a single photo
+        version = registry.choose()
+
+        def predict_batch(batch):
+            return prior_table.apply(registry.predict_arrays(batch, version=version).probs, crop=declared_crop)
+
+        with st.spinner("🤖 Scanning the trap for insects... Please wait a moment"):
+            try:
+                result = detect_insects(trap_image, predict_batch, labels, input_size=version.input_size,
+                                        batch_size=runtime_config["batch_size"])
+            except OSError:
+                upload_stats.reject("corrupt")
+                st.error("⚠️ The image file is damaged or incomplete. Please try another photo.")
+                return
+        # Traps are always decoded at tile scale, i.e. downsampled
+        upload_stats.accept(result["decode_ms"], True)
+        for detection in result["detections"]:
+            result_store.record(digest, labels.index(detection["species"]), detection["confidence"],
+                                crop=declared_crop, location=location, version=version.name)
+        # Only the annotated preview and the counts outlive this run
+        history.add(key, thumbnail_bytes(draw_detections(trap_image, result), size=PREVIEW_SIZE),
+                    counts=result["counts"], detections=len(result["detections"]),
+                    elapsed_ms=result["elapsed_ms"])
+        trap_image.close()
+        del trap_image, result
+        trap = history.get(key)
+
+    st.markdown("<h3 style='text-align: center; color: #2e7d32;'>Detected Insects</h3>", unsafe_allow_html=True)
+    st.image(
+        trap["thumbnail"],
+        use_container_width=True,
+        caption=f"{trap['detections']} detections in {trap['elapsed_ms'] / 1000:.1f}s"
+    )
+    st.markdown("---")
+    if trap["counts"]:
+        st.table([{"Species": name, "Count": count} for name, count in trap["counts"].items()])
+    else:
+        st.info("No insects detected. Try a sharper photo taken square-on to the trap.")
+
+    st.markdown("---")
+    col_back1, col_back2, col_back3 = st.columns([1, 1, 1])
+    with col_back2:
+        if st.button("⬅️ Back to Home", use_container_width=True, key="back_trap"):
+             with st.spinner("Wait Loading..."):
+                st.session_state.page = "intro"
+                st.rerun()
+
 def classification_page():
     st.title("🔍 Insect Identification")
 
@@ -526,11 +478,32 @@ def classification_page():
     image = None
 
     with col2:
+        mode = st.radio(
+            "Identification Mode",
+            ["Single Insect", "Sticky Trap (many insects)"],
+            horizontal=True
+        )
         input_method = st.radio(
             "Select Image Source",
             ["Upload Image", "Use Camera"],
             horizontal=True
         )
+        crop_options = [crop for crop, _ in crop_index.crops()]
+        declared_crop = st.selectbox(
+            "Field crop (optional)",
+            [None] + crop_options,
+            format_func=lambda crop: "Not specified" if crop is None else crop.title(),
+            help="Favours pests known to attack this crop"
+        )
+        location = st.text_input(
+            "Location (optional)",
+            placeholder="Village, district",
+            help="Saved with the result for the pest reports"
+        ).strip() or None
+        explain = st.checkbox(
+            "🔬 Show what the AI looked at",
+            help="Highlights the parts of the photo that drove the answer"
+        )
 
         if input_method == "Upload Image":
             uploaded_file = st.file_uploader(
@@ -558,90 +531,132 @@ def classification_page():
     
     # ---------------- Photo Tips Section (Always Visible) ----------------
     st.markdown("""
-    <div style="background: #f1f8e9; border-radius: 16px; padding: 20px; margin-bottom: 25px; border-left: 5px solid #4caf50;">
-        <h4 style="color: #2e7d32; text-align: center;">💡 Best Tips for Accurate Results</h4>
-        <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 15px; margin-top: 15px;">
-            <div style="text-align: center;">
-                <div style="font-size: 40px; margin-bottom: 8px;">📸</div>
-                <b>Clear & Focused</b><br>
-                <small>Get close, keep the insect sharp</small>
-            </div>
-            <div style="text-align: center;">
-                <div style="font-size: 40px; margin-bottom: 8px;">☀️</div>
-                <b>Natural Light</b><br>
-                <small>Avoid shadows, use daylight</small>
-            </div>
-            <div style="text-align: center;">
-                <div style="font-size: 40px; margin-bottom: 8px;">👀</div>
-                <b>Multiple Angles</b><br>
-                <small>Side, top, wings if visible</small>
-            </div>
-            <div style="text-align: center;">
-                <div style="font-size: 40px; margin-bottom: 8px;">👐</div>
-                <b>Plain Background</b><br>
-                <small>Leaf, wall, or hand works best</small>
-            </div>
+    <div class="tips">
+        <h4>💡 Best Tips for Accurate Results</h4>
+        <div class="tips-grid">
+            <div class="tip"><div class="tip-icon">📸</div><b>Clear & Focused</b><br><small>Get close, keep the insect sharp</small></div>
+            <div class="tip"><div class="tip-icon">☀️</div><b>Natural Light</b><br><small>Avoid shadows, use daylight</small></div>
+            <div class="tip"><div class="tip-icon">👀</div><b>Multiple Angles</b><br><small>Side, top, wings if visible</small></div>
+            <div class="tip"><div class="tip-icon">👐</div><b>Plain Background</b><br><small>Leaf, wall, or hand works best</small></div>
         </div>
     </div>
     """, unsafe_allow_html=True)
     
     # ---------------- Image Processing (Only if uploaded) ----------------
+    upload = None
     if image is not None:
-        image = Image.open(image).convert("RGB")
-       
+        # Header checks only; nothing is decoded for a rejected file
+        try:
+            upload = open_upload(image.getvalue())
+        except UploadRejected as exc:
+            st.error(f"⚠️ {exc} Please try another photo.")
+            image = None
+
+    if image is not None and mode.startswith("Sticky Trap"):
+        trap_section(image, upload, declared_crop, location)
+
+    elif image is not None:
+        digest = image_hash(image)
+        history = session_history(st.session_state)
+        # Reruns (e.g. typing a location) reuse the stored result instead of
+        # decoding and classifying the photo again
+        cached = history.get(f"{digest}:{declared_crop}")
+        if cached and explain and cached.get("heatmap") is None:
+            cached = None
+
         # Display uploaded image beautifully
         st.markdown("<h3 style='text-align: center; color: #2e7d32;'>Uploaded Image</h3>", unsafe_allow_html=True)
-        st.image(image, use_container_width=True, caption="Ready for analysis")
-        
-        # Preprocess and predict
-        img = image.resize((190, 190))
-        img_array = np.array(img)
-        img_array = preprocess_input(img_array)
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        with st.spinner("🤖 AI is analyzing the insect... Please wait a moment"):
-            predictions = model.predict(img_array)
-            predicted_idx = np.argmax(predictions[0])
-            confidence = float(np.max(predictions[0]))  # Safest way: get max prob as clean float
-        
+        if cached:
+            st.image(cached["thumbnail"], caption="Analysed")
+            predicted_idx, confidence = cached["species"], cached["confidence"]
+            answer, thumbnail, heatmap = cached.get("answer"), cached["thumbnail"], cached.get("heatmap")
+        else:
+            # The header was fine, but a truncated file only fails here
+            try:
+                image = decode_upload(upload)
+            except UploadRejected as exc:
+                st.error(f"⚠️ {exc} Please try another photo.")
+                st.stop()
+            st.image(preview(image), use_container_width=True, caption="Ready for analysis")
+
+            # Same photo seen by any replica: reuse its answer while the model,
+            # prototypes and crop priors are unchanged. Keyed on the version
+            # routing picks, so canary answers are only served as canary answers.
+            model = registry.choose()
+            prediction_key = (f"prediction:{digest}:{declared_crop}:{model.name}@{file_version(model.path)}:"
+                              f"{file_version(PROTOTYPE_PATH)}:{file_version(PEST_JSON)}")
+            shared = shared_cache.get_json(prediction_key)
+            if shared is not None and explain and "heatmap" not in shared:
+                shared = None
+
+            # Preprocess and predict
+            raw = {}
+
+            def postprocess(result):
+                probs = raw["probs"] = result.probs
+                # Prototypes live in the default model's embedding space
+                if result.version == DEFAULT_VERSION:
+                    probs = extend_predictions(probs, result.embeddings, prototypes)
+                return prior_table.apply(probs, crop=declared_crop)
+
+            if shared is None:
+                with st.spinner("🤖 AI is analyzing the insect... Please wait a moment"):
+                    # With explain, the heatmap comes out of the same pass as the answer
+                    result = predict_adaptive(registry, [image], resolution_policy,
+                                              postprocess=postprocess, explain=explain, version=model)
+                    probs = result.probs[0]
+                    shared = {"probs": np.round(probs, 6).tolist(), "version": result.version}
+                    if result.heatmaps is not None:
+                        shared["heatmap"] = np.round(result.heatmaps[0], 3).tolist()
+                    shared_cache.set_json(prediction_key, shared, ttl=PREDICTION_TTL)
+                # Only queues the few uncertain photos; written off the request thread.
+                # Embeddings are kept for the default model, whose space sampling uses.
+                capture_queue.submit(image, digest, probs, raw_probs=raw["probs"][0],
+                                     embedding=result.embeddings[0] if result.version == DEFAULT_VERSION else None,
+                                     crop=declared_crop, location=location, version=result.version)
+                del result
+            else:
+                probs = np.asarray(shared["probs"], dtype=np.float32)
+            predicted_idx = int(np.argmax(probs))
+            confidence = float(np.max(probs))  # Safest way: get max prob as clean float
+            answer = taxonomy.resolve(probs)
+            # Queued only; written to disk by the store's background thread
+            result_store.record(digest, predicted_idx, confidence, probs,
+                                crop=declared_crop, location=location, version=shared["version"])
+            thumbnail, heatmap = thumbnail_bytes(image), shared.get("heatmap")
+            history.add(f"{digest}:{declared_crop}", thumbnail,
+                        species=predicted_idx, confidence=confidence, answer=answer, heatmap=heatmap)
+            # Free the decoded pixels and arrays now, not at the end of the run
+            image.close()
+            del image, probs, shared
+
         st.markdown("---")
         
-        if predicted_idx >= len(class_names):
+        if predicted_idx >= len(labels):
             st.error("⚠️ Unable to classify. Please try a clearer image of a single insect.")
         else:
-            predicted_class = class_names[predicted_idx]
+            predicted_class = labels[predicted_idx]
             # Confidence bar with animation feel
-            st.success(f"**Identified Species:** {predicted_class}")
-            st.progress(confidence)
-            st.write(f"**Confidence Level:** {confidence:.1%}")
+            if answer and answer["level"] != "Species":
+                # Unsure between related species: report the group it is sure of
+                st.success(f"**Identified {answer['level']}:** {answer['name']}")
+                st.progress(answer["confidence"])
+                st.write(f"**Confidence Level:** {answer['confidence']:.1%}")
+                st.caption(f"Closest species: {predicted_class} ({confidence:.1%}). "
+                           "A clearer photo may confirm the exact species.")
+            else:
+                st.success(f"**Identified Species:** {predicted_class}")
+                st.progress(confidence)
+                st.write(f"**Confidence Level:** {confidence:.1%}")
+            if declared_crop:
+                st.caption(f"Weighted towards pests known on {declared_crop.title()}.")
+            if explain and heatmap is not None:
+                st.image(heatmap_overlay(thumbnail, heatmap),
+                         caption="🔬 Warmer areas influenced the model's answer most")
             
-            # Detailed Info
-            if predicted_class in insect_data:
-                details = insect_data[predicted_class]
-                st.markdown("## 🧬 Taxonomic Classification")
-                col_k, col_p, col_c = st.columns(3)
-                with col_k: st.write(f"**Kingdom:** {details.get('Kingdom', 'N/A')}")
-                with col_k: st.write(f"**Phylum:** {details.get('Phylum', 'N/A')}")
-                with col_k: st.write(f"**Class:** {details.get('Class', 'N/A')}")
-                
-                col_o, col_f = st.columns(2)
-                with col_o: st.write(f"**Order:** {details.get('Order', 'N/A')}")
-                with col_o: st.write(f"**Family:** {details.get('Family', 'N/A')}")
-                
-                st.write(f"**Genus:** {details.get('Genus', 'N/A')}")
-                st.write(f"**Species:** {details.get('Species', 'N/A')}")
-                
-                st.markdown("## 🌿 Host Crops")
-                st.info(details.get("Host Crops", "Not available"))
-                
-                st.markdown("## 🐛 Damage Symptoms")
-                st.warning(details.get("Damage Symptoms", "Not available"))
-                
-                st.markdown("## 🛡️ Integrated Pest Management (IPM)")
-                st.success(details.get("IPM Measures", "Not available"))
-                
-                st.markdown("## ⚠️ Chemical Control (If Needed)")
-                st.error(details.get("Chemical Control", "Not available"))
+            # Detailed Info (pre-rendered once per species)
+            if predicted_class in species_fragments:
+                st.markdown(species_fragments[predicted_class], unsafe_allow_html=True)
             else:
                 st.warning("🔍 Detailed information for this species is not yet available in our database.")
         
@@ -666,6 +681,149 @@ def classification_page():
                  with st.spinner("Wait Loading..."):
                      st.session_state.page = "intro"
                      st.rerun()
+def search_page():
+    st.title("🔎 Search Pest Database")
+
+    query = st.text_input(
+        "Search by name, crop, damage or control measure",
+        placeholder='e.g. "cotton sucking pest" or "all Lepidoptera on tomato"'
+    )
+    col_o, col_f, col_c = st.columns(3)
+    with col_o:
+        order = st.selectbox("Order", ["All"] + [v for v, _ in search_index.facet_values("order")])
+    with col_f:
+        family = st.selectbox("Family", ["All"] + [v for v, _ in search_index.facet_values("family")])
+    with col_c:
+        crop = st.selectbox("Host Crop", ["All"] + [v for v, _ in search_index.facet_values("crop")])
+
+    filters = {
+        "order": None if order == "All" else order,
+        "family": None if family == "All" else family,
+        "crop": None if crop == "All" else crop,
+    }
+    if query or any(filters.values()):
+        results = search_index.search(query, limit=50, **filters)
+        st.write(f"**{len(results)} species found**")
+        for name, _ in results:
+            details = insect_data[name]
+            with st.expander(f"{details.get('Common Name', name)} – {name}"):
+                st.markdown(species_fragments[name], unsafe_allow_html=True)
+    else:
+        st.info("👆 Type a search or pick a filter to browse the pest database.")
+
+    st.markdown("---")
+    if st.button("⬅️ Back to Home"):
+         with st.spinner("Wait Loading..."):
+              st.session_state.page = "intro"
+              st.rerun()
+
+def crops_page():
+    st.title("🌾 Browse Pests by Crop")
+
+    crop = st.selectbox(
+        "Select your crop",
+        [crop for crop, _ in crop_index.crops()],
+        format_func=lambda crop: crop.title()
+    )
+    pests = crop_index.pests_for(crop)
+    direct = sorted(name for name, kind in pests.items() if kind != GROUP)
+    grouped = sorted(name for name, kind in pests.items() if kind == GROUP)
+
+    st.write(f"**{len(direct)} pests recorded on {crop.title()}**")
+    for name in direct:
+        with st.expander(f"{insect_data[name].get('Common Name', name)} – {name}"):
+            st.markdown(species_fragments[name], unsafe_allow_html=True)
+    if grouped:
+        groups = ", ".join(sorted(g.title() for g in crop_index.crop_groups[crop]))
+        st.write(f"**Also recorded on {groups}**")
+        for name in grouped:
+            with st.expander(f"{insect_data[name].get('Common Name', name)} – {name}"):
+                st.markdown(species_fragments[name], unsafe_allow_html=True)
+
+    st.markdown("---")
+    if st.button("⬅️ Back to Home"):
+         with st.spinner("Wait Loading..."):
+              st.session_state.page = "intro"
+              st.rerun()
+
+def outbreaks_section():
+    # Reads only pre-aggregated rollups, so cost does not grow with history
+    st.markdown("---")
+    st.subheader("🚨 Outbreak Watch")
+    with closing(result_store.connect()) as db:
+        region_options = [ALL_REGIONS] + sorted(regions(db))
+        col_r, col_d = st.columns(2)
+        with col_r:
+            region = st.selectbox("District", region_options,
+                                  format_func=lambda r: "All districts" if r == ALL_REGIONS else r.title())
+        with col_d:
+            dimension = st.radio("Group by", ["species", "family", "order"], horizontal=True,
+                                 format_func=str.title)
+        leaders = top(db, dimension, region=region, granularity="week", count=1)
+        if not leaders:
+            st.info("No reports this week.")
+        else:
+            weekly = {key: dict(series(db, dimension, key, region, granularity="week", count=8))
+                      for key, _ in leaders[:5]}
+            st.bar_chart(pd.DataFrame(weekly))
+            st.table([{dimension.title(): key, "This week": n} for key, n in leaders])
+
+    alerts = read_alerts(rollup_engine.alerts_path, limit=10)
+    if alerts:
+        with st.expander(f"Recent alerts ({len(alerts)})"):
+            for alert in alerts:
+                st.warning(
+                    f"{alert['key']} – {alert['count']} reports in {alert['region'].title()} "
+                    f"over {alert['window_days']} days "
+                    f"({time.strftime('%d %b %H:%M', time.localtime(alert['time']))})"
+                )
+
+def history_page():
+    st.title("📊 Pest Reports")
+
+    days = st.select_slider("Period", options=[7, 30, 90, 365], value=30,
+                            format_func=lambda d: f"Last {d} days")
+    start = time.time() - days * 86400
+    totals = [(idx, n) for idx, n in result_store.species_totals(start)
+              if idx < len(labels) and labels[idx] != "non insects"]
+    if not totals:
+        st.info("No identifications recorded in this period yet.")
+    else:
+        chosen = st.multiselect(
+            "Species",
+            [idx for idx, _ in totals],
+            default=[idx for idx, _ in totals[:5]],
+            format_func=lambda idx: labels[idx]
+        )
+        rows = result_store.daily_counts(start, species=chosen)
+        if rows:
+            counts = pd.DataFrame(rows, columns=["Day", "Species", "Count"])
+            counts["Species"] = counts["Species"].map(lambda idx: labels[idx])
+            st.line_chart(counts.pivot_table(index="Day", columns="Species", values="Count", fill_value=0))
+
+        st.write(f"**{sum(n for _, n in totals)} identifications of {len(totals)} species**")
+        st.table([{"Species": labels[idx], "Count": n} for idx, n in totals[:20]])
+
+        with st.expander("Latest results"):
+            st.table([
+                {
+                    "Time": time.strftime("%Y-%m-%d %H:%M", time.localtime(row["ts"])),
+                    "Species": labels[row["species"]] if row["species"] < len(labels) else row["species"],
+                    "Confidence": f"{row['confidence']:.0%}",
+                    "Crop": row["crop"] or "",
+                    "Location": row["location"] or "",
+                }
+                for row in result_store.query(start, species=chosen, limit=50)
+            ])
+    outbreaks_section()
+    st.caption("New results appear within a minute of being identified.")
+
+    st.markdown("---")
+    if st.button("⬅️ Back to Home"):
+         with st.spinner("Wait Loading..."):
+              st.session_state.page = "intro"
+              st.rerun()
+
 # --------------------------------------------------
 # Page Routing
 # --------------------------------------------------
@@ -682,6 +840,12 @@ elif st.session_state.page == "features":
     features_page()
 elif st.session_state.page == "developers":
     developers_page()
+elif st.session_state.page == "search":
+    search_page()
+elif st.session_state.page == "crops":
+    crops_page()
+elif st.session_state.page == "history":
+    history_page()
 
 # --------------------------------------------------
 # Footer
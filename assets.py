@@ -0,0 +1,37 @@
+# --------------------------------------------------
+# Insectifica – theme & static assets
+#
+# The stylesheet is served once from static/ (enableStaticServing in
+# .streamlit/config.toml) with a content hash in the URL, so browsers cache
+# it and every rerun only sends a short <link> tag. Without static serving
+# the CSS falls back to an inline <style> block.
+# --------------------------------------------------
+import hashlib
+import os
+
+import streamlit as st
+
+from insect_core import file_version
+
+STATIC_DIR = "static"
+THEME_CSS = os.path.join(STATIC_DIR, "theme.css")
+
+
+@st.cache_resource(max_entries=8)
+def _load_asset(path, version):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return text, hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def asset_url(path):
+    _, digest = _load_asset(path, file_version(path))
+    name = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+    return f"app/static/{name}?v={digest}"
+
+
+def theme_tag(path=THEME_CSS):
+    if st.get_option("server.enableStaticServing"):
+        return f'<link rel="stylesheet" href="{asset_url(path)}">'
+    text, _ = _load_asset(path, file_version(path))
+    return f"<style>{text}</style>"
@@ -0,0 +1,160 @@
+# --------------------------------------------------
+# Insectifica – runtime autotuner
+#
+# Sweeps TensorFlow intra/inter-op threads, batch size and the number of
+# worker processes on this machine. Every thread setting needs a fresh
+# process (TensorFlow fixes its pools at start-up), so each trial spawns
+# its workers, pins them to separate CPU slices, loads the model and runs
+# closed-loop batches for each batch size. The configuration with the
+# highest throughput whose p99 batch latency meets the target is written
+# to runtime_config.json, which the model loader applies at start-up.
+#
+# Usage:
+#   python autotune.py --p99-ms 250 [--images val/] [--seconds 5]
+# --------------------------------------------------
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from insect_core import MODEL_PATH, preprocess_image
+from runtime_config import DEFAULTS, RUNTIME_CONFIG, apply_runtime_config, available_cpus, load_runtime_config
+
+BATCH_SIZES = (1, 4, 8, 16, 32)
+INTER_OP = (1, 2)
+SAMPLE_IMAGES = 64
+
+
+def thread_options(cpus):
+    options, n = [], 1
+    while n <= cpus:
+        options.append(n)
+        n *= 2
+    if cpus not in options:
+        options.append(cpus)
+    return options
+
+
+def trials(cpus, max_workers):
+    # Skip settings that oversubscribe the cores: workers x intra-op <= cpus
+    workers = [w for w in thread_options(cpus) if w <= max_workers]
+    for w, intra, inter in itertools.product(workers, thread_options(cpus), INTER_OP):
+        if w * intra <= cpus:
+            yield {"workers": w, "intra_op_threads": intra, "inter_op_threads": inter}
+
+
+def _worker(index, trial, model_path, images, batch_sizes, seconds, barrier, results):
+    # The trial's settings, applied the same way the app applies the file
+    apply_runtime_config(dict(DEFAULTS, pin_cpus=True, **trial), worker=index)
+
+    from model_registry import ModelVersion, load_version_model
+    version = ModelVersion(model_path, model_path, load_version_model(model_path))
+
+    for batch_size in batch_sizes:
+        batch = np.resize(images, (batch_size,) + images.shape[1:])
+        version.run(batch)  # trace this batch shape
+        barrier.wait()
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            version.run(batch)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        results.put((batch_size, index, latencies))
+
+
+def run_trial(trial, model_path, images, batch_sizes, seconds):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(trial["workers"])
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=_worker, args=(i, trial, model_path, images, batch_sizes, seconds, barrier, results))
+        for i in range(trial["workers"])
+    ]
+    for process in workers:
+        process.start()
+    collected = {}
+    for _ in range(trial["workers"] * len(batch_sizes)):
+        batch_size, _, latencies = results.get()
+        collected.setdefault(batch_size, []).extend(latencies)
+    for process in workers:
+        process.join()
+
+    rows = []
+    for batch_size, latencies in sorted(collected.items()):
+        latencies = np.array(latencies)
+        rows.append(dict(
+            trial, batch_size=batch_size,
+            throughput=len(latencies) * batch_size / seconds,
+            p50_ms=float(np.percentile(latencies, 50)),
+            p99_ms=float(np.percentile(latencies, 99)),
+        ))
+    return rows
+
+
+def sample_images(folder, input_size):
+    if folder:
+        from benchmark import load_images
+        return np.stack([preprocess_image(img, input_size) for img, _ in load_images(folder, SAMPLE_IMAGES)])
+    # Latency does not depend on content; random pixels are enough
+    rng = np.random.default_rng(0)
+    return rng.uniform(-1.0, 1.0, (SAMPLE_IMAGES, input_size, input_size, 3)).astype(np.float32)
+
+
+def choose(rows, p99_ms):
+    within = [row for row in rows if row["p99_ms"] <= p99_ms]
+    if not within:
+        # Nothing meets the target: take the lowest-latency setting instead
+        return min(rows, key=lambda row: row["p99_ms"]), False
+    return max(within, key=lambda row: row["throughput"]), True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune threads, batch size and workers for this machine")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--p99-ms", type=float, default=250.0, help="p99 latency target per batch")
+    parser.add_argument("--images", help="Optional image folder; random inputs otherwise")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Measurement time per batch size")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    parser.add_argument("--output", default=RUNTIME_CONFIG)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    input_size = tf.keras.models.load_model(args.model).input_shape[1]
+    images = sample_images(args.images, input_size)
+    cpus = len(available_cpus())
+    # Keep deployment choices (e.g. precision) and tune with them in effect
+    current = load_runtime_config(args.output)
+
+    print(f"{'workers':>7} {'intra':>5} {'inter':>5} {'batch':>5} {'img/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    rows = []
+    for trial in trials(cpus, args.max_workers):
+        trial["precision"] = current["precision"]
+        for row in run_trial(trial, args.model, images, args.batch_sizes, args.seconds):
+            rows.append(row)
+            print(f"{row['workers']:>7} {row['intra_op_threads']:>5} {row['inter_op_threads']:>5} "
+                  f"{row['batch_size']:>5} {row['throughput']:8.1f} {row['p50_ms']:8.1f} {row['p99_ms']:8.1f}")
+
+    best, met = choose(rows, args.p99_ms)
+    config = dict(current)
+    config.update({
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": best["inter_op_threads"],
+        "batch_size": best["batch_size"],
+        "workers": best["workers"],
+        "pin_cpus": best["workers"] > 1,
+        "measured": {
+            "cpus": cpus, "p99_target_ms": args.p99_ms, "target_met": met,
+            "throughput": best["throughput"], "p50_ms": best["p50_ms"], "p99_ms": best["p99_ms"],
+            "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    })
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=4)
+    status = "✅" if met else "⚠️ p99 target not met;"
+    print(f"{status} {best['workers']} workers × {best['intra_op_threads']}/{best['inter_op_threads']} threads, "
+          f"batch {best['batch_size']}: {best['throughput']:.1f} img/s, p99 {best['p99_ms']:.1f} ms → {args.output}")
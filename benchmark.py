@@ -0,0 +1,153 @@
+# --------------------------------------------------
+# Insectifica – inference benchmark
+#
+# Measures latency, throughput and accuracy per input resolution, plus the
+# low-res → high-res cascade at several confidence thresholds. Accuracy is
+# computed when the image folder has one sub-folder per class name;
+# agreement is always reported against the model's native resolution.
+#
+# Usage:
+#   python benchmark.py --images val/ --resolutions 128 160 190 224
+# The resolution profile is written to benchmark_resolutions.json and used
+# by resolution.ResolutionPolicy for latency budgets.
+# --------------------------------------------------
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from insect_core import MODEL_PATH, class_names
+from model_registry import ModelVersion, load_version_model
+from prototypes import IMAGE_EXTENSIONS
+from resolution import PROFILE_PATH, RESOLUTIONS
+
+CASCADE_THRESHOLDS = (0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+def list_images(folder, limit=None):
+    # Returns [(path, class index or -1)]; sub-folders named after a class
+    # map to its index in class_names (which is not alphabetical)
+    items = []
+    for root, _, files in sorted(os.walk(folder)):
+        name = os.path.basename(root)
+        label = class_names.index(name) if name in class_names else -1
+        for file in sorted(files):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((os.path.join(root, file), label))
+                if limit and len(items) >= limit:
+                    return items
+    return items
+
+
+def load_images(folder, limit=None):
+    # Returns [(PIL image, class index or -1)]
+    return [(Image.open(path).convert("RGB"), label) for path, label in list_images(folder, limit)]
+
+
+def run_resolution(version, images, resolution, batch_size, latency_samples):
+    version.predict(images[:1], resolution)  # trace the graph for this size
+
+    latencies = []
+    for img in images[:latency_samples]:
+        start = time.perf_counter()
+        version.predict([img], resolution)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    probs = []
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        batch_probs, _ = version.predict(images[i:i + batch_size], resolution)
+        probs.append(batch_probs)
+    elapsed = time.perf_counter() - start
+    return np.concatenate(probs), np.array(latencies), len(images) / elapsed
+
+
+def benchmark(model_path, folder, resolutions, batch_size=16, latency_samples=50, limit=None):
+    items = load_images(folder, limit)
+    if not items:
+        raise SystemExit(f"No images found in {folder}")
+    images = [img for img, _ in items]
+    labels = np.array([label for _, label in items])
+    labelled = labels >= 0
+
+    version = ModelVersion(os.path.basename(model_path), model_path, load_version_model(model_path))
+    native = version.input_size
+    resolutions = sorted(set(resolutions) | {native})
+
+    results = {}
+    for res in resolutions:
+        probs, latencies, throughput = run_resolution(version, images, res, batch_size, latency_samples)
+        results[res] = {"probs": probs, "latencies": latencies, "throughput": throughput}
+
+    native_preds = results[native]["probs"].argmax(axis=1)
+    report = {"model": model_path, "images": len(images), "labelled": int(labelled.sum()),
+              "native": native, "resolutions": {}, "cascade": []}
+    for res in resolutions:
+        preds = results[res]["probs"].argmax(axis=1)
+        latencies = results[res]["latencies"]
+        row = {
+            "latency_ms": {"p50": float(np.percentile(latencies, 50)),
+                           "p95": float(np.percentile(latencies, 95))},
+            "throughput_ips": results[res]["throughput"],
+            "agreement": float(np.mean(preds == native_preds)),
+        }
+        if labelled.any():
+            row["top1"] = float(np.mean(preds[labelled] == labels[labelled]))
+        report["resolutions"][str(res)] = row
+
+    # Cascade: cheapest resolution first, escalate to native below the threshold
+    low = resolutions[0]
+    low_probs = results[low]["probs"]
+    low_ms = report["resolutions"][str(low)]["latency_ms"]["p50"]
+    native_ms = report["resolutions"][str(native)]["latency_ms"]["p50"]
+    for threshold in CASCADE_THRESHOLDS:
+        escalated = low_probs.max(axis=1) < threshold
+        preds = np.where(escalated, native_preds, low_probs.argmax(axis=1))
+        row = {
+            "low": low,
+            "threshold": threshold,
+            "escalated": float(escalated.mean()),
+            "expected_latency_ms": low_ms + float(escalated.mean()) * native_ms,
+            "agreement": float(np.mean(preds == native_preds)),
+        }
+        if labelled.any():
+            row["top1"] = float(np.mean(preds[labelled] == labels[labelled]))
+        report["cascade"].append(row)
+    return report
+
+
+def print_report(report):
+    print(f"🧪 {report['model']} – {report['images']} images ({report['labelled']} labelled)")
+    print(f"{'res':>5} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>8} {'agree':>7} {'top1':>7}")
+    for res, row in report["resolutions"].items():
+        top1 = f"{row['top1']:.1%}" if "top1" in row else "-"
+        print(f"{res:>5} {row['latency_ms']['p50']:8.1f} {row['latency_ms']['p95']:8.1f} "
+              f"{row['throughput_ips']:8.1f} {row['agreement']:7.1%} {top1:>7}")
+    print(f"\nCascade {report['cascade'][0]['low']} → {report['native']}")
+    print(f"{'thresh':>6} {'escal':>7} {'exp ms':>8} {'agree':>7} {'top1':>7}")
+    for row in report["cascade"]:
+        top1 = f"{row['top1']:.1%}" if "top1" in row else "-"
+        print(f"{row['threshold']:6.2f} {row['escalated']:7.1%} {row['expected_latency_ms']:8.1f} "
+              f"{row['agreement']:7.1%} {top1:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the classifier per input resolution")
+    parser.add_argument("--images", required=True, help="Folder of images (optionally one sub-folder per class)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--resolutions", type=int, nargs="+", default=list(RESOLUTIONS))
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--latency-samples", type=int, default=50)
+    parser.add_argument("--limit", type=int, help="Use at most this many images")
+    parser.add_argument("--output", default=PROFILE_PATH)
+    args = parser.parse_args()
+
+    report = benchmark(args.model, args.images, args.resolutions, args.batch_size,
+                       args.latency_samples, args.limit)
+    print_report(report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n✅ Profile written to {args.output}")
@@ -0,0 +1,319 @@
+# --------------------------------------------------
+# Insectifica – active-learning capture queue
+#
+# Photos the model is unsure about are the most useful ones to label.
+# The app calls submit() for each fresh prediction; it only checks the
+# probabilities and queues the image. A writer thread deduplicates by
+# image hash, stores one downscaled JPEG per photo in captures/ and its
+# metadata (top-k, embedding, crop, reason) in captures/captures.db. The
+# queue is bounded: above MAX_ITEMS / MAX_BYTES the most confident
+# unlabelled captures are evicted first. Labelled ones are kept.
+#
+# Labelling round:
+#   python capture.py select --count 200          # diverse batch -> label_batch.csv
+#   (fill in the "label" column with class names; "reject" discards)
+#   python capture.py import label_batch.csv
+#   python train.py --train train/ --val val/ --captures captures --init mobilenetv2_insect.keras
+# Labelled captures are read from captures/ directly by the shard
+# builder, so no second copy of the images is made.
+# --------------------------------------------------
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+import numpy as np
+
+from result_store import top_k
+
+CAPTURE_DIR = "captures"
+DB_NAME = "captures.db"
+BATCH_FILE = "label_batch.csv"
+CAPTURE_BELOW = 0.6       # same bar as the resolution escalation
+MIN_MARGIN = 0.15         # top-1 vs top-2 closer than this is uncertain too
+CAPTURE_SIDE = 512        # larger than any training resolution
+JPEG_QUALITY = 90
+MAX_ITEMS = 20000
+MAX_BYTES = 1024 * 1024 * 1024
+QUEUE_SIZE = 64
+SEEN_SIZE = 4096          # recent hashes skipped on the request thread; the DB dedups the rest
+REJECT = "reject"
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    image_hash TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    reason TEXT NOT NULL,
+    species INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    top_k TEXT,
+    embedding BLOB,
+    crop TEXT,
+    location TEXT,
+    version TEXT,
+    bytes INTEGER NOT NULL,
+    batch TEXT,
+    label TEXT,
+    labelled_ts REAL
+);
+CREATE INDEX IF NOT EXISTS captures_unlabelled ON captures (label, confidence);
+"""
+
+
+def capture_reason(probs, raw_probs=None, below=CAPTURE_BELOW, min_margin=MIN_MARGIN):
+    # Why this prediction is worth labelling, or None
+    probs = np.asarray(probs, dtype=np.float32).reshape(-1)
+    best, second = np.sort(probs)[-2:][::-1] if len(probs) > 1 else (probs.max(), 0.0)
+    if best < below:
+        return "low_confidence"
+    if best - second < min_margin:
+        return "small_margin"
+    if raw_probs is not None:
+        raw_probs = np.asarray(raw_probs, dtype=np.float32).reshape(-1)
+        # Crop priors or prototypes overruled the network's own answer
+        if int(np.argmax(raw_probs)) != int(np.argmax(probs)):
+            return "disagreement"
+    return None
+
+
+class CaptureQueue:
+    def __init__(self, root=CAPTURE_DIR, max_items=MAX_ITEMS, max_bytes=MAX_BYTES):
+        self.root = root
+        self.db_path = os.path.join(root, DB_NAME)
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._seen = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+        with closing(self.connect()) as db, db:
+            db.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._run, name="capture-queue", daemon=True)
+        self._writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def image_path(self, image_hash):
+        return _image_path(self.root, image_hash)
+
+    # --------------------------------------------------
+    # Writing
+    # --------------------------------------------------
+    def submit(self, image, image_hash, probs, embedding=None, raw_probs=None, crop=None,
+               location=None, version=None):
+        # Cheap on the request thread: a probability check and, for the few
+        # uncertain photos, a copy of the decoded image for the writer
+        reason = capture_reason(probs, raw_probs)
+        if reason is None or image_hash in self._seen:
+            return None
+        item = {
+            "image": image.copy(),
+            "image_hash": image_hash,
+            "ts": time.time(),
+            "reason": reason,
+            "species": int(np.argmax(probs)),
+            "confidence": float(np.max(probs)),
+            "top_k": json.dumps(top_k(np.asarray(probs).reshape(-1))),
+            "embedding": None if embedding is None else np.asarray(embedding, dtype=np.float16).tobytes(),
+            "crop": crop,
+            "location": location,
+            "version": version,
+        }
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return None
+        self._seen[image_hash] = True
+        if len(self._seen) > SEEN_SIZE:
+            self._seen.popitem(last=False)
+        return reason
+
+    def _run(self):
+        db = self.connect()
+        while True:
+            item = self._queue.get()
+            image = item.pop("image")
+            try:
+                self._store(db, item, image)
+            except Exception:
+                # One bad item (I/O, SQLite, PIL re-encode) must not end the writer
+                self.failed += 1
+                log.exception("Capture failed for %s", item["image_hash"])
+            finally:
+                image.close()
+
+    def _store(self, db, item, image):
+        image_hash = item["image_hash"]
+        # Another replica may have captured the same photo already
+        if db.execute("SELECT 1 FROM captures WHERE image_hash = ?", (image_hash,)).fetchone():
+            return
+        image.thumbnail((CAPTURE_SIDE, CAPTURE_SIDE))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=JPEG_QUALITY)
+        path = self.image_path(image_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+        item["bytes"] = buffer.tell()
+        with db:
+            columns = list(item)
+            db.execute(f"INSERT OR IGNORE INTO captures ({', '.join(columns)}) "
+                       f"VALUES ({', '.join('?' for _ in columns)})", [item[key] for key in columns])
+            self._evict(db)
+
+    def _evict(self, db):
+        count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM captures").fetchone()
+        if count <= self.max_items and total <= self.max_bytes:
+            return
+        # Most confident unlabelled captures are the least informative
+        for image_hash, size in db.execute(
+            "SELECT image_hash, bytes FROM captures WHERE label IS NULL ORDER BY confidence DESC"
+        ).fetchall():
+            if count <= self.max_items and total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM captures WHERE image_hash = ?", (image_hash,))
+            try:
+                os.remove(self.image_path(image_hash))
+            except FileNotFoundError:
+                pass
+            count, total = count - 1, total - size
+
+    # --------------------------------------------------
+    # Labelling
+    # --------------------------------------------------
+    def select_batch(self, count, batch_id=None):
+        # Diverse batch: greedy k-center on the embeddings, starting from
+        # what is already labelled, weighted towards uncertain captures
+        with closing(self.connect()) as db, db:
+            pool = db.execute("SELECT image_hash, confidence, embedding FROM captures "
+                              "WHERE label IS NULL AND batch IS NULL AND embedding IS NOT NULL").fetchall()
+            labelled = [row[0] for row in db.execute(
+                "SELECT embedding FROM captures WHERE label IS NOT NULL AND embedding IS NOT NULL")]
+        if not pool:
+            return []
+        vectors = _unit(np.stack([np.frombuffer(row[2], dtype=np.float16) for row in pool]))
+        uncertainty = 1.0 - np.array([row[1] for row in pool], dtype=np.float32)
+        if labelled:
+            known = _unit(np.stack([np.frombuffer(e, dtype=np.float16) for e in labelled]))
+            distance = 1.0 - (vectors @ known.T).max(axis=1)
+        else:
+            distance = np.ones(len(pool), dtype=np.float32)
+        chosen = []
+        for _ in range(min(count, len(pool))):
+            pick = int(np.argmax(distance * (0.5 + uncertainty)))
+            chosen.append(pick)
+            distance = np.minimum(distance, 1.0 - vectors @ vectors[pick])
+            distance[chosen] = -1.0
+        hashes = [pool[i][0] for i in chosen]
+        batch_id = batch_id or time.strftime("%Y%m%d-%H%M%S")
+        with closing(self.connect()) as db, db:
+            db.executemany("UPDATE captures SET batch = ? WHERE image_hash = ?", [(batch_id, h) for h in hashes])
+        return hashes
+
+    def rows(self, hashes):
+        with closing(self.connect()) as db, db:
+            db.row_factory = sqlite3.Row
+            return [db.execute("SELECT * FROM captures WHERE image_hash = ?", (h,)).fetchone() for h in hashes]
+
+    def set_labels(self, labels, names):
+        # {image_hash: class name or REJECT}; returns (labelled, rejected)
+        unknown = sorted({label for label in labels.values() if label != REJECT and label not in names})
+        if unknown:
+            raise ValueError(f"Unknown class names: {', '.join(unknown)}")
+        labelled = rejected = 0
+        with closing(self.connect()) as db, db:
+            for image_hash, label in labels.items():
+                if label == REJECT:
+                    db.execute("DELETE FROM captures WHERE image_hash = ?", (image_hash,))
+                    if os.path.exists(self.image_path(image_hash)):
+                        os.remove(self.image_path(image_hash))
+                    rejected += 1
+                else:
+                    db.execute("UPDATE captures SET label = ?, labelled_ts = ? WHERE image_hash = ?",
+                               (label, time.time(), image_hash))
+                    labelled += 1
+        return labelled, rejected
+
+
+def _image_path(root, image_hash):
+    return os.path.join(root, image_hash[:2], f"{image_hash}.jpg")
+
+
+def _unit(vectors):
+    vectors = vectors.astype(np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def labelled_items(root=CAPTURE_DIR):
+    # For train.py; reads the database without starting a writer thread
+    from insect_core import class_names
+    db_path = os.path.join(root, DB_NAME)
+    if not os.path.exists(db_path):
+        return []
+    db = sqlite3.connect(db_path, timeout=30)
+    try:
+        rows = db.execute("SELECT image_hash, label FROM captures WHERE label IS NOT NULL "
+                          "ORDER BY image_hash").fetchall()
+    finally:
+        db.close()
+    paths = [(_image_path(root, h), label) for h, label in rows]
+    return [(path, class_names.index(label)) for path, label in paths
+            if label in class_names and os.path.exists(path)]
+
+
+if __name__ == "__main__":
+    from insect_core import class_names
+
+    parser = argparse.ArgumentParser(description="Pick and import labelling batches from captured images")
+    commands = parser.add_subparsers(dest="command", required=True)
+    select = commands.add_parser("select", help="Write a diverse batch of unlabelled captures to a CSV")
+    select.add_argument("--count", type=int, default=200)
+    select.add_argument("--output", default=BATCH_FILE)
+    imported = commands.add_parser("import", help="Read labels back from a filled-in CSV")
+    imported.add_argument("csv")
+    commands.add_parser("status", help="Queue size and labelling progress")
+    parser.add_argument("--root", default=CAPTURE_DIR)
+    args = parser.parse_args()
+
+    captures = CaptureQueue(args.root)
+    if args.command == "select":
+        hashes = captures.select_batch(args.count)
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["image_hash", "path", "predicted", "confidence", "reason", "crop", "label"])
+            for row in captures.rows(hashes):
+                writer.writerow([row["image_hash"], captures.image_path(row["image_hash"]),
+                                 class_names[row["species"]] if row["species"] < len(class_names) else row["species"],
+                                 f"{row['confidence']:.2f}", row["reason"], row["crop"] or "", ""])
+        print(f"✅ {len(hashes)} captures to label in {args.output}")
+    elif args.command == "import":
+        with open(args.csv, "r", encoding="utf-8") as f:
+            labels = {row["image_hash"]: row["label"].strip() for row in csv.DictReader(f) if row["label"].strip()}
+        labelled, rejected = captures.set_labels(labels, class_names)
+        print(f"✅ {labelled} labelled, {rejected} rejected")
+    else:
+        with closing(captures.connect()) as db:
+            count, total, done = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COUNT(label) FROM captures").fetchone()
+            reasons = db.execute("SELECT reason, COUNT(*) FROM captures GROUP BY reason").fetchall()
+        print(f"📷 {count} captures ({total / 1e6:.0f} MB), {done} labelled")
+        for reason, n in reasons:
+            print(f"  {reason}: {n}")
@@ -0,0 +1,138 @@
+# --------------------------------------------------
+# Insectifica – crop vocabulary & crop → pest index
+#
+# "Host Crops" in pest.json is free text ("Pulses, Cotton", "Paddy",
+# "Grapes"). Crop names are normalized once (case, plural forms,
+# synonyms) and indexed so "which pests attack castor" is a dict lookup.
+# Broad groups such as "Vegetables" also cover their member crops, and
+# species that are not tied to a crop stay plausible everywhere.
+# --------------------------------------------------
+import re
+from collections import defaultdict
+
+import numpy as np
+
+SYNONYMS = {
+    "paddy": "rice",
+    "grapevine": "grape",
+    "corn": "maize",
+    "peanut": "groundnut",
+    "red gram": "pigeonpea",
+    "tur": "pigeonpea",
+    "chili": "chilli",
+    "eggplant": "brinjal",
+    "aubergine": "brinjal",
+    "lady's finger": "okra",
+    "ladies finger": "okra",
+    "bhindi": "okra",
+    "mustard greens": "mustard",
+    "cruciferous vegetable": "crucifer",
+    "cole crop": "crucifer",
+    "leguminous tree": "legume",
+    "fruit tree": "fruit",
+    "stored product": "stored grain",
+}
+
+# Broad host groups and the crops they include
+CROP_GROUPS = {
+    "vegetable": {"tomato", "potato", "brinjal", "okra", "chilli", "onion", "garlic", "cabbage",
+                  "cauliflower", "crucifer", "cucurbit"},
+    "crucifer": {"cabbage", "cauliflower", "mustard"},
+    "pulse": {"pigeonpea", "chickpea", "blackgram", "greengram", "cowpea"},
+    "legume": {"groundnut", "soybean", "pigeonpea", "chickpea", "cowpea", "pulse"},
+    "cereal": {"rice", "wheat", "maize", "sorghum", "barley"},
+    "fruit": {"mango", "guava", "citrus", "banana", "papaya", "sapota", "pomegranate", "fig",
+              "grape", "peach", "almond", "avocado"},
+    "palm": {"coconut", "oil palm", "date palm"},
+    "field crop": {"rice", "wheat", "maize", "sorghum", "barley", "cotton", "groundnut",
+                   "sugarcane", "castor", "sunflower", "sesame", "safflower", "soybean"},
+}
+
+# Host entries meaning "not tied to a particular crop"
+GENERALIST = {"not crop-specific", "all crop", "various crop", "agricultural field", "na"}
+
+DIRECT, GROUP, UNBOUND = "direct", "group", "unbound"
+
+
+def singularize(word):
+    # "citrus", "hibiscus", "cruciferous" end in "s" but are not plurals
+    if len(word) <= 3 or word.endswith("us"):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "oes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_crop(name):
+    name = re.sub(r"\(.*?\)", "", str(name)).strip().lower()
+    name = re.sub(r"\s+", " ", name)
+    name = SYNONYMS.get(name, name)
+    name = " ".join(singularize(w) for w in name.split())
+    return SYNONYMS.get(name, name)
+
+
+def split_host_crops(text):
+    crops = (normalize_crop(c) for c in re.split(r"[,;/]", str(text)))
+    return {c for c in crops if c}
+
+
+class CropIndex:
+    def __init__(self, insect_data):
+        self.crop_species = defaultdict(set)
+        self.species_crops = {}
+        self.unbound = set()
+        for name, details in insect_data.items():
+            crops = split_host_crops(details.get("Host Crops", ""))
+            self.species_crops[name] = crops
+            for crop in crops:
+                if crop in GENERALIST:
+                    self.unbound.add(name)
+                else:
+                    self.crop_species[crop].add(name)
+        # Groups a crop belongs to, e.g. tomato → {vegetable}
+        self.crop_groups = defaultdict(set)
+        for group, members in CROP_GROUPS.items():
+            for crop in members:
+                self.crop_groups[crop].add(group)
+        self._masks = {}
+
+    def crops(self):
+        # Crops named in pest.json with their number of pests, for the UI
+        return sorted((crop, len(names)) for crop, names in self.crop_species.items())
+
+    def pests_for(self, crop, include_groups=True, include_unbound=False):
+        # species → how it matched: direct listing, a host group, or unbound
+        crop = normalize_crop(crop)
+        matches = {}
+        if include_unbound:
+            matches.update(dict.fromkeys(self.unbound, UNBOUND))
+        if include_groups:
+            for group in self.crop_groups.get(crop, ()):
+                matches.update(dict.fromkeys(self.crop_species.get(group, ()), GROUP))
+        matches.update(dict.fromkeys(self.crop_species.get(crop, ()), DIRECT))
+        return matches
+
+    def plausible_mask(self, crop, labels):
+        # Boolean vector over the model outputs, cached per (crop, label set)
+        key = (normalize_crop(crop), len(labels))
+        mask = self._masks.get(key)
+        if mask is None:
+            plausible = self.pests_for(crop, include_unbound=True)
+            mask = np.array([label in plausible or label not in self.species_crops
+                             for label in labels])
+            self._masks[key] = mask
+        return mask
+
+    def restrict(self, probs, crop, labels):
+        # Zero out species that do not attack the crop and renormalize;
+        # rows with no plausible mass are returned unchanged
+        probs = np.asarray(probs, dtype=np.float32)
+        if not crop:
+            return probs
+        restricted = probs * self.plausible_mask(crop, labels)
+        total = restricted.sum(axis=-1, keepdims=True)
+        return np.where(total > 0, restricted / np.maximum(total, 1e-12), probs)
@@ -0,0 +1,176 @@
+# --------------------------------------------------
+# Insectifica – knowledge distillation into a small student
+#
+# The existing model is the teacher: every training batch is run through
+# it and the student (a width-0.35 MobileNetV2 by default) learns its
+# temperature-softened softmax. Images do not need labels; where the
+# folder has one sub-folder per class name, the true label adds a small
+# hard-label term. The student's outputs are in the teacher's, i.e.
+# class_names, order, so it is a drop-in model version:
+#   model_registry.json  {"versions": {"student": "insect_student.keras"}, ...}
+#
+# Usage:
+#   python distill.py --images train/ --val val/ --epochs 15 --alpha 0.35
+# The size / latency / agreement report is written to distill_report.json.
+# --------------------------------------------------
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from insect_core import MODEL_PATH, class_names
+from model_report import agreement, benchmark, evaluation_arrays, model_size, per_class_accuracy
+
+STUDENT_PATH = "insect_student.keras"
+REPORT_PATH = "distill_report.json"
+TEMPERATURE = 4.0
+HARD_WEIGHT = 0.3
+ALPHA = 0.35
+BATCH_SIZE = 32
+EPOCHS = 15
+LEARNING_RATE = 1e-3
+VAL_SPLIT = 0.1
+
+
+def build_student(num_classes, input_size, alpha=ALPHA):
+    import tensorflow as tf
+    from tensorflow.keras.applications import MobileNetV2
+    from tensorflow.keras.layers import Dense, Dropout, GlobalAveragePooling2D
+
+    # ImageNet weights exist for square inputs 96-224; other sizes reuse 224's
+    base = MobileNetV2(input_shape=(input_size, input_size, 3), alpha=alpha,
+                       include_top=False, weights="imagenet")
+    x = GlobalAveragePooling2D()(base.output)
+    x = Dropout(0.2)(x)
+    # Softmax as the last layer, like the teacher, so build_embedding_model works
+    outputs = Dense(num_classes, activation="softmax", name="predictions")(x)
+    return tf.keras.Model(base.input, outputs)
+
+
+def image_dataset(items, input_size, batch_size, augment):
+    # Same preprocessing as insect_core.preprocess_image: resize, then [-1, 1]
+    import tensorflow as tf
+
+    paths = [path for path, _ in items]
+    labels = [label for _, label in items]
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if augment:
+        dataset = dataset.shuffle(len(paths), reshuffle_each_iteration=True)
+
+    def load(path, label):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(image, (input_size, input_size), method="bicubic", antialias=True)
+        if augment:
+            image = tf.image.random_flip_left_right(image)
+            image = tf.image.random_brightness(image, 20.0)
+        return tf.clip_by_value(image, 0.0, 255.0) / 127.5 - 1.0, label
+
+    return dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def distill(teacher, student, dataset, epochs=EPOCHS, learning_rate=LEARNING_RATE,
+            temperature=TEMPERATURE, hard_weight=HARD_WEIGHT):
+    import tensorflow as tf
+
+    optimizer = tf.keras.optimizers.Adam(learning_rate)
+    features = tf.keras.Model(student.input, student.layers[-1].input)
+    head = student.layers[-1]
+
+    @tf.function
+    def step(images, labels):
+        # The teacher only gives probabilities; log-probs act as its logits
+        teacher_probs = teacher(images, training=False)
+        targets = tf.nn.softmax(tf.math.log(teacher_probs + 1e-8) / temperature)
+        with tf.GradientTape() as tape:
+            logits = tf.matmul(features(images, training=True), head.kernel) + head.bias
+            soft = tf.reduce_mean(tf.keras.losses.kl_divergence(targets, tf.nn.softmax(logits / temperature)))
+            known = labels >= 0
+            hard = tf.keras.losses.sparse_categorical_crossentropy(
+                tf.boolean_mask(labels, known), tf.boolean_mask(logits, known), from_logits=True)
+            hard = tf.math.divide_no_nan(tf.reduce_sum(hard), tf.cast(tf.size(hard), tf.float32))
+            loss = (1.0 - hard_weight) * soft * temperature ** 2 + hard_weight * hard
+        gradients = tape.gradient(loss, student.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, student.trainable_variables))
+        return loss
+
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        losses = [float(step(images, labels)) for images, labels in dataset]
+        print(f"🧪 Epoch {epoch + 1}/{epochs}: loss {np.mean(losses):.4f} "
+              f"({time.perf_counter() - start:.0f}s)")
+    return student
+
+
+def split_items(items, fraction=VAL_SPLIT, seed=0):
+    items = list(items)
+    random.Random(seed).shuffle(items)
+    cut = max(1, int(len(items) * fraction))
+    return items[cut:], items[:cut]
+
+
+def compare(teacher_path, teacher, student_path, student, arrays, labels):
+    from model_registry import ModelVersion
+    from prototypes import build_embedding_model
+
+    teacher_version = ModelVersion("teacher", teacher_path, build_embedding_model(teacher))
+    student_version = ModelVersion("student", student_path, build_embedding_model(student))
+    teacher_probs, teacher_speed = benchmark(teacher_version, arrays)
+    student_probs, student_speed = benchmark(student_version, arrays)
+    report = {
+        "images": len(arrays),
+        "teacher": dict(model_size(teacher_path, teacher), **teacher_speed),
+        "student": dict(model_size(student_path, student), **student_speed),
+        **agreement(teacher_probs, student_probs),
+    }
+    if (labels >= 0).any():
+        known = labels >= 0
+        report["teacher"]["accuracy"] = float(np.mean(teacher_probs[known].argmax(axis=1) == labels[known]))
+        report["student"]["accuracy"] = float(np.mean(student_probs[known].argmax(axis=1) == labels[known]))
+        report["student_per_class"] = per_class_accuracy(student_probs, labels)
+    return report
+
+
+if __name__ == "__main__":
+    import tensorflow as tf
+
+    from benchmark import list_images
+
+    parser = argparse.ArgumentParser(description="Distill the insect model into a smaller student")
+    parser.add_argument("--images", required=True, help="Training images (labels optional)")
+    parser.add_argument("--val", help="Held-out folder for the report; else 10%% of --images")
+    parser.add_argument("--teacher", default=MODEL_PATH)
+    parser.add_argument("--output", default=STUDENT_PATH)
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="Student MobileNetV2 width")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE)
+    args = parser.parse_args()
+
+    teacher = tf.keras.models.load_model(args.teacher)
+    teacher.trainable = False
+    input_size = teacher.input_shape[1]
+    if teacher.output_shape[-1] != len(class_names):
+        raise SystemExit(f"Teacher has {teacher.output_shape[-1]} outputs, class_names has {len(class_names)}")
+
+    items = list_images(args.images)
+    train_items, val_items = (items, list_images(args.val)) if args.val else split_items(items)
+    print(f"🐞 {len(train_items)} training images, {len(val_items)} held out")
+
+    student = build_student(len(class_names), input_size, args.alpha)
+    distill(teacher, student, image_dataset(train_items, input_size, args.batch_size, augment=True),
+            epochs=args.epochs, temperature=args.temperature)
+    student.save(args.output)
+
+    arrays, labels = evaluation_arrays(val_items, input_size)
+    report = compare(args.teacher, teacher, args.output, student, arrays, labels)
+    report.update({"alpha": args.alpha, "temperature": args.temperature, "labels": class_names})
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"{'':<8} {'MB':>7} {'params':>10} {'p50 ms':>8} {'img/s':>8}")
+    for name in ("teacher", "student"):
+        row = report[name]
+        print(f"{name:<8} {row['file_mb']:7.1f} {row['params']:10,d} {row['p50_ms']:8.1f} {row['throughput']:8.1f}")
+    print(f"✅ Top-1 agreement {report['top1_agreement']:.2%}, top-5 {report['top5_agreement']:.2%} → {REPORT_PATH}")
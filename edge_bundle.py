@@ -0,0 +1,89 @@
+# --------------------------------------------------
+# Insectifica – build the offline edge bundle
+#
+# Produces one self-contained file, insectifica_edge.pyz, holding:
+#   model.tflite    quantized model (softmax + embedding outputs)
+#   species.bin     zlib-compressed compact copy of pest.json
+#   labels.json     label order and input size
+#   prototypes.npz  registered species, if any
+#   edge_runtime.py and the shared TF-free modules it imports
+# Run it with any Python that has numpy, Pillow and tflite-runtime.
+#
+# Usage:
+#   python edge_bundle.py [--quantize dynamic|float16] [--output insectifica_edge.pyz]
+# --------------------------------------------------
+import argparse
+import io
+import json
+import os
+import zipfile
+import zlib
+
+from insect_core import IMG_SIZE, MODEL_PATH, class_names, load_insect_data
+from prototypes import PROTOTYPE_PATH
+
+BUNDLE_PATH = "insectifica_edge.pyz"
+RUNTIME_MODULES = (
+    "edge_runtime.py", "insect_core.py", "prototypes.py", "crops.py", "priors.py", "species_pages.py",
+)
+
+
+def convert_model(model_path=MODEL_PATH, quantize="dynamic"):
+    import tensorflow as tf
+
+    from prototypes import build_embedding_model
+
+    model = build_embedding_model(tf.keras.models.load_model(model_path))
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize in ("dynamic", "float16"):
+        # dynamic: int8 weights, float activations – ~4x smaller, fast on CPU
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert(), model.input_shape[1]
+
+
+def pack_species(insect_data):
+    payload = json.dumps(insect_data, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(payload.encode("utf-8"), 9)
+
+
+def build_bundle(output=BUNDLE_PATH, model_path=MODEL_PATH, quantize="dynamic"):
+    tflite_model, input_size = convert_model(model_path, quantize)
+    manifest = {
+        "labels": class_names,
+        "input_size": input_size or IMG_SIZE,
+        "model": os.path.basename(model_path),
+        "quantize": quantize,
+    }
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr("__main__.py", "from edge_runtime import main\nmain()\n")
+        for module in RUNTIME_MODULES:
+            bundle.write(module, module)
+        # Stored uncompressed: quantized weights barely deflate and this
+        # keeps start-up to a plain read
+        bundle.writestr("model.tflite", tflite_model, compress_type=zipfile.ZIP_STORED)
+        bundle.writestr("species.bin", pack_species(load_insect_data()), compress_type=zipfile.ZIP_STORED)
+        bundle.writestr("labels.json", json.dumps(manifest, ensure_ascii=False))
+        if os.path.exists(PROTOTYPE_PATH):
+            bundle.write(PROTOTYPE_PATH, "prototypes.npz")
+
+    # A shebang line in front of the zip makes it directly executable
+    with open(output, "wb") as f:
+        f.write(b"#!/usr/bin/env python3\n")
+        f.write(archive.getvalue())
+    os.chmod(output, 0o755)
+    return len(tflite_model), os.path.getsize(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the offline edge bundle")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--quantize", choices=["dynamic", "float16", "none"], default="dynamic")
+    parser.add_argument("--output", default=BUNDLE_PATH)
+    args = parser.parse_args()
+
+    model_size, bundle_size = build_bundle(args.output, args.model, args.quantize)
+    print(f"✅ {args.output}: model {model_size / 1e6:.1f} MB, bundle {bundle_size / 1e6:.1f} MB")
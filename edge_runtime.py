@@ -0,0 +1,217 @@
+# --------------------------------------------------
+# Insectifica – offline edge runtime
+#
+# Runs inside the single-file bundle built by edge_bundle.py. Needs only
+# numpy, Pillow and a TFLite interpreter (tflite-runtime / ai-edge-litert),
+# never TensorFlow itself. Preprocessing, prototype matching and crop
+# priors are the same modules the Streamlit app uses.
+#
+# Usage:
+#   python insectifica_edge.pyz photo.jpg [--crop cotton] [--top 3]
+#   python insectifica_edge.pyz --serve   # local web page on port 8502
+# --------------------------------------------------
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from crops import CropIndex
+from insect_core import preprocess_image
+from priors import PriorTable
+from prototypes import PrototypeTable, extend_predictions
+
+SERVE_PORT = 8502
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            # Slow to import, but keeps the bundle usable on a full TF install
+            from tensorflow.lite import Interpreter
+    return Interpreter
+
+
+def read_asset(name):
+    # Assets sit next to this module: inside the .pyz archive, or in a folder
+    base = os.path.dirname(os.path.abspath(__file__))
+    if zipfile.is_zipfile(base):
+        with zipfile.ZipFile(base) as bundle:
+            return bundle.read(name)
+    with open(os.path.join(base, name), "rb") as f:
+        return f.read()
+
+
+def has_asset(name):
+    try:
+        read_asset(name)
+        return True
+    except (KeyError, FileNotFoundError):
+        return False
+
+
+def unpack_species(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class EdgeClassifier:
+    def __init__(self, num_threads=None):
+        manifest = json.loads(read_asset("labels.json"))
+        self.base_labels = manifest["labels"]
+        self.input_size = manifest["input_size"]
+
+        self.interpreter = _interpreter_class()(
+            model_content=read_asset("model.tflite"), num_threads=num_threads or os.cpu_count()
+        )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]["index"]
+        # Output order is not guaranteed after conversion; the softmax is
+        # the one with one column per label
+        outputs = self.interpreter.get_output_details()
+        self._probs = next(o["index"] for o in outputs if o["shape"][-1] == len(self.base_labels))
+        self._embeddings = next((o["index"] for o in outputs if o["index"] != self._probs), None)
+
+        self.prototypes = (PrototypeTable.load(io.BytesIO(read_asset("prototypes.npz")))
+                           if has_asset("prototypes.npz") else PrototypeTable())
+        self.labels = self.base_labels + self.prototypes.names
+        self._species = None
+        self._priors = None
+
+    @property
+    def species(self):
+        # Decompressed on first use so a bare classification starts faster
+        if self._species is None:
+            self._species = unpack_species(read_asset("species.bin"))
+        return self._species
+
+    @property
+    def priors(self):
+        if self._priors is None:
+            self._priors = PriorTable(CropIndex(self.species), self.labels, context_priors={})
+        return self._priors
+
+    def predict(self, image, crop=None, top=3):
+        batch = preprocess_image(image.convert("RGB"), self.input_size)[None]
+        self.interpreter.set_tensor(self._input, batch)
+        self.interpreter.invoke()
+        probs = self.interpreter.get_tensor(self._probs)
+        if self._embeddings is not None:
+            probs = extend_predictions(probs, self.interpreter.get_tensor(self._embeddings), self.prototypes)
+        if crop:
+            probs = self.priors.apply(probs, crop=crop)
+        order = np.argsort(-probs[0])[:top]
+        return [(self.labels[i], float(probs[0][i])) for i in order]
+
+
+# --------------------------------------------------
+# Local Web Page
+# --------------------------------------------------
+PAGE = """<!doctype html><html><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>INSECTIFICA (offline)</title>
+<style>body{{font-family:sans-serif;max-width:720px;margin:auto;padding:1em;color:#1b5e20;background:#f6fff8}}
+h1,h2{{text-align:center}} .species-box{{border-radius:8px;padding:12px;margin-bottom:12px;background:#e8f5e9}}
+.species-taxonomy{{display:grid;grid-template-columns:repeat(auto-fit,minmax(160px,1fr));gap:6px}}</style>
+</head><body><h1>🐞 INSECTIFICA 🔍</h1>
+<form method="post" enctype="multipart/form-data">
+<p><input type="file" name="image" accept="image/*" capture="environment" required></p>
+<p><input type="text" name="crop" placeholder="Field crop (optional)"></p>
+<p><button type="submit">🔍 Identify</button></p></form>{result}</body></html>"""
+
+
+def _parse_form(headers, body):
+    from email.parser import BytesParser
+    from email.policy import default
+
+    message = BytesParser(policy=default).parsebytes(
+        b"Content-Type: " + headers["Content-Type"].encode() + b"\r\n\r\n" + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = part.get_payload(decode=True)
+    return fields
+
+
+def serve(classifier, port=SERVE_PORT):
+    from html import escape
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from species_pages import render_species
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, result=""):
+            body = PAGE.format(result=result).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            fields = _parse_form(self.headers, self.rfile.read(length))
+            crop = (fields.get("crop") or b"").decode("utf-8").strip() or None
+            try:
+                image = Image.open(io.BytesIO(fields["image"]))
+                results = classifier.predict(image, crop=crop)
+            except Exception as exc:
+                self._send(f"<p>⚠️ Could not read the image: {escape(str(exc))}</p>")
+                return
+            name, confidence = results[0]
+            html = f"<h2>{escape(name)}</h2><p>Confidence: {confidence:.1%}</p>"
+            if name in classifier.species:
+                html += render_species(classifier.species[name])
+            self._send(html)
+
+        def log_message(self, *args):
+            pass
+
+    print(f"🌐 Open http://127.0.0.1:{port} in a browser (Ctrl+C to stop)")
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline insect identification")
+    parser.add_argument("images", nargs="*", help="Image files to classify")
+    parser.add_argument("--crop", help="Field crop, to favour pests known on it")
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("--details", action="store_true", help="Print the species record")
+    parser.add_argument("--serve", action="store_true", help="Start the local web page")
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    classifier = EdgeClassifier()
+    print(f"⚡ Ready in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    if args.serve:
+        serve(classifier, args.port)
+        return
+    if not args.images:
+        parser.error("give image files or --serve")
+    for path in args.images:
+        results = classifier.predict(Image.open(path), crop=args.crop, top=args.top)
+        print(path)
+        for name, confidence in results:
+            print(f"  {confidence:6.1%}  {name}")
+        if args.details and results[0][0] in classifier.species:
+            for field, value in classifier.species[results[0][0]].items():
+                print(f"    {field}: {value}")
+
+
+if __name__ == "__main__":
+    main()
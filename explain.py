@@ -0,0 +1,89 @@
+# --------------------------------------------------
+# Insectifica – Grad-CAM explanation heatmaps
+#
+# The explainer is the prediction model with one extra output, the last
+# convolutional block (MobileNetV2's out_relu). With explanations on, the
+# prediction itself comes from this model: one forward pass for the whole
+# batch, then one backward pass from each image's top class to that
+# block. Rows of a batch do not interact at inference, so a single
+# gradient gives every image its own map. The map is tiny (6x6 at 190 px)
+# and is cached with the prediction; the overlay is drawn on the preview
+# thumbnail. Nothing is built until the first explanation is asked for.
+# --------------------------------------------------
+import io
+
+import numpy as np
+
+OVERLAY_SIZE = 320
+OVERLAY_ALPHA = 0.45
+
+
+def conv_layer(model):
+    # Last layer with a spatial (4-D) output before global pooling
+    layer = None
+    for candidate in model.layers:
+        if candidate.__class__.__name__ == "GlobalAveragePooling2D":
+            break
+        shape = candidate.output_shape
+        if isinstance(shape, tuple) and len(shape) == 4:
+            layer = candidate
+    if layer is None:
+        raise ValueError("Model has no convolutional block before global pooling")
+    return layer
+
+
+def build_explainer(model):
+    # model: the embedding model (probs, embeddings) -> (probs, embeddings, features)
+    import tensorflow as tf
+    return tf.keras.Model(model.input, list(model.outputs) + [conv_layer(model).output])
+
+
+def make_gradcam(explainer):
+    import tensorflow as tf
+
+    @tf.function(reduce_retracing=True)
+    def gradcam(batch):
+        with tf.GradientTape() as tape:
+            probs, embeddings, features = explainer(batch, training=False)
+            top = tf.argmax(probs, axis=1)
+            # Log-probability of each row's own top class; summing is safe
+            # because row i's score depends on row i's features only
+            score = tf.math.log(tf.gather(probs, top, batch_dims=1) + 1e-8)
+        grads = tape.gradient(tf.reduce_sum(score), features)
+        weights = tf.reduce_mean(tf.cast(grads, tf.float32), axis=(1, 2), keepdims=True)
+        cam = tf.nn.relu(tf.reduce_sum(weights * tf.cast(features, tf.float32), axis=-1))
+        cam = cam / (tf.reduce_max(cam, axis=(1, 2), keepdims=True) + 1e-8)
+        return probs, embeddings, cam
+
+    return gradcam
+
+
+# --------------------------------------------------
+# Overlay
+# --------------------------------------------------
+def _colormap(values):
+    # Blue -> green -> yellow -> red ramp for values in [0, 1]
+    stops = np.array([[0, 0, 255], [0, 200, 120], [255, 230, 0], [230, 20, 20]], dtype=np.float32)
+    position = np.clip(values, 0.0, 1.0) * (len(stops) - 1)
+    low = np.floor(position).astype(int).clip(0, len(stops) - 2)
+    frac = (position - low)[..., None]
+    return (stops[low] * (1.0 - frac) + stops[low + 1] * frac).astype(np.uint8)
+
+
+def heatmap_overlay(thumbnail, heatmap, size=OVERLAY_SIZE, alpha=OVERLAY_ALPHA):
+    # thumbnail: JPEG bytes or PIL image; heatmap: small 2-D grid in [0, 1]
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(thumbnail)) if isinstance(thumbnail, bytes) else thumbnail
+    image = image.convert("RGB")
+    image.thumbnail((size, size))
+    grid = Image.fromarray((np.asarray(heatmap, dtype=np.float32) * 255).astype(np.uint8))
+    # The model saw a square resize of the photo, so stretch the grid back over it
+    values = np.asarray(grid.resize(image.size, Image.BICUBIC), dtype=np.float32) / 255.0
+    # Opacity follows the heat, so unimportant areas keep their own colours
+    weight = alpha * values[..., None]
+    pixels = np.asarray(image, dtype=np.float32) * (1.0 - weight) + _colormap(values) * weight
+    blended = Image.fromarray(pixels.astype(np.uint8))
+    buffer = io.BytesIO()
+    blended.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
@@ -4,6 +4,7 @@ import numpy as np
 from PIL import Image
 import pandas as pd
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from session_memory import thumbnail_bytes
 
 
 # --------------------------------------------------
@@ -277,7 +278,16 @@ def intro_page():
         st.success("Image uploaded successfully")
 
         if st.button("🔍 Start Identification", key="start_identification"):
-            st.session_state.uploaded_image = img
+            # Keep only a thumbnail and the prediction in the session,
+            # not the decoded full-resolution image
+            with st.spinner("Analyzing insect image..."):
+                class_index, confidence = predict_image(img.convert("RGB"))
+            st.session_state.result = {
+                "thumbnail": thumbnail_bytes(img),
+                "class_index": int(class_index),
+                "confidence": float(confidence),
+            }
+            img.close()
             st.session_state.page = "classification"
 
 
@@ -477,17 +487,19 @@ def developers_page():
 def classification_page():
     st.title("🔍 Insect Classification Result")
 
-    img = st.session_state.get("uploaded_image", None)
+    result = st.session_state.get("result", None)
 
     # 🔹 Case 1: No image uploaded
- 
+    if result is None:
+        st.info("Please upload an insect image first.")
+        if st.button("⬅️ Back to Home", key="back_no_result"):
+            st.session_state.page = "intro"
+        return
 
     # 🔹 Case 2: Image exists → proceed
-    st.image(img, use_container_width=True)
-
-    with st.spinner("Analyzing insect image..."):
-        class_index, confidence = predict_image(img)
-        row = insect_df.iloc[class_index]
+    st.image(result["thumbnail"])
+    class_index, confidence = result["class_index"], result["confidence"]
+    row = insect_df.iloc[class_index]
 
     st.success(
         f"{row['Common Name']} ({row['Scientific Name']})\n\n"
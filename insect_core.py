@@ -0,0 +1,86 @@
+# --------------------------------------------------
+# Insectifica – shared labels, species data & preprocessing
+# Kept free of TensorFlow so tools and helpers can import it cheaply.
+# --------------------------------------------------
+import hashlib
+import json
+import os
+
+import numpy as np
+
+MODEL_PATH = "mobilenetv2_insect.keras"
+PEST_JSON = "pest.json"
+IMG_SIZE = 190
+
+# Output order of the trained model's softmax layer
+class_names = [
+    'Acanthophilus helianthi rossi', 'Achaea janata', 'Acherontia styx', 'Adisura atkinsoni',
+    'Aedes aegypti', 'Aedes albopictus', 'Agrotis ipsilon', 'Alcidodes affaber',
+    'Aleurodicus dispersus', 'Amsacta albistriga', 'Anarsia ephippias', 'Anarsia epoitas',
+    'Anisolabis stallii', 'Antestia cruciata', 'Aphis craccivora', 'Apis mellifera',
+    'Apriona cinerea', 'Araecerus fasciculatus', 'Atractomorpha crenulata', 'Autographa nigrisigna',
+    'Bagrada hilaris', 'Basilepta fulvicorne', 'Batocera rufomaculata', 'Calathus erratus',
+    'Camponotus consobrinus', 'Chilasa clytia', 'Chilo sacchariphagus indicus',
+    'Conogethes punctiferalis', 'Danaus plexippus', 'Dendurus coarctatus',
+    'Deudorix (Virachola) isocrates', 'Elasmopalpus jasminophagus', 'Euwallacea fornicatus',
+    'Ferrisia virgata', 'Formosina flavipes', 'Gangara thyrsis', 'Holotrichia serrata',
+    'Hydrellia philippina', 'Hypolixus truncatulus', 'Leucopholis burmeisteri',
+    'Libellula depressa', 'Lucilia sericata', 'Melanagromyza obtusa', 'Mylabris phalerata',
+    'Oryctes rhinoceros', 'Paracoccus marginatus', 'Paradisynus rostratus', 'Parallelia algira',
+    'Parasa lepida', 'Pectinophora gossypiella', 'Pelopidas mathias', 'Pempherulus affinis',
+    'Pentalonia nigronervosa', 'peregrius maidis', 'Pericallia ricini', 'Perigea capensis',
+    'Petrobia latens', 'Phenacoccus solenopsis', 'Phoetaliotes nebrascensis',
+    'Phthorimaea operculella', 'Phyllocnistis citrella', 'Pieris brassicae', 'Pulchriphyllium',
+    'Rapala varuna', 'Rastrococcus iceryoides', 'Retithrips siriacus', 'Retithrips syriacus',
+    'Rhipiphorothrips cruentatus', 'Rhopalosiphum maidis', 'Rhopalosiphum padi',
+    'Rhynchophorus ferrugineus', 'Riptortus pedestris', 'Sahyadrassus malabaricus',
+    'Saissetia coffeae', 'Streptanus aemulans', 'sustama gremius', 'Sylepta derogata',
+    'Sympetrum signiferum', 'Sympetrum vulgatum', 'Tanymecus indicus Faust',
+    'Tetraneura nigriabdominalis', 'Tetrachynus cinnarinus', 'Tetranychus piercei',
+    'Thalassodes quadraria', 'Thosea andamanica', 'Thrips nigripilosus', 'Thrips orientalis',
+    'Thrips tabaci', 'Thysanoplusia orichalcea', 'Toxoptera odinae', 'Trialeurodes rara',
+    'Trialeurodes ricini', 'Trichoplusia ni', 'Tuta absoluta', 'Udaspes folus',
+    'Urentius hystricellus', 'uroleucon carthami', 'Vespula germanica', 'Xeroma mura',
+    'xylosadrus compactus', 'Xylotrchus quadripes', 'Zeuzera coffe', 'non insects',
+    'Papilio polytes', 'Periplaneta americana'
+]
+
+
+# --------------------------------------------------
+# Species Data
+# --------------------------------------------------
+def load_insect_data(path=PEST_JSON):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_insect_data(data, path=PEST_JSON):
+    # Write to a temp file and swap it in so readers never see a half-written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def content_hash(details):
+    # Stable fingerprint of one species record, used to key derived caches
+    payload = json.dumps(details, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def file_version(path):
+    # Cheap change marker used as a cache key for hot-reloading data files
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+# --------------------------------------------------
+# Preprocessing
+# --------------------------------------------------
+def preprocess_image(image, size=IMG_SIZE):
+    # Same scaling as tensorflow.keras.applications.mobilenet_v2.preprocess_input
+    img = image.resize((size, size))
+    img_array = np.asarray(img, dtype=np.float32)
+    return img_array / 127.5 - 1.0
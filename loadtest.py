@@ -0,0 +1,344 @@
+# --------------------------------------------------
+# Insectifica – load test with simulated concurrent users
+#
+# Each simulated farmer runs the real flow in a loop: open the app
+# (intro -> classification), upload a photo from --images, read the
+# result, then pause for a random think time. The number of users
+# follows a ramp profile in fixed-length stages; per stage the report has
+# latency percentiles per step, error rate and throughput, plus CPU and
+# RSS of the serving process sampled every second. The saturation point
+# is the first stage where p95 exceeds the SLO, errors exceed the limit,
+# or more users stop adding throughput.
+#
+# Targets:
+#   local  one app.py instance in this process: navigation runs app.py
+#          through Streamlit's AppTest (one session per user, shared
+#          caches), the upload runs the app's single-insect path
+#          (upload_guard + predict_adaptive + priors + species page).
+#          AppTest cannot fill a file_uploader, hence the split.
+#   http   a running page that takes a multipart "image" / "crop" POST,
+#          e.g. python insectifica_edge.pyz --serve; pass --pid to
+#          sample the server's CPU / RSS.
+#
+# Usage:
+#   python loadtest.py --images val/ --profile steps:1,2,4,8,16 --stage-seconds 60
+#   python loadtest.py --target http --url http://127.0.0.1:8502 --pid 1234 --images val/
+# --------------------------------------------------
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+import uuid
+
+import numpy as np
+
+REPORT_PATH = "loadtest_report.json"
+STAGE_SECONDS = 60.0
+THINK_SECONDS = 2.0
+SLO_MS = 3000.0
+MAX_ERROR_RATE = 0.01
+MIN_GAIN = 1.05           # more users must add at least 5% throughput
+SAMPLE_INTERVAL = 1.0
+
+
+def parse_profile(spec):
+    # "steps:1,2,4,8" or "ramp:START:END:STAGES" -> users per stage
+    kind, _, values = spec.partition(":")
+    if kind == "steps":
+        return [int(v) for v in values.split(",")]
+    if kind == "ramp":
+        start, end, stages = (int(v) for v in values.split(":"))
+        return [int(round(u)) for u in np.linspace(start, end, stages)]
+    raise ValueError(f"Unknown profile '{spec}'; use steps:1,2,4 or ramp:1:32:6")
+
+
+def process_usage(pid):
+    # (CPU seconds, RSS bytes) of a process, or None if it cannot be read
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if pid != os.getpid():
+            return None
+        from session_memory import rss_bytes
+        return sum(os.times()[:2]), rss_bytes()
+
+
+# --------------------------------------------------
+# Targets
+# --------------------------------------------------
+class LocalTarget:
+    def __init__(self, crop=None, navigate=True, script="app.py"):
+        from crops import CropIndex
+        from insect_core import MODEL_PATH, load_insect_data
+        from model_registry import DEFAULT_VERSION, ModelRegistry
+        from priors import PriorTable
+        from prototypes import PrototypeTable, extend_predictions, extended_labels
+        from resolution import ResolutionPolicy
+        from species_pages import render_all
+
+        self.crop = crop
+        self.navigate = navigate
+        self.script = script
+        self.registry = ModelRegistry()
+        self.registry.load(DEFAULT_VERSION, MODEL_PATH, block=True)
+        self.registry.sync()
+        self.policy = ResolutionPolicy()
+        insect_data = load_insect_data()
+        prototypes = PrototypeTable.load()
+        self.labels = extended_labels(prototypes)
+        self.fragments = render_all(insect_data)
+        prior_table = PriorTable(CropIndex(insect_data), self.labels)
+
+        def postprocess(result):
+            probs = result.probs
+            if result.version == DEFAULT_VERSION:
+                probs = extend_predictions(probs, result.embeddings, prototypes)
+            return prior_table.apply(probs, crop=self.crop)
+        self.postprocess = postprocess
+
+    def session(self):
+        at = None
+        if self.navigate:
+            from streamlit.testing.v1 import AppTest
+            at = AppTest.from_file(self.script, default_timeout=300)
+
+        def navigate():
+            at.session_state.page = "intro"
+            at.run()
+            next(b for b in at.button if "Start Identification" in b.label).click().run()
+            if at.exception or at.session_state.page != "classification":
+                raise RuntimeError("navigation to the classification page failed")
+
+        def classify(data):
+            from resolution import predict_adaptive
+            from upload_guard import decode_upload, open_upload
+            image = decode_upload(open_upload(data))
+            result = predict_adaptive(self.registry, [image], self.policy, postprocess=self.postprocess)
+            image.close()
+            name = self.labels[int(np.argmax(result.probs[0]))]
+            return self.fragments.get(name, name)
+
+        return ([("navigate", navigate)] if at is not None else []), classify
+
+
+class HttpTarget:
+    def __init__(self, url, crop=None, timeout=60.0):
+        self.url = url
+        self.crop = crop
+        self.timeout = timeout
+
+    def session(self):
+        def navigate():
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+                response.read()
+
+        def classify(data):
+            boundary = uuid.uuid4().hex
+            body = io.BytesIO()
+            for name, value, filename in (("image", data, "photo.jpg"), ("crop", (self.crop or "").encode(), None)):
+                body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"".encode())
+                body.write(f"; filename=\"{filename}\"\r\n".encode() if filename else b"\r\n")
+                body.write(b"\r\n" + value + b"\r\n")
+            body.write(f"--{boundary}--\r\n".encode())
+            request = urllib.request.Request(self.url, data=body.getvalue(), method="POST", headers={
+                "Content-Type": f"multipart/form-data; boundary={boundary}"})
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                page = response.read().decode("utf-8", "replace")
+            if "Confidence" not in page:
+                raise RuntimeError("no result in the response")
+            return page
+
+        return [("navigate", navigate)], classify
+
+
+# --------------------------------------------------
+# Runner
+# --------------------------------------------------
+class LoadTest:
+    def __init__(self, target, images, think=THINK_SECONDS, pid=None):
+        self.target = target
+        self.images = images
+        self.think = think
+        self.pid = pid or os.getpid()
+        self.stage = 0
+        self.records = []      # (stage, step, ms, ok)
+        self.samples = []
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._users = []
+        self._threads = []
+        self._done = threading.Event()
+
+    def _record(self, stage, step, ms, ok, error=None):
+        with self._lock:
+            self.records.append((stage, step, ms, ok))
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def _user(self, stop, seed):
+        rng = random.Random(seed)
+        try:
+            steps, classify = self.target.session()
+        except Exception as exc:
+            self._record(self.stage, "session", 0.0, False, f"{type(exc).__name__}: {exc}")
+            return
+        while not stop.is_set() and not self._done.is_set():
+            stage, flow_start = self.stage, time.perf_counter()
+            data = rng.choice(self.images)
+            ok = True
+            for step, call in steps + [("classify", lambda: classify(data))]:
+                start = time.perf_counter()
+                try:
+                    call()
+                except Exception as exc:
+                    self._record(stage, step, (time.perf_counter() - start) * 1000.0, False,
+                                 f"{type(exc).__name__}: {exc}")
+                    ok = False
+                    break
+                self._record(stage, step, (time.perf_counter() - start) * 1000.0, True)
+            self._record(stage, "flow", (time.perf_counter() - flow_start) * 1000.0, ok)
+            if self.think:
+                stop.wait(rng.expovariate(1.0 / self.think))
+
+    def set_users(self, count):
+        while len(self._users) < count:
+            stop = threading.Event()
+            thread = threading.Thread(target=self._user, args=(stop, len(self._users)), daemon=True)
+            thread.start()
+            self._users.append((thread, stop))
+            self._threads.append(thread)
+        while len(self._users) > count:
+            self._users.pop()[1].set()
+
+    def _sample(self):
+        start = time.perf_counter()
+        last = process_usage(self.pid)
+        last_time = start
+        while not self._done.wait(SAMPLE_INTERVAL):
+            usage, now = process_usage(self.pid), time.perf_counter()
+            if usage is None or last is None:
+                last = usage
+                continue
+            self.samples.append({
+                "t": round(now - start, 1), "users": len(self._users), "stage": self.stage,
+                "cpu_percent": 100.0 * (usage[0] - last[0]) / (now - last_time),
+                "rss_mb": usage[1] / 1e6,
+            })
+            last, last_time = usage, now
+
+    def run(self, profile, stage_seconds):
+        sampler = threading.Thread(target=self._sample, daemon=True)
+        sampler.start()
+        for stage, users in enumerate(profile):
+            self.stage = stage
+            self.set_users(users)
+            print(f"👥 Stage {stage + 1}/{len(profile)}: {users} users")
+            time.sleep(stage_seconds)
+        self._done.set()
+        self.set_users(0)
+        for thread in self._threads:
+            thread.join()
+        sampler.join()
+
+    def stage_report(self, profile, stage_seconds):
+        rows = []
+        records = list(self.records)
+        for stage, users in enumerate(profile):
+            row = {"stage": stage + 1, "users": users}
+            flows = [r for r in records if r[0] == stage and r[1] == "flow"]
+            ok = [r[2] for r in flows if r[3]]
+            row["flows"] = len(flows)
+            row["error_rate"] = (len(flows) - len(ok)) / len(flows) if flows else 0.0
+            row["throughput"] = len(ok) / stage_seconds
+            for step in sorted({r[1] for r in records if r[0] == stage and r[3]}):
+                latencies = [r[2] for r in records if r[0] == stage and r[1] == step and r[3]]
+                for p in (50, 95, 99):
+                    row[f"{step}_p{p}_ms"] = float(np.percentile(latencies, p))
+            samples = [s for s in self.samples if s["stage"] == stage]
+            if samples:
+                row["cpu_percent"] = float(np.mean([s["cpu_percent"] for s in samples]))
+                row["rss_mb"] = float(max(s["rss_mb"] for s in samples))
+            rows.append(row)
+        return rows
+
+
+def saturation(rows, slo_ms=SLO_MS, max_error_rate=MAX_ERROR_RATE):
+    # (first saturated stage or None, reason, last healthy stage or None)
+    healthy = None
+    for row in rows:
+        if not row["flows"]:
+            continue
+        if row["error_rate"] > max_error_rate:
+            return row, f"error rate {row['error_rate']:.1%}", healthy
+        if row.get("flow_p95_ms", 0.0) > slo_ms:
+            return row, f"p95 {row['flow_p95_ms']:.0f} ms over the {slo_ms:.0f} ms SLO", healthy
+        if healthy and row["users"] > healthy["users"] and row["throughput"] < healthy["throughput"] * MIN_GAIN:
+            return row, "throughput stopped growing with more users", healthy
+        healthy = row
+    return None, "not reached", healthy
+
+
+if __name__ == "__main__":
+    from benchmark import list_images
+
+    parser = argparse.ArgumentParser(description="Simulate concurrent users and find the saturation point")
+    parser.add_argument("--images", required=True, help="Folder of photos to upload")
+    parser.add_argument("--target", choices=("local", "http"), default="local")
+    parser.add_argument("--url", default="http://127.0.0.1:8502", help="Page to load for --target http")
+    parser.add_argument("--pid", type=int, help="Server process to sample for --target http")
+    parser.add_argument("--profile", default="steps:1,2,4,8,16", help="steps:1,2,4 or ramp:START:END:STAGES")
+    parser.add_argument("--stage-seconds", type=float, default=STAGE_SECONDS)
+    parser.add_argument("--think", type=float, default=THINK_SECONDS, help="Mean pause between flows")
+    parser.add_argument("--crop", help="Declared crop sent with every upload")
+    parser.add_argument("--slo-ms", type=float, default=SLO_MS, help="p95 limit for a whole flow")
+    parser.add_argument("--no-navigate", action="store_true", help="local: upload and classify only")
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    profile = parse_profile(args.profile)
+    images = []
+    for path, _ in list_images(args.images, args.limit):
+        with open(path, "rb") as f:
+            images.append(f.read())
+    if not images:
+        raise SystemExit(f"No images in {args.images}")
+
+    if args.target == "http":
+        target = HttpTarget(args.url, args.crop)
+    else:
+        target = LocalTarget(args.crop, navigate=not args.no_navigate)
+    test = LoadTest(target, images, args.think, args.pid if args.target == "http" else None)
+    test.run(profile, args.stage_seconds)
+
+    rows = test.stage_report(profile, args.stage_seconds)
+    saturated, reason, healthy = saturation(rows, args.slo_ms)
+    report = {
+        "target": args.target, "profile": profile, "stage_seconds": args.stage_seconds, "think": args.think,
+        "slo_ms": args.slo_ms, "stages": rows, "samples": test.samples, "errors": test.errors,
+        "saturation": {"users": saturated["users"] if saturated else None, "reason": reason,
+                       "capacity_users": healthy["users"] if healthy else None},
+    }
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"{'users':>5} {'flows':>6} {'err':>6} {'flow/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'CPU %':>6} {'RSS MB':>7}")
+    for row in rows:
+        print(f"{row['users']:5d} {row['flows']:6d} {row['error_rate']:6.1%} {row['throughput']:7.2f} "
+              f"{row.get('flow_p50_ms', 0):8.0f} {row.get('flow_p95_ms', 0):8.0f} {row.get('flow_p99_ms', 0):8.0f} "
+              f"{row.get('cpu_percent', 0):6.0f} {row.get('rss_mb', 0):7.0f}")
+    for error, count in sorted(test.errors.items(), key=lambda item: -item[1])[:5]:
+        print(f"  ⚠️ {count}× {error}")
+    if saturated:
+        print(f"📈 Saturates at {saturated['users']} users ({reason}); "
+              f"capacity {healthy['users'] if healthy else 0} users → {REPORT_PATH}")
+    else:
+        print(f"📈 No saturation up to {profile[-1]} users → {REPORT_PATH}")
@@ -0,0 +1,85 @@
+# --------------------------------------------------
+# Insectifica – per-rerun payload & render time
+#
+# Runs app.py headlessly with Streamlit's AppTest for each navigation page
+# and reports the serialized size of the elements sent on a rerun and the
+# server-side script time. Run it before and after UI changes to compare.
+# With --sessions N it keeps N sessions open on each page and reports the
+# process RSS growth and session-state footprint per session.
+#
+# Usage:
+#   python measure_payload.py --runs 5
+#   python measure_payload.py --sessions 50
+# --------------------------------------------------
+import argparse
+import time
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from session_memory import footprint, rss_bytes
+
+PAGES = ("intro", "classification", "search", "crops", "history", "about_app", "features", "developers")
+
+
+def iter_nodes(node):
+    yield node
+    for child in getattr(node, "children", {}).values():
+        yield from iter_nodes(child)
+
+
+def payload_bytes(at):
+    total = 0
+    for node in iter_nodes(at.main):
+        proto = getattr(node, "proto", None)
+        if proto is not None and hasattr(proto, "ByteSize"):
+            total += proto.ByteSize()
+    return total
+
+
+def measure_page(page, runs, script="app.py"):
+    at = AppTest.from_file(script, default_timeout=300)
+    at.session_state.page = page
+    at.run()  # first run loads the model and fills the caches
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        at.run()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return payload_bytes(at), np.array(timings)
+
+
+def measure_sessions(page, count, script="app.py"):
+    # The first session fills the shared caches; the rest measure per-session cost
+    sessions = [AppTest.from_file(script, default_timeout=300)]
+    sessions[0].session_state.page = page
+    sessions[0].run()
+    before = rss_bytes()
+    for _ in range(count):
+        at = AppTest.from_file(script, default_timeout=300)
+        at.session_state.page = page
+        at.run()
+        sessions.append(at)
+    per_session = (rss_bytes() - before) / count
+    state = np.mean([footprint(at.session_state) for at in sessions[1:]])
+    return per_session, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-rerun payload size and render time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--script", default="app.py")
+    parser.add_argument("--sessions", type=int, default=0, help="Measure memory per open session")
+    args = parser.parse_args()
+
+    if args.sessions:
+        print(f"{'page':<16} {'RSS/session':>12} {'state':>10}")
+        for page in PAGES:
+            per_session, state = measure_sessions(page, args.sessions, args.script)
+            print(f"{page:<16} {per_session / 1024:10.1f}KB {state / 1024:8.1f}KB")
+        raise SystemExit
+
+    print(f"{'page':<16} {'payload':>10} {'p50 ms':>8} {'max ms':>8}")
+    for page in PAGES:
+        size, timings = measure_page(page, args.runs, args.script)
+        print(f"{page:<16} {size / 1024:8.1f}KB {np.percentile(timings, 50):8.1f} {timings.max():8.1f}")
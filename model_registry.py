@@ -0,0 +1,302 @@
+# --------------------------------------------------
+# Insectifica – model registry with hot-swap and A/B routing
+#
+# Versions are loaded and warmed on a background thread, then swapped in
+# atomically. Traffic can be split to a canary version by percentage, or
+# mirrored to a shadow version whose answers are only compared.
+#
+# Routing is controlled by model_registry.json, re-read whenever it changes:
+#   {
+#       "versions": {"best": "mobilenetv2_insect_best.keras"},
+#       "active": "mobilenetv2_insect",
+#       "canary": {"version": "best", "percent": 10},
+#       "shadow": "best"
+#   }
+# Per-version latency and shadow agreement are written to model_metrics.json.
+# --------------------------------------------------
+import json
+import os
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from insect_core import MODEL_PATH, file_version, preprocess_image
+from runtime_config import apply_runtime_config
+
+REGISTRY_CONFIG = "model_registry.json"
+METRICS_PATH = "model_metrics.json"
+METRICS_INTERVAL = 30.0
+DEFAULT_VERSION = os.path.splitext(os.path.basename(MODEL_PATH))[0]
+LATENCY_WINDOW = 1000
+
+Prediction = namedtuple("Prediction", ["probs", "embeddings", "version", "resolution", "heatmaps"],
+                        defaults=(None,))
+
+
+def load_version_model(path):
+    # Thread pools / CPU pinning from runtime_config.json, before TF starts
+    config = apply_runtime_config()
+    import tensorflow as tf
+
+    from precision import checked_precision, reduced_precision_model
+    from prototypes import build_embedding_model
+    model = tf.keras.models.load_model(path)
+    precision = checked_precision(path, config["precision"])
+    if precision != "float32":
+        model = reduced_precision_model(model, precision)
+    return build_embedding_model(model)
+
+
+def build_flexible_model(model):
+    # Convolutions and global pooling are size-agnostic, so the same weights
+    # can run at any input resolution without copying them
+    import tensorflow as tf
+    inputs = tf.keras.Input((None, None, 3))
+    return tf.keras.Model(inputs, model(inputs))
+
+
+# --------------------------------------------------
+# Model Version
+# --------------------------------------------------
+class ModelVersion:
+    def __init__(self, name, path, model):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.input_size = model.input_shape[1]
+        self._flexible = None
+        self._explainers = {}
+        self.loaded_at = time.time()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.compared = 0
+        self.agreed = 0
+
+    def run(self, batch):
+        model = self.model
+        if batch.shape[1] != self.input_size:
+            if self._flexible is None:
+                self._flexible = build_flexible_model(self.model)
+            model = self._flexible
+        # Direct call avoids model.predict's per-call setup for small batches
+        outputs = model(batch, training=False)
+        # float32 out, also for reduced-precision embeddings
+        return [np.asarray(o, dtype=np.float32) for o in outputs]
+
+    def run_explained(self, batch):
+        # (probs, embeddings, heatmaps) from one forward + backward pass;
+        # built on first use per input size, so it costs nothing until asked for
+        from explain import build_explainer, make_gradcam
+        native = batch.shape[1] == self.input_size
+        with self._lock:
+            gradcam = self._explainers.get(native)
+            if gradcam is None:
+                explainer = build_explainer(self.model)
+                gradcam = self._explainers[native] = make_gradcam(
+                    explainer if native else build_flexible_model(explainer))
+        return [np.asarray(o, dtype=np.float32) for o in gradcam(batch)]
+
+    def warm(self):
+        self.run(np.zeros((1, self.input_size, self.input_size, 3), dtype=np.float32))
+
+    def predict(self, images, resolution=None, explain=False):
+        # (probs, embeddings), plus Grad-CAM heatmaps with explain=True
+        size = resolution or self.input_size
+        return self.predict_arrays(np.stack([preprocess_image(img, size) for img in images]), explain)
+
+    def predict_arrays(self, batch, explain=False):
+        # Same, for an already preprocessed float32 batch (e.g. trap tiles)
+        start = time.perf_counter()
+        outputs = self.run_explained(batch) if explain else self.run(batch)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(elapsed)
+        return tuple(outputs)
+
+    def record_agreement(self, agreed, total):
+        with self._lock:
+            self.agreed += agreed
+            self.compared += total
+
+    def stats(self):
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000.0
+            stats = {
+                "path": self.path,
+                "requests": self.requests,
+                "loaded_at": self.loaded_at,
+            }
+            if len(latencies):
+                stats["latency_ms"] = {
+                    "mean": float(latencies.mean()),
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p95": float(np.percentile(latencies, 95)),
+                }
+            if self.compared:
+                stats["agreement"] = self.agreed / self.compared
+                stats["compared"] = self.compared
+            return stats
+
+
+# --------------------------------------------------
+# Registry
+# --------------------------------------------------
+class ModelRegistry:
+    def __init__(self, loader=load_version_model):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._loading = set()
+        self.active = None
+        self.target = None
+        self.canary = None
+        self.canary_percent = 0.0
+        self.shadow = None
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1)
+        self._shadow_slot = threading.Semaphore(1)
+        self._config_version = None
+        self._metrics_written = 0.0
+        self.in_flight = 0
+
+    def versions(self):
+        with self._lock:
+            return dict(self._versions)
+
+    def current(self):
+        # Active version, for callers that batch preprocessed arrays themselves
+        with self._lock:
+            return self._versions[self.active]
+
+    def load(self, name, path, block=False):
+        with self._lock:
+            if name in self._versions or name in self._loading:
+                return
+            self._loading.add(name)
+
+        def _load():
+            try:
+                version = ModelVersion(name, path, self._loader(path))
+                version.warm()
+                with self._lock:
+                    self._versions[name] = version
+                    # Swap only once warm, so no request pays for the first call
+                    if self.active is None or self.target == name:
+                        self.active = name
+            finally:
+                with self._lock:
+                    self._loading.discard(name)
+
+        if block:
+            _load()
+        else:
+            threading.Thread(target=_load, name=f"load-{name}", daemon=True).start()
+
+    def promote(self, name):
+        with self._lock:
+            self.target = name
+            if name in self._versions:
+                self.active = name
+
+    def set_canary(self, name, percent):
+        with self._lock:
+            self.canary = name
+            self.canary_percent = float(percent)
+
+    def set_shadow(self, name):
+        with self._lock:
+            self.shadow = name
+
+    def choose(self):
+        # Canary split for one request. Requests made of several batches
+        # (trap scans) choose once and pass the version to every batch.
+        with self._lock:
+            version = self._versions[self.active]
+            canary = self._versions.get(self.canary)
+            percent = self.canary_percent
+        if canary is not None and random.random() * 100.0 < percent:
+            version = canary
+        return version
+
+    def predict(self, images, resolution=None, explain=False, version=None):
+        return self._route(lambda v, explain: v.predict(images, resolution, explain),
+                           explain, resolution, version)
+
+    def predict_arrays(self, batch, explain=False, version=None):
+        return self._route(lambda v, explain: v.predict_arrays(batch, explain),
+                           explain, batch.shape[1], version)
+
+    def _route(self, run, explain, resolution, version):
+        # run(version, explain) -> (probs, embeddings[, heatmaps])
+        version = version or self.choose()
+        with self._lock:
+            shadow = self._versions.get(self.shadow)
+            self.in_flight += 1
+        try:
+            probs, embeddings, *heatmaps = run(version, explain)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        # Shadow runs off the request path; drop the sample if it is still busy
+        if shadow is not None and shadow is not version and self._shadow_slot.acquire(blocking=False):
+            try:
+                self._shadow_pool.submit(self._run_shadow, shadow, run, probs)
+            except RuntimeError:
+                # Pool shut down (interpreter exit); _run_shadow will never release
+                self._shadow_slot.release()
+        return Prediction(probs, embeddings, version.name, resolution or version.input_size,
+                          heatmaps[0] if heatmaps else None)
+
+    def _run_shadow(self, shadow, run, reference):
+        try:
+            probs = run(shadow, False)[0]
+            n = min(probs.shape[1], reference.shape[1])
+            agreed = int(np.sum(probs[:, :n].argmax(axis=1) == reference[:, :n].argmax(axis=1)))
+            shadow.record_agreement(agreed, len(reference))
+        finally:
+            self._shadow_slot.release()
+
+    def stats(self):
+        with self._lock:
+            versions = dict(self._versions)
+            routing = {
+                "active": self.active,
+                "target": self.target,
+                "canary": self.canary,
+                "canary_percent": self.canary_percent,
+                "shadow": self.shadow,
+                "in_flight": self.in_flight,
+                "loading": sorted(self._loading),
+            }
+        return {"routing": routing, "versions": {n: v.stats() for n, v in versions.items()}}
+
+    # --------------------------------------------------
+    # Config File
+    # --------------------------------------------------
+    def sync(self, path=REGISTRY_CONFIG, metrics_path=METRICS_PATH):
+        version = file_version(path)
+        if version and version != self._config_version:
+            self._config_version = version
+            with open(path, "r", encoding="utf-8") as f:
+                self.apply_config(json.load(f))
+
+        now = time.time()
+        if metrics_path and now - self._metrics_written > METRICS_INTERVAL:
+            self._metrics_written = now
+            with open(metrics_path, "w", encoding="utf-8") as f:
+                json.dump(self.stats(), f, indent=4)
+
+    def apply_config(self, config):
+        for name, version_path in config.get("versions", {}).items():
+            self.load(name, version_path)
+        if config.get("active"):
+            self.promote(config["active"])
+        canary = config.get("canary") or {}
+        self.set_canary(canary.get("version"), canary.get("percent", 0))
+        self.set_shadow(config.get("shadow"))
@@ -0,0 +1,73 @@
+# --------------------------------------------------
+# Insectifica – model comparison helpers
+#
+# Shared by the precision, distillation and pruning tools: speed on this
+# machine, agreement with a reference model, and per-class accuracy on a
+# labelled folder (one sub-folder per class name).
+# --------------------------------------------------
+import os
+import time
+
+import numpy as np
+
+from insect_core import class_names, preprocess_image
+
+
+def evaluation_arrays(items, input_size):
+    # [(path, label)] -> (arrays, labels), preprocessed exactly as in the app
+    from PIL import Image
+    arrays = np.stack([preprocess_image(Image.open(path).convert("RGB"), input_size) for path, _ in items])
+    return arrays, np.array([label for _, label in items])
+
+
+def evaluation_set(folder, input_size, limit=None):
+    from benchmark import list_images
+    return evaluation_arrays(list_images(folder, limit), input_size)
+
+
+def benchmark(version, arrays, batch_size=32, latency_samples=50):
+    # (probs, speed) for a ModelVersion; latency is single-image, throughput batched
+    version.run(arrays[:1])
+    version.run(arrays[:batch_size])
+    latencies = []
+    for i in range(min(latency_samples, len(arrays))):
+        start = time.perf_counter()
+        version.run(arrays[i:i + 1])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    probs = []
+    start = time.perf_counter()
+    for i in range(0, len(arrays), batch_size):
+        probs.append(version.run(arrays[i:i + batch_size])[0])
+    elapsed = time.perf_counter() - start
+    return np.concatenate(probs), {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "throughput": len(arrays) / elapsed,
+    }
+
+
+def model_size(path, model=None):
+    size = {"file_mb": os.path.getsize(path) / 1e6 if os.path.exists(path) else None}
+    if model is not None:
+        size["params"] = int(model.count_params())
+    return size
+
+
+def agreement(reference_probs, candidate_probs):
+    reference_top1 = reference_probs.argmax(axis=1)
+    candidate_top5 = np.argsort(-candidate_probs, axis=1)[:, :5]
+    return {
+        "top1_agreement": float(np.mean(candidate_probs.argmax(axis=1) == reference_top1)),
+        # Reference answer within the candidate's five best guesses
+        "top5_agreement": float(np.mean([t in row for t, row in zip(reference_top1, candidate_top5)])),
+    }
+
+
+def per_class_accuracy(probs, labels, names=class_names):
+    # {class name: (correct, total)} for classes present in labels
+    predicted = probs.argmax(axis=1)
+    result = {}
+    for idx in np.unique(labels[labels >= 0]):
+        mask = labels == idx
+        result[names[idx]] = (int(np.sum(predicted[mask] == idx)), int(mask.sum()))
+    return result
@@ -0,0 +1,150 @@
+# --------------------------------------------------
+# Insectifica – reduced-precision inference (bfloat16 / float16)
+#
+# The model is rebuilt with every layer in the reduced dtype except the
+# softmax head, which stays float32 so probabilities are not rounded;
+# weights are cast once at load time. bfloat16 is fast on CPUs with
+# AVX512-BF16 / AMX; float16 mostly helps GPUs and is often slower on CPU.
+#
+# Opt in per deployment with "precision": "bfloat16" in runtime_config.json.
+# The loader only uses it after this script has passed the parity check
+# for that model file (precision_report.json); otherwise it stays float32.
+#
+# Usage:
+#   python precision.py --images val/ --precision bfloat16
+# --------------------------------------------------
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from insect_core import MODEL_PATH
+from model_report import benchmark, evaluation_set
+
+PRECISIONS = ("float32", "bfloat16", "float16")
+PRECISION_REPORT = "precision_report.json"
+MIN_AGREEMENT = 0.99      # top-1 agreement with float32 needed to pass
+MAX_PROB_DIFF = 0.05
+
+log = logging.getLogger(__name__)
+
+
+def _set_dtype(config, dtype):
+    for layer in config.get("layers", []):
+        if layer["class_name"] == "InputLayer":
+            continue
+        if "layers" in layer["config"]:
+            _set_dtype(layer["config"], dtype)  # nested model
+        else:
+            layer["config"]["dtype"] = dtype
+
+
+def reduced_precision_model(model, precision):
+    import tensorflow as tf
+
+    config = model.get_config()
+    _set_dtype(config, precision)
+    head = model.layers[-1].name
+    for layer in config["layers"]:
+        if layer["config"].get("name") == head:
+            layer["config"]["dtype"] = "float32"
+    reduced = model.__class__.from_config(config)
+    if len(reduced.weights) != len(model.weights):
+        raise ValueError("Rebuilt model does not match the original weights")
+    for target, source in zip(reduced.weights, model.weights):
+        target.assign(tf.cast(source, target.dtype))
+    return reduced
+
+
+# --------------------------------------------------
+# Parity Gate
+# --------------------------------------------------
+def _report_key(model_path, precision):
+    return f"{os.path.basename(model_path)}:{precision}"
+
+
+def load_reports(path=PRECISION_REPORT):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def checked_precision(model_path, precision, report_path=PRECISION_REPORT):
+    # The requested precision if it passed parity for this model, else float32
+    if precision == "float32":
+        return precision
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'; use one of {PRECISIONS}")
+    report = load_reports(report_path).get(_report_key(model_path, precision))
+    if not report or not report["passed"]:
+        log.warning("%s has not passed the parity check for %s; using float32", precision, model_path)
+        return "float32"
+    return precision
+
+
+def parity(reference_probs, reduced_probs, labels=None):
+    reference_top1 = reference_probs.argmax(axis=1)
+    reduced_top1 = reduced_probs.argmax(axis=1)
+    reference_top5 = np.argsort(-reference_probs, axis=1)[:, :5]
+    result = {
+        "images": len(reference_probs),
+        "top1_agreement": float(np.mean(reference_top1 == reduced_top1)),
+        "top1_in_reference_top5": float(np.mean([t in row for t, row in zip(reduced_top1, reference_top5)])),
+        "max_prob_diff": float(np.abs(reference_probs - reduced_probs).max()),
+        "mean_prob_diff": float(np.abs(reference_probs - reduced_probs).mean()),
+    }
+    if labels is not None and (labels >= 0).any():
+        known = labels >= 0
+        result["accuracy_float32"] = float(np.mean(reference_top1[known] == labels[known]))
+        result["accuracy_reduced"] = float(np.mean(reduced_top1[known] == labels[known]))
+    result["passed"] = result["top1_agreement"] >= MIN_AGREEMENT and result["max_prob_diff"] <= MAX_PROB_DIFF
+    return result
+
+
+if __name__ == "__main__":
+    import tensorflow as tf
+
+    from model_registry import ModelVersion
+    from prototypes import build_embedding_model
+
+    parser = argparse.ArgumentParser(description="Check and benchmark reduced-precision inference")
+    parser.add_argument("--images", required=True, help="Validation folder (one sub-folder per class)")
+    parser.add_argument("--precision", choices=PRECISIONS[1:], default="bfloat16")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    reference = ModelVersion("float32", args.model, build_embedding_model(model))
+    reduced = ModelVersion(args.precision, args.model,
+                           build_embedding_model(reduced_precision_model(model, args.precision)))
+
+    arrays, labels = evaluation_set(args.images, reference.input_size, args.limit)
+
+    reference_probs, reference_speed = benchmark(reference, arrays, args.batch_size)
+    reduced_probs, reduced_speed = benchmark(reduced, arrays, args.batch_size)
+    report = parity(reference_probs, reduced_probs, labels)
+    report.update({
+        "model": args.model, "precision": args.precision,
+        "float32": reference_speed, args.precision: reduced_speed,
+        "checked_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+    reports = load_reports()
+    reports[_report_key(args.model, args.precision)] = report
+    with open(PRECISION_REPORT, "w", encoding="utf-8") as f:
+        json.dump(reports, f, indent=4)
+
+    print(f"{'':<10} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>8}")
+    for name, speed in (("float32", reference_speed), (args.precision, reduced_speed)):
+        print(f"{name:<10} {speed['p50_ms']:8.1f} {speed['p95_ms']:8.1f} {speed['throughput']:8.1f}")
+    print(f"Top-1 agreement {report['top1_agreement']:.2%}, max prob diff {report['max_prob_diff']:.4f}")
+    if "accuracy_float32" in report:
+        print(f"Accuracy float32 {report['accuracy_float32']:.2%}, "
+              f"{args.precision} {report['accuracy_reduced']:.2%}")
+    print(f"{'✅ passed' if report['passed'] else '❌ failed'} → {PRECISION_REPORT}")
@@ -0,0 +1,83 @@
+# --------------------------------------------------
+# Insectifica – context priors on model outputs
+#
+# When the user declares a crop (and optionally a region or season), the
+# softmax vector is multiplied by a class-prior vector and renormalized.
+# Priors come from the crop → species index: species recorded on the crop
+# keep full weight, species of a broader host group or not tied to a crop
+# keep part of it, and the rest are damped but never ruled out.
+#
+# Optional region/season weights are read from context_priors.json:
+#   {"region": {"tamil nadu": {"Rhynchophorus ferrugineus": 2.0}},
+#    "season": {"kharif": {"Spodoptera litura": 1.5}}}
+# --------------------------------------------------
+import json
+import os
+
+import numpy as np
+
+from crops import DIRECT, GROUP, UNBOUND, normalize_crop
+
+CONTEXT_PRIORS = "context_priors.json"
+
+PRIOR_WEIGHTS = {DIRECT: 1.0, GROUP: 0.5, UNBOUND: 0.3}
+PRIOR_OFF_CROP = 0.02
+
+
+def load_context_priors(path=CONTEXT_PRIORS):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def apply_prior(probs, prior):
+    # probs: (batch, classes); prior broadcasts over the batch
+    probs = np.asarray(probs, dtype=np.float32)
+    weighted = probs * prior[:probs.shape[-1]]
+    total = weighted.sum(axis=-1, keepdims=True)
+    return np.where(total > 0, weighted / np.maximum(total, 1e-12), probs)
+
+
+class PriorTable:
+    def __init__(self, crop_index, labels, context_priors=None):
+        self.crop_index = crop_index
+        self.labels = list(labels)
+        self.context_priors = load_context_priors() if context_priors is None else context_priors
+        self._cache = {}
+
+    def _crop_vector(self, crop):
+        pests = self.crop_index.pests_for(crop, include_unbound=True)
+        return np.array([
+            PRIOR_WEIGHTS[pests[label]] if label in pests
+            else PRIOR_WEIGHTS[UNBOUND] if label not in self.crop_index.species_crops
+            else PRIOR_OFF_CROP
+            for label in self.labels
+        ], dtype=np.float32)
+
+    def _context_vector(self, kind, value):
+        weights = self.context_priors.get(kind, {}).get(str(value).strip().lower(), {})
+        return np.array([weights.get(label, 1.0) for label in self.labels], dtype=np.float32)
+
+    def vector(self, crop=None, region=None, season=None):
+        # Cached per context; None when no context is declared
+        key = (normalize_crop(crop) if crop else None, region, season)
+        if key == (None, None, None):
+            return None
+        prior = self._cache.get(key)
+        if prior is None:
+            prior = np.ones(len(self.labels), dtype=np.float32)
+            if key[0]:
+                prior *= self._crop_vector(key[0])
+            if region:
+                prior *= self._context_vector("region", region)
+            if season:
+                prior *= self._context_vector("season", season)
+            self._cache[key] = prior
+        return prior
+
+    def apply(self, probs, crop=None, region=None, season=None):
+        prior = self.vector(crop, region, season)
+        if prior is None:
+            return np.asarray(probs, dtype=np.float32)
+        return apply_prior(probs, prior)
@@ -0,0 +1,168 @@
+# --------------------------------------------------
+# Insectifica – incremental species registration
+#
+# New species are added without retraining: a few example images are
+# embedded with the frozen network (the features feeding the softmax
+# layer) and averaged into a prototype vector. At prediction time the
+# same forward pass yields both the softmax and the embedding, and
+# prototype matches are appended to the probability vector.
+#
+# Usage:
+#   python prototypes.py --name "Helicoverpa armigera" --images samples/ \
+#       --details helicoverpa.json
+# --------------------------------------------------
+import argparse
+import os
+
+import numpy as np
+from PIL import Image
+
+from insect_core import (
+    MODEL_PATH, PEST_JSON, class_names, load_insect_data, preprocess_image, save_insect_data
+)
+
+PROTOTYPE_PATH = "prototypes.npz"
+SIMILARITY_THRESHOLD = 0.75
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# --------------------------------------------------
+# Prototype Table
+# --------------------------------------------------
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class PrototypeTable:
+    def __init__(self, names=None, vectors=None, counts=None):
+        self.names = list(names or [])
+        self.vectors = np.zeros((0, 0), dtype=np.float32) if vectors is None else _normalize(vectors)
+        self.counts = np.zeros(len(self.names), dtype=np.int64) if counts is None else np.asarray(counts)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls, path=PROTOTYPE_PATH):
+        # path may also be a file object (e.g. read from a bundle)
+        if isinstance(path, str) and not os.path.exists(path):
+            return cls()
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["names"].tolist(), data["vectors"], data["counts"])
+
+    def save(self, path=PROTOTYPE_PATH):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, names=np.array(self.names, dtype=str),
+                 vectors=self.vectors, counts=self.counts)
+        os.replace(tmp_path, path)
+
+    def add(self, name, embeddings):
+        embeddings = _normalize(embeddings)
+        if name in self.names:
+            # Running mean so extra examples refine an existing prototype
+            i = self.names.index(name)
+            n = self.counts[i]
+            merged = self.vectors[i] * n + embeddings.sum(axis=0)
+            self.vectors[i] = _normalize(merged)
+            self.counts[i] = n + len(embeddings)
+            return
+        vector = _normalize(embeddings.mean(axis=0))[None, :]
+        self.vectors = vector if len(self) == 0 else np.vstack([self.vectors, vector])
+        self.names.append(name)
+        self.counts = np.append(self.counts, len(embeddings))
+
+    def similarity(self, embeddings):
+        # Cosine similarity, shape (batch, prototypes)
+        return _normalize(embeddings) @ self.vectors.T
+
+
+# --------------------------------------------------
+# Prediction
+# --------------------------------------------------
+def build_embedding_model(model):
+    # Same weights, two outputs: softmax and the features feeding it
+    import tensorflow as tf
+    return tf.keras.Model(model.input, [model.output, model.layers[-1].input])
+
+
+def extend_predictions(probs, embeddings, table, threshold=SIMILARITY_THRESHOLD):
+    # Prototype classes take mass proportional to how far their similarity
+    # exceeds the threshold; base classes share what is left. Rows sum to 1.
+    probs = np.asarray(probs, dtype=np.float32)
+    if len(table) == 0:
+        return probs
+    sims = table.similarity(embeddings)
+    mass = np.clip((sims - threshold) / (1.0 - threshold), 0.0, 1.0)
+    total = mass.sum(axis=1, keepdims=True)
+    mass = np.where(total > 1.0, mass / np.maximum(total, 1e-12), mass)
+    remaining = 1.0 - mass.sum(axis=1, keepdims=True)
+    return np.concatenate([probs * remaining, mass], axis=1)
+
+
+def extended_labels(table):
+    return class_names + table.names
+
+
+# --------------------------------------------------
+# Registration
+# --------------------------------------------------
+def _image_paths(sources):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(
+                os.path.join(source, name) for name in sorted(os.listdir(source))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            paths.append(source)
+    return paths
+
+
+def register_species(model, name, images, details=None,
+                     table_path=PROTOTYPE_PATH, pest_json=PEST_JSON):
+    if name in class_names:
+        raise ValueError(f"'{name}' is already predicted by the base model")
+    paths = _image_paths(images)
+    if not paths:
+        raise ValueError("No example images found")
+
+    batch = np.stack([preprocess_image(Image.open(p).convert("RGB")) for p in paths])
+    _, embeddings = build_embedding_model(model).predict(batch, verbose=0)
+
+    table = PrototypeTable.load(table_path)
+    table.add(name, embeddings)
+
+    insect_data = load_insect_data(pest_json)
+    record = insect_data.get(name, {"Scientific Name": name, "Common Name": name})
+    record.update(details or {})
+    insect_data[name] = record
+
+    # Species data first so the app never predicts a label it has no record for
+    save_insect_data(insect_data, pest_json)
+    table.save(table_path)
+    return len(paths)
+
+
+if __name__ == "__main__":
+    import json
+
+    import tensorflow as tf
+
+    parser = argparse.ArgumentParser(description="Register a new species from example images")
+    parser.add_argument("--name", required=True, help="Species name shown in the app")
+    parser.add_argument("--images", required=True, nargs="+", help="Image files or folders")
+    parser.add_argument("--details", help="JSON file with pest.json fields for the species")
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    details = None
+    if args.details:
+        with open(args.details, "r", encoding="utf-8") as f:
+            details = json.load(f)
+
+    model = tf.keras.models.load_model(args.model)
+    count = register_species(model, args.name, args.images, details)
+    print(f"✅ Registered '{args.name}' from {count} images")
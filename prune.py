@@ -0,0 +1,266 @@
+# --------------------------------------------------
+# Insectifica – structured pruning and weight clustering
+#
+# Channels are removed for real, so the exported model is smaller and
+# faster, not just sparse. A prunable group is a Conv2D/Dense layer whose
+# output only flows through channel-wise layers (BatchNorm, ReLU,
+# depthwise conv, padding, pooling, dropout) into one other Conv2D/Dense:
+# the expand convolutions of every MobileNetV2 block, Conv_1 and the
+# dense head. Residual connections are never cut. Channels are ranked by
+# the |gamma| of their BatchNorm; the weakest are dropped, keeping
+# multiples of 8 for efficient kernels.
+#
+# The slim model is fine-tuned briefly by distillation from the original
+# (distill.py), then kernels are clustered to a few shared values per
+# layer, which makes the file compress far better. Accuracy is reported
+# per class against the original so degraded pests stand out.
+#
+# Usage:
+#   python prune.py --images train/ --val val/ --keep 0.5 --epochs 3
+# --------------------------------------------------
+import argparse
+import json
+import time
+import zlib
+
+import numpy as np
+
+from insect_core import MODEL_PATH
+from model_report import agreement, benchmark, evaluation_set, model_size, per_class_accuracy
+
+PRUNED_PATH = "mobilenetv2_insect_pruned.keras"
+REPORT_PATH = "prune_report.json"
+KEEP_RATIO = 0.5
+CLUSTERS = 16
+FINE_TUNE_EPOCHS = 3
+FINE_TUNE_LR = 1e-4
+PRODUCERS = {"Conv2D", "Dense"}
+CHANNELWISE = {
+    "BatchNormalization", "ReLU", "Activation", "DepthwiseConv2D", "Dropout",
+    "ZeroPadding2D", "GlobalAveragePooling2D",
+}
+
+
+# --------------------------------------------------
+# Channel Groups
+# --------------------------------------------------
+def _graph(config):
+    layers = {layer["name"]: layer for layer in config["layers"]}
+    consumers = {name: [] for name in layers}
+    for layer in config["layers"]:
+        for node in layer.get("inbound_nodes", []):
+            for inbound in node:
+                consumers[inbound[0]].append(layer["name"])
+    return layers, consumers
+
+
+def find_groups(model):
+    config = model.get_config()
+    layers, consumers = _graph(config)
+    outputs = {output[0] for output in config["output_layers"]}
+    groups = []
+    for name, layer in layers.items():
+        if layer["class_name"] not in PRODUCERS or name in outputs:
+            continue
+        if layer["config"].get("groups", 1) != 1:
+            continue
+        chain, current = [], name
+        while len(consumers[current]) == 1:
+            current = consumers[current][0]
+            kind = layers[current]["class_name"]
+            if kind in CHANNELWISE:
+                chain.append(current)
+                continue
+            if kind in PRODUCERS:
+                groups.append({"producer": name, "chain": chain, "consumer": current})
+            break
+    return groups
+
+
+def channel_scores(model, group):
+    for name in group["chain"]:
+        layer = model.get_layer(name)
+        if layer.__class__.__name__ == "BatchNormalization" and layer.scale:
+            return np.abs(layer.gamma.numpy())
+    # No BatchNorm: L1 norm of each output channel's weights
+    kernel = model.get_layer(group["producer"]).kernel.numpy()
+    return np.abs(kernel).reshape(-1, kernel.shape[-1]).sum(axis=0)
+
+
+def keep_count(channels, ratio):
+    return min(channels, max(8, int(round(channels * ratio / 8)) * 8))
+
+
+def prune_model(model, ratio=KEEP_RATIO):
+    import tensorflow as tf
+
+    groups = find_groups(model)
+    keep_out, keep_in, keep_chain = {}, {}, {}
+    for group in groups:
+        scores = channel_scores(model, group)
+        keep = np.sort(np.argsort(-scores)[:keep_count(len(scores), ratio)])
+        keep_out[group["producer"]] = keep
+        keep_in[group["consumer"]] = keep
+        for name in group["chain"]:
+            keep_chain[name] = keep
+
+    config = model.get_config()
+    for layer in config["layers"]:
+        if layer["name"] in keep_out:
+            key = "filters" if layer["class_name"] == "Conv2D" else "units"
+            layer["config"][key] = len(keep_out[layer["name"]])
+    slim = tf.keras.Model.from_config(config)
+    # The config carries trainable flags (a frozen teacher, or layers frozen
+    # in training); the slim model is always fine-tuned as a whole
+    slim.trainable = True
+
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        name = layer.name
+        if name in keep_chain:
+            idx = keep_chain[name]
+            if layer.__class__.__name__ == "DepthwiseConv2D":
+                weights = [weights[0][:, :, idx, :]] + [w[idx] for w in weights[1:]]
+            else:
+                weights = [w[idx] for w in weights]
+        else:
+            if name in keep_in:
+                # Input axis is -2 for both Conv2D (h, w, in, out) and Dense (in, out)
+                weights[0] = np.take(weights[0], keep_in[name], axis=-2)
+            if name in keep_out:
+                weights = [weights[0][..., keep_out[name]]] + [w[keep_out[name]] for w in weights[1:]]
+        slim.get_layer(name).set_weights(weights)
+    return slim, groups
+
+
+# --------------------------------------------------
+# Weight Clustering
+# --------------------------------------------------
+def cluster_kernel(kernel, clusters=CLUSTERS, iterations=10):
+    # 1-D k-means; with sorted centroids each cluster is an interval, so
+    # assignment is a searchsorted instead of a distance matrix
+    flat = kernel.ravel()
+    centroids = np.linspace(flat.min(), flat.max(), clusters)
+    for _ in range(iterations):
+        assign = np.searchsorted((centroids[1:] + centroids[:-1]) / 2, flat)
+        sums = np.bincount(assign, weights=flat, minlength=clusters)
+        counts = np.bincount(assign, minlength=clusters)
+        centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+    assign = np.searchsorted((centroids[1:] + centroids[:-1]) / 2, flat)
+    return centroids[assign].astype(kernel.dtype).reshape(kernel.shape)
+
+
+def cluster_model(model, clusters=CLUSTERS):
+    for layer in model.layers:
+        if layer.__class__.__name__ in ("Conv2D", "DepthwiseConv2D", "Dense"):
+            weights = layer.get_weights()
+            weights[0] = cluster_kernel(weights[0], clusters)
+            layer.set_weights(weights)
+    return model
+
+
+# --------------------------------------------------
+# Report
+# --------------------------------------------------
+def count_flops(model):
+    total = 0
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind == "Conv2D":
+            h, w = layer.output_shape[1:3]
+            total += h * w * int(np.prod(layer.kernel.shape))
+        elif kind == "DepthwiseConv2D":
+            h, w = layer.output_shape[1:3]
+            total += h * w * int(np.prod(layer.depthwise_kernel.shape))
+        elif kind == "Dense":
+            total += int(np.prod(layer.kernel.shape))
+    return 2 * total  # multiply-adds
+
+
+def compressed_mb(model):
+    # What the weights cost to ship (bundle / download) after deflate
+    payload = b"".join(w.tobytes() for w in model.get_weights())
+    return len(zlib.compress(payload, 6)) / 1e6
+
+
+def compare(original_path, original, pruned_path, pruned, arrays, labels):
+    from model_registry import ModelVersion
+    from prototypes import build_embedding_model
+
+    original_probs, original_speed = benchmark(
+        ModelVersion("original", original_path, build_embedding_model(original)), arrays)
+    pruned_probs, pruned_speed = benchmark(
+        ModelVersion("pruned", pruned_path, build_embedding_model(pruned)), arrays)
+    report = {"images": len(arrays), **agreement(original_probs, pruned_probs)}
+    for name, model, path, probs, speed in (
+        ("original", original, original_path, original_probs, original_speed),
+        ("pruned", pruned, pruned_path, pruned_probs, pruned_speed),
+    ):
+        report[name] = dict(model_size(path, model), **speed,
+                            mflops=count_flops(model) / 1e6, compressed_mb=compressed_mb(model))
+        known = labels >= 0
+        report[name]["accuracy"] = float(np.mean(probs[known].argmax(axis=1) == labels[known]))
+
+    before = per_class_accuracy(original_probs, labels)
+    after = per_class_accuracy(pruned_probs, labels)
+    report["per_class"] = sorted((
+        {"class": name, "images": total, "original": correct / total, "pruned": after[name][0] / total,
+         "change": (after[name][0] - correct) / total}
+        for name, (correct, total) in before.items()
+    ), key=lambda row: row["change"])
+    return report
+
+
+if __name__ == "__main__":
+    import tensorflow as tf
+
+    from benchmark import list_images
+    from distill import distill, image_dataset
+
+    parser = argparse.ArgumentParser(description="Prune channels, cluster weights and fine-tune the model")
+    parser.add_argument("--images", required=True, help="Fine-tuning images (labels optional)")
+    parser.add_argument("--val", required=True, help="Labelled folder for the per-class report")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=PRUNED_PATH)
+    parser.add_argument("--keep", type=float, default=KEEP_RATIO, help="Share of channels kept per group")
+    parser.add_argument("--clusters", type=int, default=CLUSTERS, help="Shared values per kernel; 0 = off")
+    parser.add_argument("--epochs", type=int, default=FINE_TUNE_EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    original = tf.keras.models.load_model(args.model)
+    input_size = original.input_shape[1]
+
+    start = time.perf_counter()
+    # Pruned before freezing the teacher: from_config copies each layer's trainable flag
+    pruned, groups = prune_model(original, args.keep)
+    original.trainable = False
+    print(f"✂️ Pruned {len(groups)} channel groups: {original.count_params():,d} → "
+          f"{pruned.count_params():,d} parameters")
+
+    if args.epochs:
+        dataset = image_dataset(list_images(args.images), input_size, args.batch_size, augment=True)
+        distill(original, pruned, dataset, epochs=args.epochs, learning_rate=1e-4)
+    if args.clusters:
+        cluster_model(pruned, args.clusters)
+    pruned.save(args.output)
+
+    arrays, labels = evaluation_set(args.val, input_size)
+    report = compare(args.model, original, args.output, pruned, arrays, labels)
+    report.update({"keep": args.keep, "clusters": args.clusters, "epochs": args.epochs,
+                   "groups": len(groups), "seconds": time.perf_counter() - start})
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"{'':<9} {'params':>10} {'MFLOPs':>8} {'zip MB':>7} {'p50 ms':>7} {'acc':>6}")
+    for name in ("original", "pruned"):
+        row = report[name]
+        print(f"{name:<9} {row['params']:10,d} {row['mflops']:8.0f} {row['compressed_mb']:7.1f} "
+              f"{row['p50_ms']:7.1f} {row['accuracy']:6.1%}")
+    print("Most degraded classes:")
+    for row in report["per_class"][:10]:
+        print(f"  {row['change']:+7.1%}  {row['class']} ({row['original']:.0%} → {row['pruned']:.0%}, "
+              f"{row['images']} images)")
+    print(f"✅ {args.output}, full report in {REPORT_PATH}")
@@ -0,0 +1,83 @@
+# --------------------------------------------------
+# Insectifica – adaptive input resolution
+#
+# Picks an input size per request from a latency budget and current load,
+# and escalates to the high resolution when a low-res pass is not
+# confident. Latencies come from the profile written by benchmark.py;
+# without one they are estimated from the pixel count.
+# --------------------------------------------------
+import json
+import os
+
+from insect_core import IMG_SIZE
+
+RESOLUTIONS = (128, 160, IMG_SIZE, 224)
+PROFILE_PATH = "benchmark_resolutions.json"
+ESCALATE_BELOW = 0.6
+MAX_IN_FLIGHT = 4
+
+
+def load_profile(path=PROFILE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        results = json.load(f).get("resolutions", {})
+    return {int(res): row["latency_ms"]["p50"] for res, row in results.items()}
+
+
+class ResolutionPolicy:
+    def __init__(self, resolutions=RESOLUTIONS, native=IMG_SIZE, escalate_below=ESCALATE_BELOW,
+                 max_in_flight=MAX_IN_FLIGHT, profile=None, escalate_to=None):
+        self.resolutions = sorted(set(resolutions) | {native})
+        self.native = native
+        self.escalate_to = escalate_to or native
+        self.escalate_below = escalate_below
+        self.max_in_flight = max_in_flight
+        self.profile = load_profile() if profile is None else profile
+
+    def estimate_ms(self, resolution):
+        if resolution in self.profile:
+            return self.profile[resolution]
+        if self.native in self.profile:
+            # Convolution cost grows with the number of pixels
+            return self.profile[self.native] * (resolution / self.native) ** 2
+        return None
+
+    def choose(self, budget_ms=None, in_flight=0):
+        # Start from the native size and step down one resolution for every
+        # max_in_flight concurrent requests, then respect the latency budget
+        candidates = [r for r in self.resolutions if r <= self.native]
+        steps = in_flight // self.max_in_flight if self.max_in_flight else 0
+        candidates = candidates[:max(1, len(candidates) - steps)]
+        if budget_ms is not None:
+            fitting = [r for r in candidates
+                       if self.estimate_ms(r) is not None and self.estimate_ms(r) <= budget_ms]
+            candidates = fitting or candidates[:1]
+        return candidates[-1]
+
+    def should_escalate(self, resolution, confidence, in_flight=0):
+        if resolution >= self.escalate_to or confidence >= self.escalate_below:
+            return False
+        # Under heavy load keep the cheap answer instead of doubling the work
+        return in_flight < 2 * self.max_in_flight
+
+
+def predict_adaptive(registry, images, policy, budget_ms=None, postprocess=None, explain=False,
+                     version=None):
+    # postprocess(result) -> probs runs before the escalation check, so
+    # context priors that sharpen the answer let more requests exit early.
+    # Both passes use one version: the caller's, or one canary decision here.
+    version = version or registry.choose()
+
+    def run(resolution):
+        result = registry.predict(images, resolution, explain=explain, version=version)
+        if postprocess is not None:
+            result = result._replace(probs=postprocess(result))
+        return result
+
+    resolution = policy.choose(budget_ms, registry.in_flight)
+    result = run(resolution)
+    confidence = float(result.probs.max(axis=1).min())
+    if policy.should_escalate(resolution, confidence, registry.in_flight):
+        result = run(policy.escalate_to)
+    return result
@@ -0,0 +1,320 @@
+# --------------------------------------------------
+# Insectifica – persistent prediction store
+#
+# record() only puts the result on a queue. A writer thread appends
+# batches to a per-process JSON-lines segment and periodically compacts
+# closed segments into SQLite (WAL mode) in one transaction, updating a
+# per-day/species count table at the same time. History queries use
+# indexes on time and species; the dashboard reads the daily table, so
+# it stays fast with millions of rows.
+# --------------------------------------------------
+import glob
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+RESULTS_DIR = "results"
+DB_NAME = "results.db"
+FLUSH_INTERVAL = 1.0
+COMPACT_INTERVAL = 30.0
+ORPHAN_AGE = 3600.0       # live writers rotate and compact well within this
+BATCH_SIZE = 256
+QUEUE_SIZE = 10000
+TOP_K = 5
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    image_hash TEXT NOT NULL,
+    species INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    top_k TEXT,
+    crop TEXT,
+    location TEXT,
+    version TEXT
+);
+CREATE INDEX IF NOT EXISTS results_ts ON results (ts);
+CREATE INDEX IF NOT EXISTS results_species_ts ON results (species, ts);
+CREATE TABLE IF NOT EXISTS labels (
+    species INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    species INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, species)
+);
+"""
+
+COLUMNS = ("ts", "image_hash", "species", "confidence", "top_k", "crop", "location", "version")
+
+
+def top_k(probs, k=TOP_K):
+    # [[class index, probability], ...] for the k most likely classes
+    order = sorted(range(len(probs)), key=lambda i: -probs[i])[:k]
+    return [[int(i), round(float(probs[i]), 4)] for i in order]
+
+
+def _day(ts):
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _orphaned(path, pid):
+    # A recycled pid can look alive forever, so an old enough segment counts too
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return False
+    return age > ORPHAN_AGE or not _pid_alive(pid)
+
+
+class ResultStore:
+    def __init__(self, root=RESULTS_DIR, labels=None, flush_interval=FLUSH_INTERVAL,
+                 compact_interval=COMPACT_INTERVAL, compaction_hooks=()):
+        self.root = root
+        self.db_path = os.path.join(root, DB_NAME)
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.labels = list(labels or [])
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._listeners = []
+        # hook(db, rows, labels) runs inside the compaction transaction, so
+        # derived tables commit (or roll back) together with the rows
+        self._compaction_hooks = list(compaction_hooks)
+        self._pid = os.getpid()
+        self._seq = 0
+        os.makedirs(root, exist_ok=True)
+        with closing(self.connect()) as db, db:
+            db.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._run, name="result-store", daemon=True)
+        self._writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # --------------------------------------------------
+    # Writing
+    # --------------------------------------------------
+    def record(self, image_hash, species, confidence, probs=None, crop=None, location=None,
+               version=None, ts=None):
+        row = {
+            "ts": time.time() if ts is None else ts,
+            "image_hash": image_hash,
+            "species": int(species),
+            "confidence": float(confidence),
+            "top_k": json.dumps(top_k(probs)) if probs is not None else None,
+            "crop": crop,
+            "location": location,
+            "version": version,
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Never block a request on storage
+            self.dropped += 1
+
+    def add_listener(self, listener):
+        # listener(rows) is called on the writer thread after each batch
+        self._listeners.append(listener)
+
+    def _segment(self, seq):
+        return os.path.join(self.root, f"log-{self._pid}-{seq:06d}.jsonl")
+
+    def _run(self):
+        last_compact = time.monotonic()
+        try:
+            self.compact(orphans=True)
+        except Exception:
+            log.exception("Compaction of leftover segments failed")
+        while not self._stop.is_set():
+            batch, waiters = [], []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    # flush() sends an Event: write and compact, then set it
+                    (waiters if isinstance(item, threading.Event) else batch).append(item)
+                    if len(batch) >= BATCH_SIZE or waiters:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            # Nothing here may end the writer: a dead thread would drop every
+            # later result without a trace
+            if batch:
+                try:
+                    with open(self._segment(self._seq), "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(row) + "\n" for row in batch))
+                except OSError:
+                    self.failed += len(batch)
+                    log.exception("Could not write %d results", len(batch))
+                for listener in self._listeners:
+                    try:
+                        listener(batch)
+                    except Exception:
+                        log.exception("Result listener %r failed", listener)
+            if waiters or time.monotonic() - last_compact >= self.compact_interval:
+                self._seq += 1  # rotate, so the closed segment can be compacted
+                try:
+                    self.compact()
+                except Exception:
+                    # Rolled back; the segments stay on disk for the next pass
+                    log.exception("Compaction failed")
+                last_compact = time.monotonic()
+            for waiter in waiters:
+                waiter.set()
+
+    def compact(self, orphans=False):
+        # Own closed segments; with orphans=True also those left by dead
+        # processes. claimed-* are segments a compaction took but never imported.
+        current = self._segment(self._seq)
+        segments = []
+        paths = glob.glob(os.path.join(self.root, "log-*.jsonl")) + \
+            glob.glob(os.path.join(self.root, "claimed-*.jsonl"))
+        for path in sorted(paths):
+            pid = int(os.path.basename(path).split("-")[1])
+            if path == current:
+                continue
+            if pid == self._pid:
+                segments.append(path)
+            elif orphans and _orphaned(path, pid):
+                segments.extend(self._claim(path))
+        if not segments:
+            return 0
+
+        rows = []
+        for path in segments:
+            with open(path, "r", encoding="utf-8") as f:
+                rows.extend(json.loads(line) for line in f if line.strip())
+        daily = {}
+        for row in rows:
+            key = (_day(row["ts"]), row["species"])
+            daily[key] = daily.get(key, 0) + 1
+
+        with closing(self.connect()) as db, db:
+            db.executemany(
+                f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(row.get(c) for c in COLUMNS) for row in rows],
+            )
+            db.executemany(
+                "INSERT INTO daily_counts (day, species, n) VALUES (?, ?, ?) "
+                "ON CONFLICT (day, species) DO UPDATE SET n = n + excluded.n",
+                [(day, species, n) for (day, species), n in daily.items()],
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO labels (species, name) VALUES (?, ?)",
+                list(enumerate(self.labels)),
+            )
+            for hook in self._compaction_hooks:
+                # A failing hook loses only its own writes, not the results
+                db.execute("SAVEPOINT hook")
+                try:
+                    hook(db, rows, self.labels)
+                except Exception:
+                    db.execute("ROLLBACK TO hook")
+                    log.exception("Compaction hook %r failed", hook)
+                db.execute("RELEASE hook")
+        # Removed only after the transaction commits, so a crash re-imports
+        # at worst one segment rather than losing it
+        for path in segments:
+            os.remove(path)
+        return len(rows)
+
+    def _claim(self, path):
+        # Replicas starting together see the same orphans; only the one whose
+        # rename succeeds imports a segment
+        name = os.path.basename(path)
+        if name.startswith("claimed-"):
+            name = name.split("-", 2)[2]
+        claimed = os.path.join(self.root, f"claimed-{self._pid}-{name}")
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return []
+        return [claimed]
+
+    def flush(self, timeout=10.0):
+        # Wait until everything recorded so far is compacted (tools, shutdown)
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self._stop.set()
+        self._writer.join(timeout=5)
+
+    # --------------------------------------------------
+    # Queries
+    # --------------------------------------------------
+    def _where(self, start, end, species, column="ts"):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(start)
+        if end is not None:
+            # Whole days: the day containing `end` is included
+            clauses.append(f"{column} {'<=' if column == 'day' else '<'} ?")
+            params.append(end)
+        if species:
+            clauses.append(f"species IN ({', '.join('?' * len(species))})")
+            params.extend(species)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, start=None, end=None, species=None, limit=1000):
+        where, params = self._where(start, end, species)
+        with closing(self.connect()) as db, db:
+            db.row_factory = sqlite3.Row
+            rows = db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM results{where} ORDER BY ts DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def daily_counts(self, start=None, end=None, species=None):
+        # [(day, species index, count)] from the rollup table
+        where, params = self._where(
+            _day(start) if start is not None else None,
+            _day(end) if end is not None else None,
+            species, column="day",
+        )
+        with closing(self.connect()) as db, db:
+            return db.execute(
+                f"SELECT day, species, n FROM daily_counts{where} ORDER BY day", params
+            ).fetchall()
+
+    def species_totals(self, start=None, end=None):
+        where, params = self._where(
+            _day(start) if start is not None else None,
+            _day(end) if end is not None else None,
+            None, column="day",
+        )
+        with closing(self.connect()) as db, db:
+            return db.execute(
+                f"SELECT species, SUM(n) AS total FROM daily_counts{where} "
+                "GROUP BY species ORDER BY total DESC", params
+            ).fetchall()
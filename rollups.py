@@ -0,0 +1,240 @@
+# --------------------------------------------------
+# Insectifica – outbreak rollups and alerts
+#
+# Pre-aggregated counts by species, Order and Family, per day and per
+# ISO week, for every region and for all regions together. They are
+# updated inside the result store's compaction transaction, so counts
+# from every app process land in the same table exactly once. Dashboard
+# queries are primary-key lookups whose cost depends only on the number
+# of buckets asked for, never on how many results have been stored.
+#
+# Alert rules (alert_rules.json) fire when a rolling-window count
+# crosses a threshold; alerts are appended to results/alerts.jsonl and
+# passed to an optional callback.
+# --------------------------------------------------
+import datetime
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from result_store import RESULTS_DIR
+
+ALERT_RULES = "alert_rules.json"
+ALERTS_FILE = "alerts.jsonl"
+DIMENSIONS = ("species", "order", "family")
+ALL_REGIONS = ""
+BACKGROUND_LABELS = {"non insects"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    region TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (granularity, dimension, key, region, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollups_bucket ON rollups (granularity, bucket, dimension, region);
+"""
+
+DEFAULT_RULES = [
+    # Any single species seen 25+ times in one region within a week
+    {"dimension": "species", "key": "*", "region": "*", "window_days": 7, "threshold": 25},
+]
+
+
+def normalize_region(location):
+    # "Thottiyam, Tiruchirappalli" -> "tiruchirappalli" (last part is the district)
+    if not location:
+        return ALL_REGIONS
+    return re.sub(r"\s+", " ", str(location).split(",")[-1]).strip().lower()
+
+
+def day_bucket(ts):
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+def week_bucket(ts):
+    year, week, _ = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+BUCKETS = {"day": day_bucket, "week": week_bucket}
+
+
+def recent_buckets(granularity, count, now=None):
+    # Newest last; `count` consecutive days or ISO weeks ending at `now`
+    now = time.time() if now is None else now
+    step = 86400 if granularity == "day" else 7 * 86400
+    return [BUCKETS[granularity](now - i * step) for i in reversed(range(count))]
+
+
+def load_rules(path=ALERT_RULES):
+    if not os.path.exists(path):
+        return DEFAULT_RULES
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RollupEngine:
+    # Pass engine.apply to ResultStore(compaction_hooks=...)
+    def __init__(self, insect_data=None, rules=None, alerts_path=os.path.join(RESULTS_DIR, ALERTS_FILE),
+                 on_alert=None):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.alerts_path = alerts_path
+        self.on_alert = on_alert
+        self.version = None
+        self._taxonomy = {}
+        self._lock = threading.Lock()
+        self._created = False
+        self.set_taxonomy(insect_data or {})
+
+    def set_taxonomy(self, insect_data, version=None):
+        if version is not None and version == self.version:
+            return
+        self.version = version
+        taxonomy = {
+            name: {
+                "order": str(details.get("Order", "")).strip(),
+                "family": str(details.get("Family", "")).strip(),
+            }
+            for name, details in insect_data.items()
+        }
+        with self._lock:
+            self._taxonomy = taxonomy
+
+    # --------------------------------------------------
+    # Updates
+    # --------------------------------------------------
+    def _keys(self, row, labels):
+        idx = row["species"]
+        if idx >= len(labels) or labels[idx] in BACKGROUND_LABELS:
+            return []
+        name = labels[idx]
+        with self._lock:
+            taxonomy = self._taxonomy.get(name, {})
+        keys = [("species", name)]
+        for dimension in ("order", "family"):
+            if taxonomy.get(dimension):
+                keys.append((dimension, taxonomy[dimension]))
+        return keys
+
+    def apply(self, db, rows, labels):
+        # Normally created at startup; kept for stores set up elsewhere
+        if not self._created:
+            create_tables(db)
+            self._created = True
+        deltas = {}
+        for row in rows:
+            keys = self._keys(row, labels)
+            if not keys:
+                continue
+            regions = {ALL_REGIONS, normalize_region(row.get("location"))}
+            for granularity, bucket_of in BUCKETS.items():
+                bucket = bucket_of(row["ts"])
+                for dimension, key in keys:
+                    for region in regions:
+                        k = (granularity, bucket, dimension, key, region)
+                        deltas[k] = deltas.get(k, 0) + 1
+        if not deltas:
+            return
+        db.executemany(
+            "INSERT INTO rollups (granularity, bucket, dimension, key, region, n) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (granularity, dimension, key, region, bucket) DO UPDATE SET n = n + excluded.n",
+            [k + (n,) for k, n in deltas.items()],
+        )
+        self._check_alerts(db, deltas)
+
+    def _check_alerts(self, db, deltas):
+        alerts = []
+        for rule in self.rules:
+            window = recent_buckets("day", rule["window_days"])
+            touched = {}
+            for (granularity, bucket, dimension, key, region), n in deltas.items():
+                if granularity != "day" or dimension != rule["dimension"] or bucket not in window:
+                    continue
+                if rule["key"] != "*" and key != rule["key"]:
+                    continue
+                if rule["region"] == "*" and region == ALL_REGIONS:
+                    continue
+                if rule["region"] not in ("*", region):
+                    continue
+                touched[(key, region)] = touched.get((key, region), 0) + n
+            for (key, region), added in touched.items():
+                total = window_count(db, rule["dimension"], key, region, window)
+                # Fire once, on the batch that crosses the threshold
+                if total - added < rule["threshold"] <= total:
+                    alerts.append({
+                        "time": time.time(), "dimension": rule["dimension"], "key": key,
+                        "region": region or "all", "window_days": rule["window_days"],
+                        "count": total, "threshold": rule["threshold"],
+                    })
+        if alerts and self.alerts_path:
+            with open(self.alerts_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(alert, ensure_ascii=False) + "\n" for alert in alerts))
+        if self.on_alert:
+            for alert in alerts:
+                self.on_alert(alert)
+
+
+# --------------------------------------------------
+# Queries
+# --------------------------------------------------
+def create_tables(db):
+    # execute(), not executescript(): the latter would commit the open
+    # compaction transaction first
+    for statement in SCHEMA.split(";"):
+        if statement.strip():
+            db.execute(statement)
+
+
+def window_count(db, dimension, key, region, buckets, granularity="day"):
+    return db.execute(
+        f"SELECT COALESCE(SUM(n), 0) FROM rollups WHERE granularity = ? AND dimension = ? "
+        f"AND key = ? AND region = ? AND bucket IN ({', '.join('?' * len(buckets))})",
+        [granularity, dimension, key, region] + list(buckets),
+    ).fetchone()[0]
+
+
+def series(db, dimension, key, region=ALL_REGIONS, granularity="week", count=12, now=None):
+    # [(bucket, count)] for the last `count` buckets, zeros included
+    buckets = recent_buckets(granularity, count, now)
+    rows = dict(db.execute(
+        f"SELECT bucket, n FROM rollups WHERE granularity = ? AND dimension = ? AND key = ? "
+        f"AND region = ? AND bucket IN ({', '.join('?' * len(buckets))})",
+        [granularity, dimension, key, region] + buckets,
+    ).fetchall())
+    return [(bucket, rows.get(bucket, 0)) for bucket in buckets]
+
+
+def top(db, dimension, region=ALL_REGIONS, granularity="week", count=1, limit=10, now=None):
+    # Most reported keys over the last `count` buckets
+    buckets = recent_buckets(granularity, count, now)
+    return db.execute(
+        f"SELECT key, SUM(n) AS total FROM rollups WHERE granularity = ? AND dimension = ? "
+        f"AND region = ? AND bucket IN ({', '.join('?' * len(buckets))}) "
+        f"GROUP BY key ORDER BY total DESC LIMIT ?",
+        [granularity, dimension, region] + buckets + [limit],
+    ).fetchall()
+
+
+def regions(db, granularity="week", count=4, now=None):
+    buckets = recent_buckets(granularity, count, now)
+    return [row[0] for row in db.execute(
+        f"SELECT DISTINCT region FROM rollups INDEXED BY rollups_bucket WHERE granularity = ? "
+        f"AND bucket IN ({', '.join('?' * len(buckets))}) AND dimension = 'species' AND region != ''",
+        [granularity] + buckets,
+    ).fetchall()]
+
+
+def read_alerts(path, limit=20):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = deque(f, maxlen=limit)
+    return [json.loads(line) for line in reversed(lines)]
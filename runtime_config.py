@@ -0,0 +1,70 @@
+# --------------------------------------------------
+# Insectifica – inference runtime settings
+#
+# runtime_config.json (written by autotune.py) holds the thread pools,
+# batch size and worker count chosen for this machine:
+#   {"intra_op_threads": 4, "inter_op_threads": 1, "batch_size": 16,
+#    "workers": 2, "pin_cpus": true, "precision": "bfloat16"}
+# apply_runtime_config() runs once per process before TensorFlow starts.
+# With several worker processes, start each with INSECTIFICA_WORKER=<n>
+# (0-based) so it pins itself to its own slice of the CPUs.
+# --------------------------------------------------
+import json
+import os
+
+RUNTIME_CONFIG = "runtime_config.json"
+WORKER_ENV = "INSECTIFICA_WORKER"
+DEFAULTS = {
+    "intra_op_threads": 0,   # 0 = TensorFlow's default (all cores)
+    "inter_op_threads": 0,
+    "batch_size": 32,
+    "workers": 1,
+    "pin_cpus": False,
+    "precision": "float32",  # or "bfloat16" / "float16", see precision.py
+}
+
+_applied = None
+
+
+def load_runtime_config(path=RUNTIME_CONFIG):
+    config = dict(DEFAULTS)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config.update({k: v for k, v in json.load(f).items() if k in DEFAULTS})
+    return config
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_slice(worker, workers, cpus=None):
+    # Contiguous, non-overlapping share of the CPUs for one worker
+    cpus = cpus or available_cpus()
+    share = max(1, len(cpus) // max(1, workers))
+    start = (worker % workers) * share
+    return cpus[start:start + share] or cpus
+
+
+def apply_runtime_config(config=None, worker=None):
+    global _applied
+    if _applied is not None:
+        return _applied
+    config = config or load_runtime_config()
+    if worker is None and os.environ.get(WORKER_ENV, "").isdigit():
+        worker = int(os.environ[WORKER_ENV])
+
+    if config["pin_cpus"] and worker is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_slice(worker, config["workers"]))
+
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(config["intra_op_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(config["inter_op_threads"])
+    except RuntimeError:
+        # TensorFlow already initialised in this process; keep its pools
+        pass
+    _applied = config
+    return config
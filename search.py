@@ -0,0 +1,232 @@
+# --------------------------------------------------
+# Insectifica – full-text & faceted search over pest.json
+#
+# An inverted index (token → species → weight) with prefix matching on a
+# sorted vocabulary, plus facet indexes by Order, Family and host crop.
+# Words in a query that name an Order, Family or crop become facet
+# filters, so "all Lepidoptera on tomato" needs no extra syntax.
+# The index is updated per species when a record's content hash changes.
+# --------------------------------------------------
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from crops import normalize_crop, split_host_crops
+from insect_core import content_hash
+
+FIELD_WEIGHTS = {
+    "Common Name": 3.0,
+    "Scientific Name": 3.0,
+    "Order": 2.0,
+    "Family": 2.0,
+    "Genus": 2.0,
+    "Host Crops": 2.0,
+    "Damage Symptoms": 1.0,
+    "IPM Measures": 1.0,
+    "Chemical Control": 1.0,
+}
+FACETS = ("order", "family", "crop")
+PREFIX_WEIGHT = 0.5
+MIN_PREFIX = 3
+
+STOPWORDS = {
+    "a", "all", "an", "and", "are", "as", "at", "by", "for", "from", "in", "insect",
+    "insects", "is", "of", "on", "or", "pest", "pests", "the", "to", "which", "with",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def stem(token):
+    # Light plural folding, applied to both documents and queries
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [stem(t) for t in _TOKEN.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def species_facets(details):
+    return {
+        "order": {str(details.get("Order", "")).strip().lower()} - {""},
+        "family": {str(details.get("Family", "")).strip().lower()} - {""},
+        "crop": split_host_crops(details.get("Host Crops", "")),
+    }
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.facets = {facet: defaultdict(set) for facet in FACETS}
+        self.labels = {facet: {} for facet in FACETS}
+        self._doc_tokens = {}
+        self._doc_facets = {}
+        self._hashes = {}
+        self._vocab = None
+        self._lock = threading.RLock()
+        self.version = None
+
+    def __len__(self):
+        return len(self._hashes)
+
+    # --------------------------------------------------
+    # Building
+    # --------------------------------------------------
+    def update(self, insect_data, version=None):
+        # Re-index only added, changed or removed species; returns the count
+        if version is not None and version == self.version:
+            return 0
+        with self._lock:
+            return self._update(insect_data, version)
+
+    def _update(self, insect_data, version):
+        self.version = version
+        changed = 0
+        for name in [n for n in self._hashes if n not in insect_data]:
+            self._remove(name)
+            changed += 1
+        for name, details in insect_data.items():
+            digest = content_hash(details)
+            if self._hashes.get(name) == digest:
+                continue
+            if name in self._hashes:
+                self._remove(name)
+            self._add(name, details, digest)
+            changed += 1
+        if changed:
+            self._vocab = None
+        return changed
+
+    def _add(self, name, details, digest):
+        weights = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(details.get(field, "")):
+                weights[token] += weight
+        for token, weight in weights.items():
+            self.postings[token][name] = weight
+        self._doc_tokens[name] = set(weights)
+
+        facets = species_facets(details)
+        for facet, values in facets.items():
+            for value in values:
+                self.facets[facet][value].add(name)
+        self._doc_facets[name] = facets
+
+        # Keep a display label for every facet value
+        for value in facets["order"]:
+            self.labels["order"].setdefault(value, str(details["Order"]).strip())
+        for value in facets["family"]:
+            self.labels["family"].setdefault(value, str(details["Family"]).strip())
+        for value in facets["crop"]:
+            self.labels["crop"].setdefault(value, value.title())
+        self._hashes[name] = digest
+
+    def _remove(self, name):
+        for token in self._doc_tokens.pop(name, ()):
+            self.postings[token].pop(name, None)
+            if not self.postings[token]:
+                del self.postings[token]
+        for facet, values in self._doc_facets.pop(name, {}).items():
+            for value in values:
+                self.facets[facet][value].discard(name)
+                if not self.facets[facet][value]:
+                    del self.facets[facet][value]
+                    self.labels[facet].pop(value, None)
+        self._hashes.pop(name, None)
+
+    # --------------------------------------------------
+    # Querying
+    # --------------------------------------------------
+    def expand(self, term):
+        # Exact token first, then every vocabulary token starting with it
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        matches = [(term, 1.0)] if term in self.postings else []
+        if len(term) >= MIN_PREFIX:
+            i = bisect_left(self._vocab, term)
+            while i < len(self._vocab) and self._vocab[i].startswith(term):
+                if self._vocab[i] != term:
+                    matches.append((self._vocab[i], PREFIX_WEIGHT))
+                i += 1
+        return matches
+
+    def parse(self, query):
+        # Split a query into text terms and facet filters named in it
+        words = _TOKEN.findall(str(query).lower())
+        filters = defaultdict(set)
+        terms = []
+        i = 0
+        while i < len(words):
+            # Two-word facet values first ("stored grains", "oil palm")
+            pair = normalize_crop(" ".join(words[i:i + 2]))
+            if i + 1 < len(words) and pair in self.facets["crop"]:
+                filters["crop"].add(pair)
+                i += 2
+                continue
+            word = words[i]
+            for facet in FACETS:
+                value = normalize_crop(word) if facet == "crop" else word
+                if value in self.facets[facet]:
+                    filters[facet].add(value)
+                    break
+            else:
+                if word not in STOPWORDS:
+                    terms.append(stem(word))
+            i += 1
+        return terms, filters
+
+    def candidates(self, filters):
+        result = None
+        for facet, values in filters.items():
+            matched = set().union(*(self.facets[facet].get(v, set()) for v in values))
+            result = matched if result is None else result & matched
+        return result
+
+    def search(self, query="", order=None, family=None, crop=None, limit=20):
+        with self._lock:
+            return self._search(query, order, family, crop, limit)
+
+    def _search(self, query, order, family, crop, limit):
+        terms, filters = self.parse(query)
+        for facet, value in (("order", order), ("family", family), ("crop", crop)):
+            if value:
+                value = normalize_crop(value) if facet == "crop" else str(value).strip().lower()
+                filters[facet].add(value)
+        allowed = self.candidates(filters)
+
+        if not terms:
+            names = sorted(allowed if allowed is not None else self._hashes)
+            return [(name, 0.0) for name in names[:limit]]
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for term in terms:
+            hits = {}
+            for token, weight in self.expand(term):
+                for name, field_weight in self.postings[token].items():
+                    hits[name] = max(hits.get(name, 0.0), weight * field_weight)
+            for name, score in hits.items():
+                if allowed is None or name in allowed:
+                    scores[name] += score
+                    matched[name] += 1
+        # Species matching more of the query terms rank first
+        ranked = sorted(scores, key=lambda n: (-matched[n], -scores[n], n))
+        return [(name, scores[name]) for name in ranked[:limit]]
+
+    def facet_values(self, facet):
+        return sorted(
+            ((self.labels[facet].get(value, value), len(names))
+             for value, names in self.facets[facet].items()),
+            key=lambda item: item[0].lower(),
+        )
+
+
+def build_index(insect_data):
+    index = SearchIndex()
+    index.update(insect_data)
+    return index
@@ -0,0 +1,115 @@
+# --------------------------------------------------
+# Insectifica – per-session image lifecycle
+#
+# Sessions keep only small JPEG thumbnails and prediction results, never
+# decoded images or arrays. SessionHistory holds the recent results of
+# one session and evicts the oldest entries once their bytes exceed the
+# per-session budget. footprint() estimates what a session holds and
+# rss_bytes() reads the process RSS, so the saving can be measured
+# (see measure_payload.py --sessions).
+# --------------------------------------------------
+import io
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+THUMBNAIL_SIZE = 320
+PREVIEW_SIZE = 720
+SESSION_BUDGET = 512 * 1024   # bytes of thumbnails + results per session
+MAX_ENTRIES = 20
+HISTORY_KEY = "recent_results"
+
+
+def thumbnail_bytes(image, size=THUMBNAIL_SIZE, quality=80):
+    thumb = image.convert("RGB")
+    thumb.thumbnail((size, size))
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def preview(image, max_side=PREVIEW_SIZE):
+    # Downscaled copy for st.image, which otherwise keeps a full-resolution
+    # re-encode in the session's media store
+    if max(image.size) <= max_side:
+        return image
+    copy = image.copy()
+    copy.thumbnail((max_side, max_side))
+    return copy
+
+
+class SessionHistory:
+    def __init__(self, budget=SESSION_BUDGET, max_entries=MAX_ENTRIES):
+        self.budget = budget
+        self.max_entries = max_entries
+        self.nbytes = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, thumbnail, **result):
+        # result: small plain values only (labels, scores, counts)
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)["nbytes"]
+        entry = dict(result, thumbnail=thumbnail, time=time.time())
+        entry["nbytes"] = len(thumbnail) + sizeof(result)
+        self._entries[key] = entry
+        self.nbytes += entry["nbytes"]
+        # Oldest first, but always keep the newest entry
+        while len(self._entries) > 1 and (self.nbytes > self.budget or len(self._entries) > self.max_entries):
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old["nbytes"]
+            self.evicted += 1
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def recent(self, limit=MAX_ENTRIES):
+        return list(reversed(self._entries.values()))[:limit]
+
+
+def session_history(state):
+    if HISTORY_KEY not in state:
+        state[HISTORY_KEY] = SessionHistory()
+    return state[HISTORY_KEY]
+
+
+# --------------------------------------------------
+# Measurement
+# --------------------------------------------------
+def sizeof(value):
+    if isinstance(value, SessionHistory):
+        return value.nbytes
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def footprint(state):
+    # Estimated bytes held by one session's state
+    return sum(sizeof(state[key]) for key in list(state.keys()))
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak rather than current RSS, but better than nothing off Linux
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
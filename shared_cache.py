@@ -0,0 +1,187 @@
+# --------------------------------------------------
+# Insectifica – cache shared between app replicas
+#
+# A small in-process front cache (LRU + short TTL) sits in front of a
+# shared tier that every replica on the host can read:
+#   SQLite   default; placed in /dev/shm when available, so it lives in
+#            shared memory, otherwise in cache/. Expired and least
+#            recently used entries are evicted above a size bound.
+#   Redis    for replicas on several hosts: INSECTIFICA_CACHE=redis://host:6379/0
+#            (needs the redis package; size is bounded by the server's
+#            maxmemory policy).
+# INSECTIFICA_CACHE=off disables the shared tier. Values are JSON, never
+# pickles, and a failing shared tier only ever counts as a cache miss.
+# --------------------------------------------------
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_ENV = "INSECTIFICA_CACHE"
+CACHE_PATH = ("/dev/shm/insectifica_cache.db" if os.path.isdir("/dev/shm")
+              else os.path.join("cache", "shared_cache.db"))
+MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+FRONT_ENTRIES = 256
+FRONT_TTL = 60.0
+EVICT_EVERY = 200        # sets between size checks
+TOUCH_INTERVAL = 60.0    # refresh LRU time at most once a minute per key
+
+
+class SQLiteCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._sets = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._db() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)")
+
+    def _db(self):
+        # One connection per thread; Streamlit serves sessions on many threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")  # a cache may lose writes on a crash
+        return db
+
+    def get(self, key):
+        now = time.time()
+        db = self._db()
+        row = db.execute("SELECT value, expires, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            return None
+        if now - row[2] > TOUCH_INTERVAL:
+            with db:
+                db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        now = time.time()
+        with self._db() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + ttl, now),
+            )
+        self._sets += 1
+        if self._sets % EVICT_EVERY == 0:
+            self.evict()
+
+    def delete(self, key):
+        with self._db() as db:
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def evict(self):
+        with self._db() as db:
+            db.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            target = self.max_bytes * 0.9
+            while total > target:
+                rows = db.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT 100").fetchall()
+                if not rows:
+                    break
+                db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+                total -= sum(size for _, size in rows)
+
+
+class RedisCache:
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        self._client.set(key, value, ex=int(ttl))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+# --------------------------------------------------
+# Front Cache
+# --------------------------------------------------
+class TieredCache:
+    def __init__(self, shared=None, front_entries=FRONT_ENTRIES, front_ttl=FRONT_TTL, namespace="insectifica"):
+        self.shared = shared
+        self.front_entries = front_entries
+        self.front_ttl = front_ttl
+        self.namespace = namespace
+        self.stats = {"front_hits": 0, "shared_hits": 0, "misses": 0, "errors": 0}
+        self._front = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _front_get(self, key):
+        with self._lock:
+            item = self._front.get(key)
+            if item is None or item[0] < time.monotonic():
+                return None
+            self._front.move_to_end(key)
+            return item[1]
+
+    def _front_set(self, key, value, ttl):
+        with self._lock:
+            self._front[key] = (time.monotonic() + min(ttl, self.front_ttl), value)
+            self._front.move_to_end(key)
+            while len(self._front) > self.front_entries:
+                self._front.popitem(last=False)
+
+    def get_json(self, key):
+        value = self._front_get(key)
+        if value is not None:
+            self.stats["front_hits"] += 1
+            return value
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(f"{self.namespace}:{key}")
+            except Exception:
+                self.stats["errors"] += 1
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._front_set(key, value, self.front_ttl)
+                self.stats["shared_hits"] += 1
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def set_json(self, key, value, ttl=DEFAULT_TTL):
+        self._front_set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(f"{self.namespace}:{key}", json.dumps(value, ensure_ascii=False).encode("utf-8"), ttl)
+            except Exception:
+                self.stats["errors"] += 1
+
+    def get_or_set(self, key, compute, ttl=DEFAULT_TTL):
+        value = self.get_json(key)
+        if value is None:
+            value = compute()
+            self.set_json(key, value, ttl)
+        return value
+
+
+def open_cache(url=None):
+    url = url or os.environ.get(CACHE_ENV, "")
+    if url == "off":
+        return TieredCache(None)
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return TieredCache(RedisCache(url))
+    if url.startswith("sqlite:///"):
+        return TieredCache(SQLiteCache(url[len("sqlite:///"):]))
+    try:
+        return TieredCache(SQLiteCache())
+    except sqlite3.Error:
+        # e.g. a read-only /dev/shm: keep working with the front cache only
+        return TieredCache(None)
@@ -0,0 +1,56 @@
+# --------------------------------------------------
+# Insectifica – pre-rendered species detail blocks
+#
+# The taxonomy, host crop, damage, IPM and chemical control sections are
+# rendered to a single HTML fragment per species, keyed by the species
+# name and a hash of its record, so a result view is one cached emit.
+# Styling lives in the app theme (.species-* classes).
+# --------------------------------------------------
+from html import escape
+
+from insect_core import content_hash
+
+TAXONOMY_FIELDS = ("Kingdom", "Phylum", "Class", "Order", "Family", "Genus", "Species")
+
+SECTIONS = (
+    ("🌿 Host Crops", "Host Crops", "info"),
+    ("🐛 Damage Symptoms", "Damage Symptoms", "warning"),
+    ("🛡️ Integrated Pest Management (IPM)", "IPM Measures", "success"),
+    ("⚠️ Chemical Control (If Needed)", "Chemical Control", "error"),
+)
+
+_fragments = {}
+
+
+def render_species(details):
+    # No blank lines or indentation: st.markdown would treat them as markdown
+    parts = ['<div class="species-details">', "<h2>🧬 Taxonomic Classification</h2>",
+             '<div class="species-taxonomy">']
+    for field in TAXONOMY_FIELDS:
+        parts.append(f"<div><b>{field}:</b> {escape(str(details.get(field, 'N/A')))}</div>")
+    parts.append("</div>")
+    for title, field, kind in SECTIONS:
+        parts.append(f"<h2>{title}</h2>")
+        parts.append(f'<div class="species-box {kind}">{escape(str(details.get(field, "Not available")))}</div>')
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def species_fragment(name, details, digest=None):
+    key = (name, digest or content_hash(details))
+    fragment = _fragments.get(key)
+    if fragment is None:
+        fragment = _fragments[key] = render_species(details)
+    return fragment
+
+
+def render_all(insect_data):
+    # Pre-render every species once; unchanged records hit the cache
+    keys = {name: content_hash(details) for name, details in insect_data.items()}
+    fragments = {name: species_fragment(name, details, keys[name])
+                 for name, details in insect_data.items()}
+    live = set(keys.items())
+    for key in list(_fragments):
+        if key not in live:
+            del _fragments[key]
+    return fragments
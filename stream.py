@@ -0,0 +1,276 @@
+# --------------------------------------------------
+# Insectifica – video / camera stream monitoring
+#
+# Frames are decoded on a background thread into a small bounded queue.
+# A motion gate keeps only frames that differ from the last sampled one
+# (plus a periodic keep-alive). Sampled frames are classified in batches,
+# predictions are averaged over a sliding window, and stable detections
+# are written as sighting events to a JSON-lines log.
+#
+# Needs OpenCV for decoding:  pip install opencv-python-headless
+# Usage:
+#   python stream.py --source trap_cam.mp4 --log sightings.jsonl
+#   python stream.py --source 0            # first camera device
+# --------------------------------------------------
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from insect_core import MODEL_PATH, class_names
+
+MOTION_THRESHOLD = 6.0      # mean abs grey-level difference (0-255)
+MIN_INTERVAL = 0.2          # at most 5 sampled frames per second
+KEEPALIVE_INTERVAL = 2.0    # sample at least every 2 s even without motion
+MOTION_SIZE = 64
+SMOOTHING_WINDOW = 5
+SIGHTING_THRESHOLD = 0.6
+MIN_SIGHTING_FRAMES = 3
+BATCH_SIZE = 8
+QUEUE_SIZE = 32
+BACKGROUND_LABELS = {"non insects"}
+
+
+def _cv2():
+    try:
+        import cv2
+    except ImportError as exc:
+        raise ImportError("Stream mode needs OpenCV: pip install opencv-python-headless") from exc
+    return cv2
+
+
+def read_frames(source, max_side=640):
+    # Yields (seconds, RGB frame); file time comes from the frame rate so
+    # results do not depend on how fast the file is decoded
+    cv2 = _cv2()
+    live = str(source).isdigit()
+    capture = cv2.VideoCapture(int(source) if live else source)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video source {source}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    start = time.monotonic()
+    index = 0
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            height, width = frame.shape[:2]
+            scale = max_side / max(height, width)
+            if scale < 1.0:
+                frame = cv2.resize(frame, (round(width * scale), round(height * scale)),
+                                   interpolation=cv2.INTER_AREA)
+            seconds = time.monotonic() - start if live else index / fps
+            yield seconds, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+# --------------------------------------------------
+# Frame Sampling
+# --------------------------------------------------
+class MotionGate:
+    def __init__(self, threshold=MOTION_THRESHOLD, min_interval=MIN_INTERVAL,
+                 keepalive=KEEPALIVE_INTERVAL, size=MOTION_SIZE):
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.keepalive = keepalive
+        self.size = size
+        self._last = None
+        self._last_time = None
+
+    def _thumbnail(self, frame):
+        # Block-average to a tiny grey image; cheap and robust to sensor noise
+        grey = frame.mean(axis=2)
+        h, w = grey.shape
+        bh, bw = max(1, h // self.size), max(1, w // self.size)
+        grey = grey[:bh * (h // bh), :bw * (w // bw)]
+        return grey.reshape(h // bh, bh, w // bw, bw).mean(axis=(1, 3))
+
+    def should_sample(self, seconds, frame):
+        if self._last_time is not None and seconds - self._last_time < self.min_interval:
+            return False
+        thumb = self._thumbnail(frame)
+        moved = (
+            self._last is None
+            or thumb.shape != self._last.shape
+            or np.abs(thumb - self._last).mean() >= self.threshold
+            or seconds - self._last_time >= self.keepalive
+        )
+        if moved:
+            self._last, self._last_time = thumb, seconds
+        return moved
+
+
+# --------------------------------------------------
+# Smoothing & Events
+# --------------------------------------------------
+class TemporalSmoother:
+    def __init__(self, window=SMOOTHING_WINDOW):
+        self._window = deque(maxlen=window)
+
+    def update(self, probs):
+        self._window.append(np.asarray(probs, dtype=np.float32))
+        return np.mean(self._window, axis=0)
+
+
+class SightingLog:
+    def __init__(self, labels, path=None, threshold=SIGHTING_THRESHOLD, min_frames=MIN_SIGHTING_FRAMES,
+                 on_event=None):
+        self.labels = labels
+        self.on_event = on_event
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self._current = None
+        self.events = deque(maxlen=1000)
+
+    def update(self, seconds, smoothed):
+        idx = int(np.argmax(smoothed))
+        confidence = float(smoothed[idx])
+        species = self.labels[idx] if idx < len(self.labels) else None
+        visible = species is not None and species not in BACKGROUND_LABELS and confidence >= self.threshold
+
+        current = self._current
+        if current and (not visible or species != current["species"]):
+            self._close(seconds)
+            current = None
+        if visible:
+            if current is None:
+                current = self._current = {"species": species, "start": seconds, "frames": 0,
+                                           "peak_confidence": 0.0}
+            current["frames"] += 1
+            current["end"] = seconds
+            current["peak_confidence"] = max(current["peak_confidence"], confidence)
+
+    def _close(self, seconds):
+        event, self._current = self._current, None
+        # Brief flickers below min_frames are not reported
+        if event["frames"] >= self.min_frames:
+            event["end"] = seconds
+            self.events.append(event)
+            if self._file:
+                self._file.write(json.dumps(event) + "\n")
+                self._file.flush()
+            if self.on_event:
+                self.on_event(event)
+
+    def close(self, seconds):
+        if self._current:
+            self._close(seconds)
+        if self._file:
+            self._file.close()
+
+
+# --------------------------------------------------
+# Pipeline
+# --------------------------------------------------
+def _decode(source, frames, stats, stop, live):
+    end = None
+    try:
+        for item in read_frames(source):
+            if stop.is_set():
+                break
+            stats["decoded"] += 1
+            if live:
+                # Never let a slow model back up a camera: drop the frame
+                try:
+                    frames.put_nowait(item)
+                except queue.Full:
+                    stats["dropped"] += 1
+            else:
+                frames.put(item)
+    except Exception as exc:
+        # Passed on instead of the end marker, so a bad source or a broken
+        # file is not reported as a video without insects
+        end = exc
+    finally:
+        frames.put(end)
+
+
+def run_stream(source, predict_batch, labels, input_size, log_path=None, batch_size=BATCH_SIZE,
+               gate=None, smoother=None, on_event=None):
+    # predict_batch(float32 array (n, input_size, input_size, 3)) -> probs
+    from PIL import Image
+
+    gate = gate or MotionGate()
+    smoother = smoother or TemporalSmoother()
+    log = SightingLog(labels, log_path, on_event=on_event)
+    stats = {"decoded": 0, "dropped": 0, "sampled": 0, "batches": 0}
+    frames = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+    decoder = threading.Thread(target=_decode, daemon=True,
+                               args=(source, frames, stats, stop, str(source).isdigit()))
+
+    def flush(batch, times):
+        arrays = np.stack([
+            np.asarray(Image.fromarray(f).resize((input_size, input_size)), dtype=np.float32)
+            for f in batch
+        ]) / 127.5 - 1.0
+        probs = np.asarray(predict_batch(arrays))
+        stats["batches"] += 1
+        for seconds, row in zip(times, probs):
+            log.update(seconds, smoother.update(row))
+
+    start = time.perf_counter()
+    seconds = 0.0
+    batch, times = [], []
+    decoder.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            seconds, frame = item
+            if not gate.should_sample(seconds, frame):
+                continue
+            stats["sampled"] += 1
+            batch.append(frame)
+            times.append(seconds)
+            if len(batch) >= batch_size:
+                flush(batch, times)
+                batch, times = [], []
+        if batch:
+            flush(batch, times)
+    finally:
+        stop.set()
+        log.close(seconds)
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = elapsed
+    stats["decode_fps"] = stats["decoded"] / elapsed if elapsed else 0.0
+    return list(log.events), stats
+
+
+if __name__ == "__main__":
+    from model_registry import ModelVersion, load_version_model
+
+    parser = argparse.ArgumentParser(description="Classify insects in a video file or camera stream")
+    parser.add_argument("--source", required=True, help="Video file path or camera index")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--log", default="sightings.jsonl", help="JSON-lines event log")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--motion-threshold", type=float, default=MOTION_THRESHOLD)
+    args = parser.parse_args()
+
+    version = ModelVersion(args.model, args.model, load_version_model(args.model))
+    version.warm()
+
+    def print_event(event):
+        print(f"🐞 {event['start']:8.1f}s–{event['end']:8.1f}s  {event['species']} "
+              f"({event['peak_confidence']:.0%}, {event['frames']} frames)")
+
+    events, stats = run_stream(
+        args.source, lambda batch: version.run(batch)[0], class_names, version.input_size,
+        log_path=args.log, batch_size=args.batch_size,
+        gate=MotionGate(threshold=args.motion_threshold), on_event=print_event,
+    )
+    print(f"✅ {stats['decoded']} frames decoded ({stats['decode_fps']:.1f} fps), "
+          f"{stats['sampled']} sampled, {stats['dropped']} dropped, {len(events)} sightings")
@@ -0,0 +1,97 @@
+# --------------------------------------------------
+# Insectifica – taxonomy-aware prediction
+#
+# Roll-up: a fixed class -> Family / Order matrix turns the species
+# softmax into family and order probabilities with one matrix product.
+# When no species is confident but a family or order clearly is, the
+# app reports the coarser answer instead of a shaky species name.
+#
+# Thresholds can be checked on a labelled folder:
+#   python taxonomy.py --images val/
+# --------------------------------------------------
+import argparse
+
+import numpy as np
+
+LEVELS = ("Family", "Order")
+UNKNOWN = {"", "na", "n/a", "unknown", "none"}
+SPECIES_CONFIDENT = 0.6   # same bar as the resolution escalation
+COARSE_CONFIDENT = 0.8
+
+
+def taxon(details, level):
+    value = str((details or {}).get(level, "")).strip()
+    return None if value.lower() in UNKNOWN else value
+
+
+# --------------------------------------------------
+# Roll-up
+# --------------------------------------------------
+class TaxonomyIndex:
+    def __init__(self, insect_data, labels):
+        self.labels = list(labels)
+        self.groups = {}
+        columns = []
+        for level in LEVELS:
+            names = [taxon(insect_data.get(label), level) for label in self.labels]
+            groups = sorted({name for name in names if name})
+            matrix = np.zeros((len(self.labels), len(groups)), dtype=np.float32)
+            for i, name in enumerate(names):
+                if name:
+                    matrix[i, groups.index(name)] = 1.0
+            self.groups[level] = groups
+            columns.append(matrix)
+        # Family and order columns side by side: one product rolls up both
+        self.matrix = np.hstack(columns)
+        self._split = len(self.groups[LEVELS[0]])
+
+    def roll_up(self, probs):
+        # (batch, classes) -> {level: (batch, groups)}; classes without a
+        # known taxon (e.g. "non insects") add to no group
+        mass = np.asarray(probs, dtype=np.float32) @ self.matrix
+        return {LEVELS[0]: mass[:, :self._split], LEVELS[1]: mass[:, self._split:]}
+
+    def resolve(self, probs, species_confident=SPECIES_CONFIDENT, coarse_confident=COARSE_CONFIDENT):
+        # Finest confident answer for one probability row
+        probs = np.asarray(probs, dtype=np.float32).reshape(-1)
+        species = int(np.argmax(probs))
+        answer = {"level": "Species", "name": self.labels[species], "confidence": float(probs[species])}
+        if answer["confidence"] >= species_confident:
+            return answer
+        mass = self.roll_up(probs[None, :])
+        for level in LEVELS:
+            best = int(np.argmax(mass[level][0]))
+            confidence = float(mass[level][0, best])
+            if confidence >= coarse_confident:
+                return {"level": level, "name": self.groups[level][best], "confidence": confidence}
+        return answer
+
+
+if __name__ == "__main__":
+    from insect_core import MODEL_PATH, class_names, load_insect_data
+    from model_registry import ModelVersion, load_version_model
+    from model_report import benchmark, evaluation_set
+
+    parser = argparse.ArgumentParser(description="Check family / order roll-up on a labelled folder")
+    parser.add_argument("--images", required=True, help="Labelled folder (one sub-folder per class)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--species-confident", type=float, default=SPECIES_CONFIDENT)
+    parser.add_argument("--coarse-confident", type=float, default=COARSE_CONFIDENT)
+    args = parser.parse_args()
+
+    version = ModelVersion("default", args.model, load_version_model(args.model))
+    arrays, labels = evaluation_set(args.images, version.input_size)
+    known = labels >= 0
+    probs, _ = benchmark(version, arrays[known])
+    labels = labels[known]
+
+    insect_data = load_insect_data()
+    index = TaxonomyIndex(insect_data, class_names)
+    answers = [index.resolve(row, args.species_confident, args.coarse_confident) for row in probs]
+    species = [(answer, label) for answer, label in zip(answers, labels) if answer["level"] == "Species"]
+    coarse = [(answer, label) for answer, label in zip(answers, labels) if answer["level"] != "Species"]
+    correct_species = sum(answer["name"] == class_names[label] for answer, label in species)
+    correct_coarse = sum(answer["name"] == taxon(insect_data.get(class_names[label]), answer["level"])
+                         for answer, label in coarse)
+    print(f"🐞 {len(answers)} images: {len(species)} species answers ({correct_species} correct), "
+          f"{len(coarse)} family/order answers ({correct_coarse} correct)")
@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+import numpy as np
+
+from result_store import ResultStore
+
+
+def _record(store, n):
+    probs = np.full(4, 0.25, dtype=np.float32)
+    probs[1] = 0.7
+    for i in range(n):
+        store.record(f"hash{i}", 1, 0.7, probs, crop="Rice")
+
+
+def test_failing_hook_does_not_stop_ingestion(tmp_path):
+    calls = []
+
+    def bad_hook(db, rows, labels):
+        calls.append(len(rows))
+        db.execute("CREATE TABLE IF NOT EXISTS hook_rows (n INTEGER)")
+        db.execute("INSERT INTO hook_rows VALUES (?)", (len(rows),))
+        raise RuntimeError("hook broke")
+
+    store = ResultStore(str(tmp_path), labels=["a", "b", "c", "d"], compaction_hooks=[bad_hook])
+    try:
+        _record(store, 3)
+        assert store.flush()
+        _record(store, 2)
+        assert store.flush()
+        assert store._writer.is_alive()
+        assert calls == [3, 2]
+        assert len(store.query()) == 5
+        assert store.species_totals() == [(1, 5)]
+        # The hook's own writes were rolled back
+        with closing(store.connect()) as db:
+            assert not db.execute("SELECT name FROM sqlite_master WHERE name = 'hook_rows'").fetchall()
+    finally:
+        store.close()
+
+
+def test_failing_listener_does_not_stop_ingestion(tmp_path):
+    store = ResultStore(str(tmp_path), labels=["a", "b", "c", "d"])
+    store.add_listener(lambda rows: 1 / 0)
+    try:
+        _record(store, 2)
+        assert store.flush()
+        assert store._writer.is_alive()
+        assert len(store.query()) == 2
+    finally:
+        store.close()
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+def test_orphan_segment_is_imported_once(tmp_path):
+    first = ResultStore(str(tmp_path), labels=["a", "b"], compact_interval=3600)
+    second = ResultStore(str(tmp_path), labels=["a", "b"], compact_interval=3600)
+    # Past their startup compaction before the orphan appears
+    assert first.flush() and second.flush()
+    # Stand-in for another replica: a different pid that is alive
+    second._pid = os.getppid()
+    try:
+        row = {"ts": time.time(), "image_hash": "orphan", "species": 1, "confidence": 0.9}
+        (tmp_path / f"log-{_dead_pid()}-000000.jsonl").write_text(json.dumps(row) + "\n")
+        # The first replica claims the segment; the second then finds nothing
+        claimed = first._claim(str(next(tmp_path.glob("log-*.jsonl"))))
+        assert len(claimed) == 1
+        assert second.compact(orphans=True) == 0
+        assert first.compact() == 1
+        assert second.compact(orphans=True) == 0
+        assert first.species_totals() == [(1, 1)]
+        assert not list(tmp_path.glob("*.jsonl"))
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import stream
+from insect_core import class_names
+
+
+def _predict(batch):
+    return np.full((len(batch), len(class_names)), 1.0 / len(class_names), dtype=np.float32)
+
+
+def test_missing_source_raises(tmp_path):
+    # IOError from OpenCV, or ImportError where OpenCV is not installed;
+    # either way not an empty list of sightings
+    with pytest.raises((IOError, ImportError)):
+        stream.run_stream(str(tmp_path / "missing.mp4"), _predict, class_names, 32)
+
+
+def test_decoder_failure_reaches_caller(monkeypatch):
+    def broken(source):
+        yield 0.0, np.zeros((48, 48, 3), dtype=np.uint8)
+        raise IOError("stream ended mid-frame")
+
+    monkeypatch.setattr(stream, "read_frames", broken)
+    with pytest.raises(IOError, match="mid-frame"):
+        stream.run_stream("trap.mp4", _predict, class_names, 32)
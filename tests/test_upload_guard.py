@@ -0,0 +1,27 @@
+import io
+
+import pytest
+from PIL import Image
+
+from upload_guard import UploadRejected, decode_upload, open_upload
+
+
+def _jpeg(size=(640, 480)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (90, 140, 60)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_truncated_upload_is_rejected_at_decode():
+    # Same order as the app: the header check passes, the decode rejects
+    data = _jpeg()
+    data = data[:len(data) // 2]
+    upload = open_upload(data)
+    with pytest.raises(UploadRejected) as exc:
+        decode_upload(upload)
+    assert exc.value.reason == "corrupt"
+
+
+def test_complete_upload_decodes():
+    image = decode_upload(open_upload(_jpeg((2048, 1536))))
+    assert image.mode == "RGB" and max(image.size) <= 1024
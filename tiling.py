@@ -0,0 +1,152 @@
+# --------------------------------------------------
+# Insectifica – sticky-trap (multi-insect) detection
+#
+# A large trap photo is scaled once so that one tile maps to exactly the
+# model input size, then cut into overlapping tiles with array slicing (no
+# per-tile resizing). Near-uniform tiles (bare trap surface) are skipped,
+# the rest go through the classifier in a few large batches, and
+# overlapping detections of the same species are merged into one.
+# --------------------------------------------------
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from insect_core import IMG_SIZE
+
+TILE_SIZE = 512          # tile edge in original image pixels
+OVERLAP = 0.25
+MIN_CONFIDENCE = 0.5
+MIN_TILE_STD = 12.0      # pixel std below which a tile is treated as empty
+IOU_THRESHOLD = 0.3
+BATCH_SIZE = 32
+BACKGROUND_LABELS = {"non insects"}
+
+
+def tile_positions(length, size, stride):
+    # Tile starts covering [0, length), the last one flush with the edge
+    if length <= size:
+        return [0]
+    positions = list(range(0, length - size + 1, stride))
+    if positions[-1] != length - size:
+        positions.append(length - size)
+    return positions
+
+
+def box_iou(box, boxes):
+    x0 = np.maximum(box[0], boxes[:, 0])
+    y0 = np.maximum(box[1], boxes[:, 1])
+    x1 = np.minimum(box[2], boxes[:, 2])
+    y1 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-12)
+
+
+def merge_detections(boxes, scores, iou_threshold=IOU_THRESHOLD):
+    # Greedy NMS; each kept detection grows to the union of what it absorbed
+    order = np.argsort(-scores)
+    boxes, scores = boxes[order], scores[order]
+    alive = np.ones(len(boxes), dtype=bool)
+    merged = []
+    for i in range(len(boxes)):
+        if not alive[i]:
+            continue
+        group = alive & (box_iou(boxes[i], boxes) >= iou_threshold)
+        group[i] = True
+        alive &= ~group
+        members = boxes[group]
+        merged.append((
+            (members[:, 0].min(), members[:, 1].min(), members[:, 2].max(), members[:, 3].max()),
+            float(scores[i]),
+        ))
+    return merged
+
+
+def scaled_image(image, scale):
+    # JPEG draft mode decodes at a reduced size directly, far cheaper than
+    # decoding 20 MP and shrinking afterwards
+    width, height = image.size
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # MPO (phone cameras) is JPEG with extra frames and supports draft too
+    if getattr(image, "format", None) in ("JPEG", "MPO"):
+        image.draft("RGB", target)
+    return image.convert("RGB").resize(target, Image.BILINEAR), (width, height)
+
+
+def detect_insects(image, predict_batch, labels, input_size=IMG_SIZE, tile_size=TILE_SIZE,
+                   overlap=OVERLAP, min_confidence=MIN_CONFIDENCE, min_tile_std=MIN_TILE_STD,
+                   iou_threshold=IOU_THRESHOLD, batch_size=BATCH_SIZE):
+    # predict_batch(float32 array of shape (n, input_size, input_size, 3)) -> probs
+    start = time.perf_counter()
+    small, (width, height) = scaled_image(image, input_size / tile_size)
+    decode_ms = (time.perf_counter() - start) * 1000.0
+    pixels = np.asarray(small, dtype=np.uint8)
+    if pixels.shape[0] < input_size or pixels.shape[1] < input_size:
+        pad_y = max(0, input_size - pixels.shape[0])
+        pad_x = max(0, input_size - pixels.shape[1])
+        pixels = np.pad(pixels, ((0, pad_y), (0, pad_x), (0, 0)), mode="edge")
+    fx, fy = width / small.size[0], height / small.size[1]
+
+    stride = max(1, round(input_size * (1.0 - overlap)))
+    positions = [(y, x) for y in tile_positions(pixels.shape[0], input_size, stride)
+                 for x in tile_positions(pixels.shape[1], input_size, stride)]
+    tiles = np.stack([pixels[y:y + input_size, x:x + input_size] for y, x in positions])
+
+    # Cheap region proposal: skip tiles with almost no texture in any channel
+    keep = tiles.reshape(len(tiles), -1, 3).std(axis=1).max(axis=1) >= min_tile_std
+    tiles = tiles[keep]
+    positions = [p for p, k in zip(positions, keep) if k]
+
+    probs = []
+    for i in range(0, len(tiles), batch_size):
+        batch = tiles[i:i + batch_size].astype(np.float32) / 127.5 - 1.0
+        probs.append(np.asarray(predict_batch(batch)))
+    probs = np.concatenate(probs) if probs else np.zeros((0, len(labels)), dtype=np.float32)
+
+    classes = probs.argmax(axis=1) if len(probs) else np.zeros(0, dtype=int)
+    scores = probs.max(axis=1) if len(probs) else np.zeros(0, dtype=np.float32)
+    boxes = np.array([(x * fx, y * fy, (x + input_size) * fx, (y + input_size) * fy)
+                      for y, x in positions], dtype=np.float32).reshape(-1, 4)
+
+    detections = []
+    for cls in np.unique(classes):
+        if cls >= len(labels) or labels[cls] in BACKGROUND_LABELS:
+            continue
+        hit = (classes == cls) & (scores >= min_confidence)
+        for box, score in merge_detections(boxes[hit], scores[hit], iou_threshold):
+            detections.append({
+                "species": labels[cls],
+                "confidence": score,
+                "box": tuple(int(round(min(v, limit))) for v, limit in
+                             zip(box, (width, height, width, height))),
+            })
+    detections.sort(key=lambda d: -d["confidence"])
+
+    counts = {}
+    for detection in detections:
+        counts[detection["species"]] = counts.get(detection["species"], 0) + 1
+    return {
+        "detections": detections,
+        "counts": dict(sorted(counts.items(), key=lambda item: -item[1])),
+        "tiles": len(keep),
+        "tiles_classified": len(tiles),
+        "size": (width, height),
+        "decode_ms": decode_ms,
+        "elapsed_ms": (time.perf_counter() - start) * 1000.0,
+    }
+
+
+def draw_detections(image, result, max_size=1024):
+    # Downscaled preview with boxes, for display. Boxes are in original
+    # pixels, which may differ from image.size after JPEG draft decoding.
+    preview = image.convert("RGB")
+    preview.thumbnail((max_size, max_size))
+    scale = preview.size[0] / result["size"][0]
+    draw = ImageDraw.Draw(preview)
+    for detection in result["detections"]:
+        x0, y0, x1, y1 = (v * scale for v in detection["box"])
+        draw.rectangle((x0, y0, x1, y1), outline=(229, 57, 53), width=3)
+        draw.text((x0 + 4, y0 + 2), detection["species"], fill=(229, 57, 53))
+    return preview
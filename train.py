@@ -0,0 +1,330 @@
+# --------------------------------------------------
+# Insectifica – retraining pipeline (tf.data + TFRecord shards)
+#
+# Replaces the generator-based "model trai.py" for retraining on newly
+# collected field photos:
+#   1. Every image is decoded once, in parallel, exactly as the app does
+#      it (upload_guard.decode_upload, then the resize in
+#      insect_core.preprocess_image) and cached as uint8 pixels in TFRecord
+#      shards. Shards are reused until the image set changes.
+#   2. Training streams the shards with interleaved reads, shuffling,
+#      on-the-fly augmentation and prefetch, optionally in mixed precision.
+#   3. Labels follow class_names (sub-folders named after the class, not
+#      alphabetical order), so the outputs stay drop-in for the app.
+#
+# Both model files are regenerated (last and best epoch), together with
+# label_manifest.json and per-epoch timings in training_metrics.json.
+#
+# Usage:
+#   python train.py --train "e:/Isect pest/train" --val "e:/Isect pest/val"
+#   python train.py --train field/ --val val/ --init mobilenetv2_insect.keras --precision mixed_bfloat16
+# --------------------------------------------------
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from insect_core import IMG_SIZE, MODEL_PATH, class_names
+
+BEST_PATH = "mobilenetv2_insect_best.keras"
+MANIFEST_PATH = "label_manifest.json"
+METRICS_PATH = "training_metrics.json"
+SHARD_DIR = "shards"
+SHARD_SIZE = 1000
+BATCH_SIZE = 32
+SHUFFLE_BUFFER = 2048
+EPOCHS_HEAD = 25
+EPOCHS_FINE = 10
+LEARNING_RATE_HEAD = 1e-4
+LEARNING_RATE_FINE = 5e-5
+FINE_TUNE_LAYERS = 30
+PRECISIONS = ("float32", "mixed_float16", "mixed_bfloat16")
+
+
+# --------------------------------------------------
+# Shards
+# --------------------------------------------------
+def shard_pixels(path, size=IMG_SIZE):
+    # Same decode and resize as an upload in the app; None if unreadable
+    from PIL import Image
+
+    from upload_guard import UploadRejected, decode_upload
+    try:
+        with Image.open(path) as image:
+            pixels = np.asarray(decode_upload(image).resize((size, size)), dtype=np.uint8)
+    except (OSError, UploadRejected):
+        return None
+    return pixels.tobytes()
+
+
+def _shard_item(args):
+    path, label, size = args
+    return shard_pixels(path, size), label
+
+
+def shard_key(items, size):
+    # Changes whenever a file is added, removed or replaced
+    digest = hashlib.sha1(str(size).encode())
+    for path, label in items:
+        stat = os.stat(path)
+        digest.update(f"{path}|{label}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def write_shards(items, name, size=IMG_SIZE, shard_dir=SHARD_DIR, shard_size=SHARD_SIZE, workers=None):
+    # Returns (shard files, per-class counts); cached under shards/<name>-<key>/
+    import tensorflow as tf
+
+    folder = os.path.join(shard_dir, f"{name}-{shard_key(items, size)}")
+    index_path = os.path.join(folder, "index.json")
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        return [os.path.join(folder, file) for file in index["files"]], index["counts"]
+
+    os.makedirs(folder, exist_ok=True)
+    files, counts, skipped = [], {}, 0
+    writer = None
+    written = 0
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = ((path, label, size) for path, label in items)
+        for pixels, label in pool.map(_shard_item, jobs, chunksize=16):
+            if pixels is None:
+                skipped += 1
+                continue
+            if written % shard_size == 0:
+                if writer is not None:
+                    writer.close()
+                files.append(f"{name}-{len(files):05d}.tfrecord")
+                writer = tf.io.TFRecordWriter(os.path.join(folder, files[-1]))
+            example = tf.train.Example(features=tf.train.Features(feature={
+                "pixels": tf.train.Feature(bytes_list=tf.train.BytesList(value=[pixels])),
+                "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[label])),
+            }))
+            writer.write(example.SerializeToString())
+            counts[class_names[label]] = counts.get(class_names[label], 0) + 1
+            written += 1
+    if writer is not None:
+        writer.close()
+    if skipped:
+        print(f"⚠️ Skipped {skipped} unreadable images in {name}")
+    # Written last: a missing index means an interrupted run, so the shards are rebuilt
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump({"files": files, "counts": counts, "size": size}, f, indent=4)
+    return [os.path.join(folder, file) for file in files], counts
+
+
+# --------------------------------------------------
+# Input Pipeline
+# --------------------------------------------------
+def shard_dataset(files, size, batch_size, training):
+    import tensorflow as tf
+
+    spec = {"pixels": tf.io.FixedLenFeature([], tf.string), "label": tf.io.FixedLenFeature([], tf.int64)}
+    files = tf.data.Dataset.from_tensor_slices(files)
+    if training:
+        files = files.shuffle(len(files), reshuffle_each_iteration=True)
+    dataset = files.interleave(tf.data.TFRecordDataset, cycle_length=4,
+                               num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    if training:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, reshuffle_each_iteration=True)
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, spec)
+        image = tf.reshape(tf.io.decode_raw(example["pixels"], tf.uint8), (size, size, 3))
+        return image, example["label"]
+
+    dataset = dataset.map(parse, num_parallel_calls=tf.data.AUTOTUNE).batch(batch_size, drop_remainder=training)
+    if training:
+        # Same augmentation as the old generator: rotation, zoom, shift, flip
+        augment = tf.keras.Sequential([
+            tf.keras.layers.RandomRotation(30 / 360, fill_mode="nearest"),
+            tf.keras.layers.RandomZoom(0.3, fill_mode="nearest"),
+            tf.keras.layers.RandomTranslation(0.2, 0.2, fill_mode="nearest"),
+            tf.keras.layers.RandomFlip("horizontal"),
+        ])
+        dataset = dataset.map(lambda x, y: (augment(tf.cast(x, tf.float32), training=True), y),
+                              num_parallel_calls=tf.data.AUTOTUNE)
+    # preprocess_image's scaling, applied after augmentation
+    dataset = dataset.map(lambda x, y: (tf.cast(x, tf.float32) / 127.5 - 1.0, y),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def input_throughput(dataset, batches=50):
+    # Images per second the pipeline alone delivers; compare with training speed
+    start, images = time.perf_counter(), 0
+    for x, _ in dataset.take(batches):
+        images += int(x.shape[0])
+    return images / max(time.perf_counter() - start, 1e-9)
+
+
+# --------------------------------------------------
+# Model
+# --------------------------------------------------
+def build_model(num_classes, size=IMG_SIZE, weights="imagenet"):
+    import tensorflow as tf
+    from tensorflow.keras.applications import MobileNetV2
+    from tensorflow.keras.layers import BatchNormalization, Dense, Dropout, GlobalAveragePooling2D
+
+    base_model = MobileNetV2(weights=weights, include_top=False, input_shape=(size, size, 3))
+    x = GlobalAveragePooling2D()(base_model.output)
+    x = Dense(1024, activation="relu")(x)
+    x = BatchNormalization()(x)
+    x = Dropout(0.5)(x)
+    x = Dense(512, activation="relu")(x)
+    x = BatchNormalization()(x)
+    x = Dropout(0.5)(x)
+    # float32 softmax also under mixed precision
+    outputs = Dense(num_classes, activation="softmax", dtype="float32")(x)
+    return tf.keras.Model(base_model.input, outputs)
+
+
+def set_backbone_trainable(model, trainable_layers):
+    # Head = everything after global pooling; backbone = the MobileNetV2 layers before it
+    pooling = next(i for i, layer in enumerate(model.layers) if layer.__class__.__name__ == "GlobalAveragePooling2D")
+    for i, layer in enumerate(model.layers):
+        layer.trainable = i >= pooling or (trainable_layers > 0 and i >= pooling - trainable_layers)
+
+
+def export_model(weights, path, size=IMG_SIZE):
+    # Rebuilt under the float32 policy so the saved file is a plain float32
+    # model (precision.py and the app expect that); variables are float32
+    # under mixed precision too, so the weights carry over unchanged
+    import tensorflow as tf
+
+    tf.keras.mixed_precision.set_global_policy("float32")
+    model = build_model(len(class_names), size, weights=None)
+    model.set_weights(weights)
+    tmp_path = path + ".tmp.keras"
+    model.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def make_epoch_metrics(phase, images, log):
+    import tensorflow as tf
+
+    class EpochMetrics(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.best_loss = None
+            self.best_weights = None
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self._start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            seconds = time.perf_counter() - self._start
+            row = {"phase": phase, "epoch": epoch + 1, "seconds": seconds, "images_per_second": images / seconds}
+            row.update({k: float(v) for k, v in (logs or {}).items()})
+            log.append(row)
+            print(f"⏱️ {phase} epoch {epoch + 1}: {seconds:.0f}s, {row['images_per_second']:.0f} img/s")
+            if self.best_loss is None or row.get("val_loss", 0.0) < self.best_loss:
+                self.best_loss = row.get("val_loss", 0.0)
+                self.best_weights = self.model.get_weights()
+
+    return EpochMetrics()
+
+
+if __name__ == "__main__":
+    import tensorflow as tf
+
+    from benchmark import list_images
+
+    parser = argparse.ArgumentParser(description="Retrain the insect model from labelled folders")
+    parser.add_argument("--train", required=True, help="Training folder (one sub-folder per class name)")
+    parser.add_argument("--val", required=True, help="Validation folder (one sub-folder per class name)")
+    parser.add_argument("--init", help="Start from this model (e.g. the current one) instead of ImageNet")
+    parser.add_argument("--size", type=int, default=IMG_SIZE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--epochs-head", type=int, default=EPOCHS_HEAD)
+    parser.add_argument("--epochs-fine", type=int, default=EPOCHS_FINE)
+    parser.add_argument("--precision", choices=PRECISIONS,
+                        help="Default: mixed_float16 with a GPU, else float32")
+    parser.add_argument("--workers", type=int, help="Processes decoding images into shards")
+    parser.add_argument("--captures", help="Also train on labelled captures from this folder (capture.py)")
+    args = parser.parse_args()
+
+    precision = args.precision or ("mixed_float16" if tf.config.list_physical_devices("GPU") else "float32")
+    tf.keras.mixed_precision.set_global_policy(precision)
+
+    metrics = {"precision": precision, "batch_size": args.batch_size, "epochs": []}
+    shards, counts = {}, {}
+    for split, folder in (("train", args.train), ("val", args.val)):
+        items = [item for item in list_images(folder) if item[1] >= 0]
+        if split == "train" and args.captures:
+            # Read in place from the capture queue, not copied into the train folder
+            from capture import labelled_items
+            items += labelled_items(args.captures)
+        start = time.perf_counter()
+        shards[split], counts[split] = write_shards(items, split, args.size, workers=args.workers)
+        metrics[f"{split}_shard_seconds"] = time.perf_counter() - start
+        print(f"📦 {split}: {sum(counts[split].values())} images in {len(shards[split])} shards "
+              f"({metrics[f'{split}_shard_seconds']:.0f}s)")
+    missing = [name for name in class_names if name not in counts["train"]]
+    if missing:
+        print(f"⚠️ No training images for {len(missing)} classes: {', '.join(missing[:5])}")
+
+    train_data = shard_dataset(shards["train"], args.size, args.batch_size, training=True)
+    val_data = shard_dataset(shards["val"], args.size, args.batch_size, training=False)
+    metrics["input_images_per_second"] = input_throughput(train_data)
+    train_images = sum(counts["train"].values())
+
+    # Balanced class weights, as before, but indexed by class_names
+    seen = np.array([counts["train"].get(name, 0) for name in class_names], dtype=np.float64)
+    weights = np.where(seen > 0, seen.sum() / (np.count_nonzero(seen) * np.maximum(seen, 1)), 0.0)
+    class_weights = dict(enumerate(weights))
+
+    model = build_model(len(class_names), args.size)
+    if args.init:
+        initial = tf.keras.models.load_model(args.init)
+        if initial.output_shape[-1] != len(class_names):
+            raise SystemExit(f"{args.init} has {initial.output_shape[-1]} outputs, class_names has {len(class_names)}")
+        model.set_weights(initial.get_weights())
+        del initial
+
+    phases = [("head", args.epochs_head, LEARNING_RATE_HEAD, 0),
+              ("fine", args.epochs_fine, LEARNING_RATE_FINE, FINE_TUNE_LAYERS)]
+    best = None
+    for phase, epochs, learning_rate, trainable_layers in phases:
+        if not epochs:
+            continue
+        print("🚀 Training classifier head..." if phase == "head" else "🔧 Fine-tuning backbone...")
+        set_backbone_trainable(model, trainable_layers)
+        model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate),
+                      loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+        epoch_metrics = make_epoch_metrics(phase, train_images, metrics["epochs"])
+        model.fit(train_data, validation_data=val_data, epochs=epochs, class_weight=class_weights,
+                  callbacks=[
+                      tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True),
+                      tf.keras.callbacks.ReduceLROnPlateau(monitor="val_loss", factor=0.5, patience=3, verbose=1),
+                      epoch_metrics,
+                  ], verbose=2)
+        if epoch_metrics.best_weights is not None and (best is None or epoch_metrics.best_loss < best[0]):
+            best = (epoch_metrics.best_loss, epoch_metrics.best_weights)
+
+    final_weights = model.get_weights()
+    export_model(best[1] if best else final_weights, BEST_PATH, args.size)
+    export_model(final_weights, MODEL_PATH, args.size)
+
+    manifest = {
+        "labels": class_names,
+        "input_size": args.size,
+        "preprocessing": "upload_guard.decode_upload, resize to input_size, x / 127.5 - 1",
+        "models": [MODEL_PATH, BEST_PATH],
+        "train_images": counts["train"],
+        "val_images": counts["val"],
+        "trained_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    metrics["total_seconds"] = sum(row["seconds"] for row in metrics["epochs"])
+    with open(METRICS_PATH, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=4)
+
+    print(f"✅ {MODEL_PATH}, {BEST_PATH} and {MANIFEST_PATH}; "
+          f"input pipeline {metrics['input_images_per_second']:.0f} img/s, timings in {METRICS_PATH}")
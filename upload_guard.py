@@ -0,0 +1,129 @@
+# --------------------------------------------------
+# Insectifica – upload validation & bounded decode
+#
+# Every upload is checked from its header before any pixels are decoded:
+# size in bytes, format, and dimensions. JPEGs are then decoded directly
+# at reduced size (draft mode); formats that cannot be drafted get a
+# tighter pixel limit, since they must be decoded in full. The pixel
+# limits are the per-request CPU/memory budget: decode cost grows with
+# pixel count, so bounding pixels bounds both. Rejections and decode
+# times are counted and written to upload_metrics.json.
+# --------------------------------------------------
+import io
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from PIL import Image
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_PIXELS = 50_000_000            # 50 MP: large trap photos, decoded in draft mode
+MAX_FULL_DECODE_PIXELS = 16_000_000  # PNG etc. are decoded at full size (~48 MB RGB)
+MIN_SIDE = 32
+DECODE_SIDE = 1024
+ALLOWED_FORMATS = {"JPEG", "MPO", "PNG"}   # MPO: multi-picture JPEGs from phone cameras
+METRICS_PATH = "upload_metrics.json"
+METRICS_INTERVAL = 30.0
+
+
+class UploadRejected(ValueError):
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+# --------------------------------------------------
+# Metrics
+# --------------------------------------------------
+class UploadStats:
+    def __init__(self):
+        self.accepted = 0
+        self.downsampled = 0
+        self.rejected = {}
+        self._decode_ms = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._written = 0.0
+
+    def reject(self, reason):
+        with self._lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def accept(self, decode_ms, downsampled):
+        with self._lock:
+            self.accepted += 1
+            self.downsampled += int(downsampled)
+            self._decode_ms.append(decode_ms)
+
+    def snapshot(self):
+        with self._lock:
+            decode_ms = np.array(self._decode_ms)
+            return {
+                "accepted": self.accepted,
+                "downsampled": self.downsampled,
+                "rejected": dict(self.rejected),
+                "decode_p50_ms": float(np.percentile(decode_ms, 50)) if len(decode_ms) else None,
+                "decode_p99_ms": float(np.percentile(decode_ms, 99)) if len(decode_ms) else None,
+            }
+
+    def write(self, path=METRICS_PATH):
+        now = time.time()
+        if now - self._written < METRICS_INTERVAL:
+            return
+        self._written = now
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+
+stats = UploadStats()
+
+
+# --------------------------------------------------
+# Validation & Decode
+# --------------------------------------------------
+def _reject(reason, message):
+    stats.reject(reason)
+    raise UploadRejected(reason, message)
+
+
+def open_upload(data, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_PIXELS):
+    # Header-only checks; returns a lazy image with no pixels decoded yet
+    if len(data) > max_bytes:
+        _reject("too_large", f"The file is larger than {max_bytes // (1024 * 1024)} MB.")
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError:
+        # Pillow's own limit (far above ours); ours is checked below
+        _reject("too_many_pixels", "The image dimensions are too large.")
+    except Exception:
+        _reject("unreadable", "The file is not a readable image.")
+
+    if image.format not in ALLOWED_FORMATS:
+        _reject("format", "Only JPG and PNG images are supported.")
+    width, height = image.size
+    if min(width, height) < MIN_SIDE:
+        _reject("too_small", "The image is too small to identify an insect.")
+    limit = max_pixels if image.format in ("JPEG", "MPO") else min(max_pixels, MAX_FULL_DECODE_PIXELS)
+    if width * height > limit:
+        _reject("too_many_pixels", f"The image is too large ({width}×{height} pixels).")
+    return image
+
+
+def decode_upload(image, max_side=DECODE_SIDE):
+    # RGB image no larger than max_side; JPEGs are scaled during decode
+    start = time.perf_counter()
+    original = image.size
+    try:
+        if image.format in ("JPEG", "MPO"):
+            # draft keeps both sides >= the request, so ask for the aspect-
+            # correct target rather than a max_side square
+            scale = max_side / max(original)
+            image.draft("RGB", (round(original[0] * scale), round(original[1] * scale)))
+        image = image.convert("RGB")
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    except Exception:
+        _reject("corrupt", "The image file is damaged or incomplete.")
+    stats.accept((time.perf_counter() - start) * 1000.0, image.size != original)
+    return image